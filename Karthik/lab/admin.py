@@ -1,15 +1,24 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.urls import path
 from django.http import HttpResponse
 from django.utils.safestring import mark_safe
 from django.utils.html import format_html
-import csv
-import io
-from .models import UserProfile, Submission, Problem, TestCase, Topic, GhostCredential
+from django.db.models import Count, Q
+import zipfile
+from . import exports, test_data
+from .models import (
+    UserProfile, Submission, Problem, TestCase, Topic, GhostCredential, TestCaseResult, JudgeJob, VerdictCacheEntry,
+    Rejudge, SolvedProblem, UserImport,
+)
+from .problem_import import import_csv, import_zip
+from .rejudge import select_submissions, start_rejudge
+from .user_import import start_import
+
+MAX_IMPORT_MESSAGES = 20  # warnings shown after an import; the rest are counted
 
 # Topic Management
 @admin.register(Topic)
@@ -63,13 +72,35 @@ class GhostCredentialInline(admin.StackedInline):
     extra = 0
 
 
-class StudentAdmin(BaseUserAdmin):
+class GradeExportMixin:
+    """Actions downloading the grades of the selected students, streamed (see exports.py)"""
+    profile_field = 'pk'  # UserProfile field matching the pk of the admin's rows
+    
+    def selected_profiles(self, queryset):
+        # Without the changelist's annotations, which would multiply the grade counts
+        return UserProfile.objects.filter(**{self.profile_field + '__in': queryset.values('pk')})
+    
+    def export_grades(self, queryset, file_format):
+        profiles = exports.annotate_grades(self.selected_profiles(queryset))
+        return exports.streaming_response(exports.grade_rows(profiles), exports.GRADE_COLUMNS, file_format, 'grades')
+    
+    def export_grades_csv(self, request, queryset):
+        return self.export_grades(queryset, 'csv')
+    export_grades_csv.short_description = "Export grades as CSV"
+    
+    def export_grades_jsonl(self, request, queryset):
+        return self.export_grades(queryset, 'jsonl')
+    export_grades_jsonl.short_description = "Export grades as JSON lines"
+
+
+class StudentAdmin(GradeExportMixin, BaseUserAdmin):
     """Enhanced User admin for student management"""
     inlines = (UserProfileInline, GhostCredentialInline)
     list_display = ['username', 'email', 'get_branch', 'get_year', 'get_score', 'get_role', 'get_submission_count', 'date_joined', 'is_active']
     list_filter = ['is_active', 'is_staff', 'date_joined', 'userprofile__role', 'userprofile__branch', 'userprofile__year']
     search_fields = ['username', 'email', 'first_name', 'last_name']
-    actions = ['delete_selected_users']
+    actions = ['delete_selected_users', 'export_grades_csv', 'export_grades_jsonl']
+    profile_field = 'user'
     
     def get_role(self, obj):
         try:
@@ -100,12 +131,13 @@ class StudentAdmin(BaseUserAdmin):
     get_score.short_description = 'Score'
     
     def get_submission_count(self, obj):
-        count = Submission.objects.filter(user=obj).count()
-        return format_html('<strong>{}</strong>', count)
+        return format_html('<strong>{}</strong>', obj.submission_count)
     get_submission_count.short_description = 'Submissions'
+    get_submission_count.admin_order_field = 'submission_count'
     
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        # Profile columns and submission counts come with the users, not one query per row
+        qs = super().get_queryset(request).select_related('userprofile').annotate(submission_count=Count('submission'))
         # Filter to show students by default, but allow filtering
         if 'userprofile__role' in request.GET:
             return qs
@@ -169,6 +201,8 @@ class StudentAdmin(BaseUserAdmin):
         urls = super().get_urls()
         custom_urls = [
             path('import-user-csv/', self.admin_site.admin_view(self.import_user_csv_view), name='lab_user_import_csv'),
+            path('import-user-csv/<int:import_id>/', self.admin_site.admin_view(self.import_status_view),
+                 name='lab_user_import_status'),
         ]
         return custom_urls + urls
 
@@ -180,68 +214,15 @@ class StudentAdmin(BaseUserAdmin):
                 return redirect('admin:lab_user_import_csv')
             
             try:
-                decoded_file = csv_file.read().decode('utf-8')
-                io_string = io.StringIO(decoded_file)
-                reader = csv.DictReader(io_string)
-                
-                imported_count = 0
-                errors = []
-                
-                for row_num, row in enumerate(reader, start=2):
-                    try:
-                        username = row.get('username', '').strip()
-                        email = row.get('email', '').strip()
-                        password = row.get('password', '').strip()
-                        branch = row.get('branch', '').strip()
-                        year = row.get('year', '1').strip()
-                        semester = row.get('semester', '1').strip()
-                        gender = row.get('gender', 'Male').strip()
-                        role = row.get('role', 'student').strip().lower()
-                        
-                        if not username or not email or not password:
-                            errors.append(f"Row {row_num}: Missing username, email or password")
-                            continue
-                        
-                        if User.objects.filter(username=username).exists():
-                            errors.append(f"Row {row_num}: Username '{username}' already exists")
-                            continue
-                            
-                        if User.objects.filter(email=email).exists():
-                            errors.append(f"Row {row_num}: Email '{email}' already registered")
-                            continue
-
-                        # Create user
-                        user = User.objects.create_user(
-                            username=username, 
-                            email=email, 
-                            password=password
-                        )
-                        
-                        # Update profile (created by signal)
-                        profile = user.userprofile
-                        profile.branch = branch
-                        profile.year = int(year) if year.isdigit() else 1
-                        profile.semester = int(semester) if semester.isdigit() else 1
-                        profile.gender = gender
-                        profile.role = role if role in ['admin', 'student'] else 'student'
-                        profile.email_verified = True # Auto verify imported users
-                        profile.save()
-                        
-                        imported_count += 1
-                        
-                    except Exception as e:
-                        errors.append(f"Row {row_num}: {str(e)}")
-                
-                if imported_count > 0:
-                    messages.success(request, f'Successfully imported {imported_count} user(s).')
-                if errors:
-                    for error in errors:
-                        messages.warning(request, error)
-                        
-            except Exception as e:
-                messages.error(request, f'Error importing CSV: {str(e)}')
+                decoded_file = csv_file.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                messages.error(request, 'Error importing CSV: the file is not UTF-8 text.')
+                return redirect('admin:lab_user_import_csv')
             
-            return redirect('admin:auth_user_changelist')
+            # A judge worker imports the users in the background (or, with JUDGE_ASYNC off,
+            # this request does); the status page follows it
+            user_import = start_import(decoded_file, file_name=csv_file.name, requested_by=request.user)
+            return redirect('admin:lab_user_import_status', user_import.pk)
         
         context = {
             **self.admin_site.each_context(request),
@@ -250,6 +231,17 @@ class StudentAdmin(BaseUserAdmin):
         }
         return render(request, 'admin/lab/user/import_csv.html', context)
 
+    def import_status_view(self, request, import_id):
+        user_import = get_object_or_404(UserImport, pk=import_id)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'User Import',
+            'user_import': user_import,
+            'running': user_import.status in ('queued', 'running'),
+        }
+        return render(request, 'admin/lab/user/import_status.html', context)
+
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
         extra_context['user_import_csv_url'] = 'admin:lab_user_import_csv'
@@ -262,12 +254,13 @@ admin.site.register(User, StudentAdmin)
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'branch', 'year', 'score', 'role', 'email_verified', 'created_at']
+class UserProfileAdmin(GradeExportMixin, admin.ModelAdmin):
+    list_display = ['user', 'branch', 'year', 'score', 'role', 'get_submission_count', 'email_verified', 'created_at']
+    list_select_related = ['user']
     list_filter = ['role', 'branch', 'year', 'semester', 'email_verified', 'created_at']
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['created_at']
-    actions = ['delete_selected_profiles']
+    actions = ['delete_selected_profiles', 'export_grades_csv', 'export_grades_jsonl']
     
     fieldsets = (
         ('User Information', {
@@ -289,9 +282,12 @@ class UserProfileAdmin(admin.ModelAdmin):
     get_email.short_description = 'Email'
     
     def get_submission_count(self, obj):
-        count = Submission.objects.filter(user=obj.user).count()
-        return format_html('<strong>{}</strong>', count)
+        return format_html('<strong>{}</strong>', obj.submission_count)
     get_submission_count.short_description = 'Submissions'
+    get_submission_count.admin_order_field = 'submission_count'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(submission_count=Count('user__submission'))
     
     def delete_model(self, request, obj):
         """Override delete to add safety checks"""
@@ -334,11 +330,30 @@ class UserProfileAdmin(admin.ModelAdmin):
     delete_selected_profiles.short_description = "Delete selected profiles"
 
 
-class SampleTestCaseInline(admin.TabularInline):
+class StoredTestDataMixin:
+    """Shows which test data is kept as a file instead of in the database (see test_data.py)"""
+    
+    def stored_files(self, obj):
+        if not obj or not obj.pk:
+            return "-"
+        stored = []
+        for label, digest in (('Input', obj.input_file), ('Output', obj.expected_output_file)):
+            if digest:
+                size = test_data.size(digest)
+                if size is None:
+                    stored.append(f"{label}: missing file")
+                else:
+                    stored.append(f"{label}: {size / 1024:.0f} KB file")
+        return ", ".join(stored) or "-"
+    stored_files.short_description = "Stored as file"
+
+
+class SampleTestCaseInline(StoredTestDataMixin, admin.TabularInline):
     """Inline for Sample Test Cases (Visible to Students)"""
     model = TestCase
     extra = 2
-    fields = ['input_data', 'expected_output', 'order']
+    fields = ['input_data', 'expected_output', 'stored_files', 'order']
+    readonly_fields = ['stored_files']
     verbose_name = "Sample Test Case (Visible to Students)"
     verbose_name_plural = "Sample Test Cases (Visible to Students)"
     
@@ -353,11 +368,12 @@ class SampleTestCaseInline(admin.TabularInline):
         return formset
 
 
-class HiddenTestCaseInline(admin.TabularInline):
+class HiddenTestCaseInline(StoredTestDataMixin, admin.TabularInline):
     """Inline for Hidden Test Cases (For Evaluation Only)"""
     model = TestCase
     extra = 3
-    fields = ['input_data', 'expected_output', 'order']
+    fields = ['input_data', 'expected_output', 'stored_files', 'order']
+    readonly_fields = ['stored_files']
     verbose_name = "Hidden Test Case (Evaluation Only)"
     verbose_name_plural = "Hidden Test Cases (Evaluation Only)"
     
@@ -368,23 +384,34 @@ class HiddenTestCaseInline(admin.TabularInline):
     def get_formset(self, request, obj=None, **kwargs):
         formset = super().get_formset(request, obj, **kwargs)
         formset.form.base_fields['input_data'].help_text = "Input data for evaluation (students won't see this)"
-        formset.form.base_fields['expected_output'].help_text = "Expected output for evaluation (must match exactly)"
+        formset.form.base_fields['expected_output'].help_text = (
+            "Expected output for evaluation (compared with the problem's checker). "
+            "Large data is stored as a file and shows empty here; leave it empty to keep the file"
+        )
         return formset
 
 
 @admin.register(Problem)
 class ProblemAdmin(admin.ModelAdmin):
     list_display = ['title', 'topic', 'difficulty', 'points', 'is_active', 'test_case_count', 'created_by', 'created_at']
+    list_select_related = ['topic', 'created_by']
     list_filter = ['topic', 'difficulty', 'is_active', 'created_at']
     search_fields = ['title', 'description']
     inlines = [SampleTestCaseInline, HiddenTestCaseInline]
-    readonly_fields = ['created_at', 'updated_at', 'test_case_info']
+    readonly_fields = ['created_at', 'updated_at', 'test_case_info', 'checker_compile_error']
+    actions = ['rejudge_submissions']
     
     fieldsets = (
         ('Problem Statement', {
-            'fields': ('title', 'topic', 'description', 'difficulty', 'points', 'is_active'),
+            'fields': ('title', 'topic', 'description', 'difficulty', 'points', 'verdict_policy', 'is_active'),
             'description': 'Enter the problem title and detailed description that students will see.'
         }),
+        ('Output Checking', {
+            'fields': ('checker', 'checker_tolerance', 'checker_language', 'checker_code', 'checker_compile_error'),
+            'description': 'How program output is compared with the expected output. The tolerance only applies to the numeric checker. '
+                           'A custom checker program is run as <code>checker INPUT OUTPUT ANSWER</code> (testlib order) and '
+                           'exits with 0 to accept the output, 1 to reject it; it is compiled when the problem is saved.'
+        }),
         ('Test Cases Summary', {
             'fields': ('test_case_info',),
             'description': 'Manage test cases in the sections below. Sample test cases are visible to students. Hidden test cases are used only for evaluation.'
@@ -395,15 +422,22 @@ class ProblemAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            test_case_total=Count('test_cases'),
+            sample_test_case_count=Count('test_cases', filter=Q(test_cases__is_sample=True)),
+        )
+    
     def test_case_count(self, obj):
         """Display total test cases count in list view"""
         if obj.pk:
-            total = obj.test_cases.count()
-            sample = obj.test_cases.filter(is_sample=True).count()
+            total = obj.test_case_total
+            sample = obj.sample_test_case_count
             hidden = total - sample
             return f"{total} (S:{sample}, H:{hidden})"
         return "-"
     test_case_count.short_description = "Test Cases"
+    test_case_count.admin_order_field = 'test_case_total'
     
     def test_case_info(self, obj):
         """Display test case information and instructions"""
@@ -440,6 +474,8 @@ class ProblemAdmin(admin.ModelAdmin):
         if not change:  # Only set created_by when creating new
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
+        if obj.checker == 'custom' and obj.checker_compile_error:
+            messages.warning(request, f"The checker program failed to compile: {obj.checker_compile_error}")
     
     def save_formset(self, request, form, formset, change):
         """Override to set is_sample based on which inline was used"""
@@ -490,74 +526,25 @@ class ProblemAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             csv_file = request.FILES.get('csv_file')
             if not csv_file:
-                messages.error(request, 'Please select a CSV file.')
+                messages.error(request, 'Please select a CSV or zip file.')
                 return redirect('admin:lab_problem_import_csv')
             
             try:
-                # Read CSV file
-                decoded_file = csv_file.read().decode('utf-8')
-                io_string = io.StringIO(decoded_file)
-                reader = csv.DictReader(io_string)
-                
-                imported_count = 0
-                errors = []
-                
-                for row_num, row in enumerate(reader, start=2):  # Start at 2 (1 is header)
-                    try:
-                        # Required fields: title, description
-                        title = row.get('title', '').strip()
-                        description = row.get('description', '').strip()
-                        difficulty = row.get('difficulty', 'easy').strip().lower()
-                        is_active = row.get('is_active', 'true').strip().lower() == 'true'
-                        points = row.get('points', '10').strip()
-                        topic_name = row.get('topic', '').strip()
-                        
-                        topic = None
-                        if topic_name:
-                            topic, _ = Topic.objects.get_or_create(name=topic_name)
-                        
-                        if not title or not description:
-                            errors.append(f"Row {row_num}: Missing title or description")
-                            continue
-                        
-                        # Create problem
-                        problem = Problem.objects.create(
-                            title=title,
-                            description=description,
-                            difficulty=difficulty if difficulty in ['easy', 'medium', 'hard'] else 'easy',
-                            is_active=is_active,
-                            points=int(points) if points.isdigit() else 10,
-                            topic=topic,
-                            created_by=request.user
-                        )
-                        
-                        # Add test cases if provided
-                        test_input = row.get('test_input', '').strip()
-                        test_output = row.get('test_output', '').strip()
-                        is_sample = row.get('is_sample', 'false').strip().lower() == 'true'
-                        
-                        if test_input and test_output:
-                            TestCase.objects.create(
-                                problem=problem,
-                                input_data=test_input,
-                                expected_output=test_output,
-                                is_sample=is_sample,
-                                order=0
-                            )
-                        
-                        imported_count += 1
-                        
-                    except Exception as e:
-                        errors.append(f"Row {row_num}: {str(e)}")
-                
-                if imported_count > 0:
-                    messages.success(request, f'Successfully imported {imported_count} problem(s).')
-                if errors:
-                    for error in errors:
-                        messages.warning(request, error)
-                        
+                # Rows are read from the upload as they are imported
+                is_zip = zipfile.is_zipfile(csv_file)
+                csv_file.seek(0)
+                importer = (import_zip if is_zip else import_csv)(csv_file, created_by=request.user)
             except Exception as e:
                 messages.error(request, f'Error importing CSV: {str(e)}')
+                return redirect('admin:lab_problem_changelist')
+            
+            if importer.problem_count > 0:
+                messages.success(request, f'Successfully imported {importer.problem_count} problem(s) '
+                                          f'with {importer.test_case_count} test case(s).')
+            for error in importer.errors[:MAX_IMPORT_MESSAGES]:
+                messages.warning(request, error)
+            if len(importer.errors) > MAX_IMPORT_MESSAGES:
+                messages.warning(request, f'... and {len(importer.errors) - MAX_IMPORT_MESSAGES} more problem(s) with the file.')
             
             return redirect('admin:lab_problem_changelist')
         
@@ -573,6 +560,30 @@ class ProblemAdmin(admin.ModelAdmin):
         extra_context = extra_context or {}
         extra_context['import_csv_url'] = 'admin:lab_problem_import_csv'
         return super().changelist_view(request, extra_context=extra_context)
+    
+    def rejudge_submissions(self, request, queryset):
+        """Queue a rejudge of every submission of the selected problems"""
+        for problem in queryset:
+            ids = select_submissions(problem=problem)
+            if not ids:
+                messages.info(request, f'"{problem.title}" has no submissions to rejudge.')
+                continue
+            rejudge = start_rejudge(ids, problem=problem, requested_by=request.user)
+            report_rejudge(request, rejudge, f'{len(ids)} submission(s) of "{problem.title}"')
+    rejudge_submissions.short_description = "Rejudge all submissions of selected problems"
+
+
+def report_rejudge(request, rejudge, what):
+    """Tell the admin a rejudge was queued, or how it went when it ran in the request (JUDGE_ASYNC off)"""
+    if rejudge.status == 'queued':
+        messages.success(request, f'Queued a rejudge of {what}; '
+                                  f'a judge worker runs it and scores are corrected when it is done.')
+    elif rejudge.status == 'done':
+        messages.success(request, f'Rejudged {what}: {rejudge.changed} changed status, '
+                                  f'{rejudge.errors} error(s), {rejudge.score_changes} score(s) corrected.')
+    else:
+        reason = (rejudge.error.strip().splitlines() or ['unknown error'])[-1]
+        messages.error(request, f'The rejudge of {what} failed: {reason}')
 
 
 @admin.register(TestCase)
@@ -582,12 +593,44 @@ class TestCaseAdmin(admin.ModelAdmin):
     search_fields = ['problem__title']
 
 
+class TestCaseResultInline(admin.TabularInline):
+    """Per-test-case results recorded by the judge"""
+    model = TestCaseResult
+    extra = 0
+    fields = ['order', 'is_sample', 'verdict', 'cpu_time', 'wall_time', 'memory_kb', 'output']
+    readonly_fields = ['order', 'is_sample', 'verdict', 'cpu_time', 'wall_time', 'memory_kb', 'output']
+    can_delete = False
+
+
 @admin.register(Submission)
 class SubmissionAdmin(admin.ModelAdmin):
     list_display = ['user', 'get_branch', 'get_year', 'problem', 'language', 'status', 'submitted_at']
+    list_select_related = ['user__userprofile', 'problem']
     list_filter = ['status', 'language', 'user__userprofile__branch', 'user__userprofile__year', 'submitted_at', 'problem']
     search_fields = ['user__username', 'code', 'problem__title']
     readonly_fields = ['submitted_at']
+    inlines = [TestCaseResultInline]
+    actions = ['rejudge_selected', 'export_csv', 'export_jsonl']
+    
+    def rejudge_selected(self, request, queryset):
+        """Queue a rejudge of the selected submissions (practice runs and queued ones are left out)"""
+        ids = select_submissions(submissions=queryset)
+        if not ids:
+            messages.info(request, 'None of the selected submissions can be rejudged.')
+            return
+        problem_ids = set(Submission.objects.filter(id__in=ids).values_list('problem_id', flat=True).distinct())
+        problem = Problem.objects.get(pk=problem_ids.pop()) if len(problem_ids) == 1 else None
+        rejudge = start_rejudge(ids, problem=problem, requested_by=request.user)
+        report_rejudge(request, rejudge, f'{len(ids)} submission(s)')
+    rejudge_selected.short_description = "Rejudge selected submissions"
+    
+    def export_csv(self, request, queryset):
+        return exports.streaming_response(exports.submission_rows(queryset), exports.SUBMISSION_COLUMNS, 'csv', 'submissions')
+    export_csv.short_description = "Export selected submissions as CSV"
+    
+    def export_jsonl(self, request, queryset):
+        return exports.streaming_response(exports.submission_rows(queryset), exports.SUBMISSION_COLUMNS, 'jsonl', 'submissions')
+    export_jsonl.short_description = "Export selected submissions as JSON lines"
 
     def get_branch(self, obj):
         try:
@@ -605,10 +648,10 @@ class SubmissionAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Submission Info', {
-            'fields': ('user', 'problem', 'language', 'submitted_at', 'status', 'execution_time')
+            'fields': ('user', 'problem', 'language', 'submitted_at', 'status', 'execution_time', 'peak_memory_kb')
         }),
         ('Test Results', {
-            'fields': ('test_cases_passed', 'total_test_cases')
+            'fields': ('test_cases_passed', 'total_test_cases', 'verdict_policy')
         }),
         ('Code', {
             'fields': ('code', 'input_data')
@@ -618,3 +661,58 @@ class SubmissionAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(JudgeJob)
+class JudgeJobAdmin(admin.ModelAdmin):
+    list_display = ['submission', 'status', 'worker', 'attempts', 'created_at', 'started_at', 'finished_at']
+    list_select_related = ['submission__user', 'submission__problem']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['submission', 'worker', 'attempts', 'error', 'created_at', 'started_at', 'finished_at']
+
+
+@admin.register(SolvedProblem)
+class SolvedProblemAdmin(admin.ModelAdmin):
+    """Solves behind UserProfile.score; they change with verdicts and rejudges, not by hand"""
+    list_display = ['user', 'problem', 'points', 'solved_at', 'submission']
+    list_select_related = ['user', 'problem', 'submission__user', 'submission__problem']
+    list_filter = ['problem']
+    search_fields = ['user__username', 'problem__title']
+    readonly_fields = ['user', 'problem', 'points', 'solved_at', 'submission']
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Rejudge)
+class RejudgeAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'problem', 'status', 'processed', 'total', 'changed', 'errors', 'score_changes', 'requested_by', 'worker', 'created_at', 'finished_at']
+    list_select_related = ['problem', 'requested_by']
+    list_filter = ['status', 'created_at']
+    exclude = ['submission_ids']
+    readonly_fields = ['problem', 'requested_by', 'use_cache', 'status', 'worker', 'total', 'processed', 'changed', 'errors', 'score_changes', 'error', 'created_at', 'started_at', 'finished_at']
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(UserImport)
+class UserImportAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status', 'imported', 'skipped', 'requested_by', 'worker', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    list_select_related = ['requested_by']
+    exclude = ['csv_data']
+    readonly_fields = ['file_name', 'requested_by', 'status', 'worker', 'total', 'processed', 'imported', 'skipped', 'errors', 'error', 'created_at', 'started_at', 'finished_at']
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(VerdictCacheEntry)
+class VerdictCacheEntryAdmin(admin.ModelAdmin):
+    """Cached verdicts; delete them after changing execution limits"""
+    list_display = ['problem', 'language', 'status', 'test_cases_passed', 'total_test_cases', 'test_revision', 'hits', 'created_at', 'last_hit_at']
+    list_filter = ['language', 'status']
+    readonly_fields = [field.name for field in VerdictCacheEntry._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
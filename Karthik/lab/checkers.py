@@ -0,0 +1,271 @@
+"""
+Streaming output checkers.
+
+A checker is fed the program's stdout chunk by chunk while it runs, so the
+judge never holds a second full copy of a large output and can stop the
+program at the first byte that rules out a correct answer.
+
+    checker.feed(chunk) -> False once the output can no longer be correct
+    checker.finish()    -> True if the complete output is accepted
+
+The expected output may be a str, bytes or an mmap of a test data file
+(see test_data.py). It is read a block at a time as the output comes in,
+so a mapped file is never copied whole.
+
+Every checker makes one pass over the output and the expected output, a
+chunk at a time, using bytes methods (split, rstrip, join, slice
+comparison) that run in C rather than a Python loop per byte or regular
+expressions; `python manage.py benchmark_checkers` measures them.
+"""
+import abc
+import functools
+import itertools
+import math
+
+from .special_judge import SpecialJudge, load_checker
+
+# What bytes.split() and bytes.strip() treat as whitespace
+WHITESPACE = b' \t\n\r\x0b\x0c'
+LINE_SPACE = b' \t\x0b\x0c'
+_WHITESPACE_BYTES = [bytes([byte]) for byte in WHITESPACE]
+BLOCK_BYTES = 64 * 1024  # of the expected output read at a time
+
+
+def normalize_newlines(data):
+    """Universal newlines: \\r\\n and lone \\r become \\n"""
+    return data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+
+def _to_bytes(text):
+    return text.encode('utf-8') if isinstance(text, str) else text
+
+
+def _split_complete_tokens(data):
+    """Split data into its tokens and the last one, which may continue in the next chunk"""
+    end = max(data.rfind(byte) for byte in _WHITESPACE_BYTES) + 1
+    return data[:end].split(), data[end:]
+
+
+def _iter_tokens(data, block_bytes=BLOCK_BYTES):
+    """data.split() without building the whole list at once"""
+    partial = b''
+    for offset in range(0, len(data), block_bytes):
+        tokens, partial = _split_complete_tokens(partial + data[offset:offset + block_bytes])
+        yield from tokens
+    if partial:
+        yield partial
+
+
+def _rstrip_lines(data):
+    return b'\n'.join([line.rstrip(LINE_SPACE) for line in data.split(b'\n')])
+
+
+class NewlineTranslator:
+    """normalize_newlines() for data arriving in chunks"""
+
+    def __init__(self):
+        self.pending_cr = False
+
+    def translate(self, chunk):
+        if self.pending_cr and chunk.startswith(b'\n'):
+            # Second half of a \r\n split across chunks; the \r already became \n
+            chunk = chunk[1:]
+        self.pending_cr = chunk.endswith(b'\r')
+        return normalize_newlines(chunk)
+
+
+class CanonicalForm(abc.ABC):
+    """Turns one stream into its canonical form, a chunk at a time.
+
+    transform() holds back whatever it can't place yet (such as whitespace
+    that may turn out to be trailing) in self.pending, so every byte it
+    returns is final.
+    """
+
+    def __init__(self):
+        self.newlines = NewlineTranslator()
+        self.pending = b''
+        self.started = False
+
+    def feed(self, chunk):
+        return self.transform(self.newlines.translate(bytes(chunk)))
+
+    @abc.abstractmethod
+    def transform(self, data):
+        """The canonical form of data, which has had its newlines normalized"""
+
+    def end(self):
+        """Whatever is still pending once the stream is complete"""
+        return b''
+
+    def _split_trailing_whitespace(self, data):
+        """Start the canonical stream at the first non-whitespace byte and hold back trailing whitespace"""
+        data = self.pending + data
+        if not self.started:
+            data = data.lstrip(WHITESPACE)
+            if not data:
+                self.pending = b''
+                return b''
+            self.started = True
+        cut = len(data.rstrip(WHITESPACE))
+        self.pending = data[cut:]
+        return data[:cut]
+
+
+class CanonicalChecker:
+    """Compares the canonical form of the output with that of the expected output.
+
+    Subclasses set form, the CanonicalForm of their comparison. Both sides
+    go through it a block at a time: the expected output is canonicalised
+    only as far as the output has got, so a byte of output that differs
+    from it is a definitive mismatch and neither side is ever held whole.
+    """
+
+    form = None
+
+    def __init__(self, expected_output):
+        self.expected = self._expected_blocks(_to_bytes(expected_output))
+        self.buffer = b''  # canonical expected output not compared yet
+        self.actual = self.form()
+        self.failed = False
+
+    def _expected_blocks(self, data):
+        form = self.form()
+        for offset in range(0, len(data), BLOCK_BYTES):
+            yield form.feed(data[offset:offset + BLOCK_BYTES])
+        yield form.end()
+
+    def feed(self, chunk):
+        if self.failed:
+            return False
+        return self._compare(self.actual.feed(chunk))
+
+    def finish(self):
+        if not self.failed:
+            self._compare(self.actual.end())
+        if self.failed or self.buffer:
+            return False
+        # Accepted if nothing but whitespace is left of the expected output
+        return not any(self.expected)
+
+    def _compare(self, data):
+        while len(self.buffer) < len(data):
+            block = next(self.expected, None)
+            if block is None:
+                break
+            self.buffer += block
+        if self.buffer[:len(data)] != data:
+            self.failed = True
+            return False
+        self.buffer = self.buffer[len(data):]
+        return True
+
+
+class ExactForm(CanonicalForm):
+    def transform(self, data):
+        return self._split_trailing_whitespace(data)
+
+
+class LineForm(CanonicalForm):
+    def transform(self, data):
+        # Leading blank lines count, so only trailing whitespace is held back
+        data = self.pending + data
+        cut = len(data.rstrip(WHITESPACE))
+        self.pending = data[cut:]
+        # data[:cut] ends in a non-space, so every line it ends with spaces is complete
+        return _rstrip_lines(data[:cut])
+
+
+class TokenForm(CanonicalForm):
+    def transform(self, data):
+        data = self._split_trailing_whitespace(data)
+        tokens = b' '.join(data.split())
+        # Whitespace held back from the previous chunk separates its last token from this one
+        return b' ' + tokens if data[:1].isspace() else tokens
+
+
+class ExactChecker(CanonicalChecker):
+    """Output equal to the expected output after stripping both ends.
+
+    Same verdict as `actual.strip() == expected.strip()` (with universal
+    newlines).
+    """
+
+    form = ExactForm
+
+
+class LineChecker(CanonicalChecker):
+    """Line by line, ignoring whitespace at the end of each line and trailing blank lines"""
+
+    form = LineForm
+
+
+class TokenChecker(CanonicalChecker):
+    """The same whitespace-separated tokens, however they are spaced or split into lines"""
+
+    form = TokenForm
+
+
+class FloatChecker:
+    """Token by token; numeric tokens may differ by the tolerance.
+
+    Two numbers match when |actual - expected| <= tolerance * max(1, |expected|),
+    i.e. the tolerance is absolute for small values and relative for large ones.
+    Other tokens must be equal.
+    """
+
+    def __init__(self, expected_output, tolerance=1e-6):
+        self.tolerance = tolerance
+        self.expected_tokens = _iter_tokens(_to_bytes(expected_output))
+        self.partial = b''  # token cut off at the end of the last chunk
+        self.failed = False
+
+    def feed(self, chunk):
+        if self.failed:
+            return False
+        tokens, self.partial = _split_complete_tokens(self.partial + chunk)
+        return self._compare(tokens)
+
+    def finish(self):
+        if not self.failed and self.partial:
+            self._compare([self.partial])
+        return not self.failed and next(self.expected_tokens, None) is None
+
+    def _compare(self, tokens):
+        expected = list(itertools.islice(self.expected_tokens, len(tokens)))
+        # Numbers are only parsed where the bytes differ
+        if tokens != expected and (len(expected) < len(tokens) or
+                                   not all(map(self._close, tokens, expected))):
+            self.failed = True
+            return False
+        return True
+
+    def _close(self, token, expected):
+        if token == expected:
+            return True
+        try:
+            actual_value = float(token)
+            expected_value = float(expected)
+        except ValueError:
+            return False
+        if math.isnan(actual_value) or math.isnan(expected_value):
+            return False
+        return abs(actual_value - expected_value) <= self.tolerance * max(1.0, abs(expected_value))
+
+
+CHECKERS = {
+    'exact': ExactChecker,
+    'lines': LineChecker,
+    'tokens': TokenChecker,
+    'float': FloatChecker,
+}
+
+
+def checker_for(problem):
+    """Return a callable building the problem's checker for one expected output"""
+    name = getattr(problem, 'checker', 'exact')
+    if name == 'custom':
+        return SpecialJudge(load_checker(problem))
+    if name == 'float':
+        return functools.partial(FloatChecker, tolerance=problem.checker_tolerance)
+    return CHECKERS.get(name, ExactChecker)
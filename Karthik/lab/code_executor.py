@@ -5,213 +5,611 @@ import shutil
 import platform
 from django.conf import settings
 import signal
+import sys
+import threading
+import time
+import functools
+import math
+import re
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .compile_cache import CompileCache
+from .forkserver import get_forkserver
+from .launcher import get_launcher, launcher_command, parse_report
+from .scheduler import get_scheduler
+from .workspaces import get_workspace_pool
+from . import java_cds
+
+
+# Per-run limits; override with EXECUTION_LIMITS = {'default': {...}, '<language>': {...}}
+DEFAULT_EXECUTION_LIMITS = {
+    'memory_mb': 256,  # resident memory (Java: heap size)
+    'address_space_mb': 2048,  # address space a program may reserve, above memory_mb (not Java)
+    'cpu_seconds': 10,
+    'processes': 256,  # in the program's process group
+    'open_files': 64,
+    'output_bytes': 1024 * 1024,  # stdout and stderr together
+}
+
+# Output kept for display when a checker judges stdout as it streams
+OUTPUT_PREVIEW_BYTES = 64 * 1024
+
+# How the JVM reports a full heap on stderr
+JAVA_OUT_OF_MEMORY = 'java.lang.OutOfMemoryError'
+
+# How a program dies of an allocation refused at RLIMIT_AS: an uncaught
+# MemoryError ending a Python traceback, or std::bad_alloc terminating C++
+ALLOCATION_REFUSED = re.compile(
+    r"^Traceback \(most recent call last\):$.*^MemoryError\b[^\n]*\s*\Z"
+    r"|^terminate called after throwing an instance of 'std::bad_alloc'$",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+class CompiledProgram:
+    """Reusable handle to a compiled program, run once per test case"""
+
+    def __init__(self, language, work_dir, command=None, error='', owner=None, workspaces=None):
+        self.language = language
+        self.work_dir = work_dir
+        self.command = command
+        self.error = error
+        self.owner = owner
+        self.workspaces = workspaces  # WorkspacePool that work_dir goes back to
+
+    @property
+    def success(self):
+        return self.command is not None and not self.error
+
+    def cleanup(self):
+        """Remove the working directory holding source and binaries"""
+        if self.work_dir:
+            if self.workspaces is not None:
+                self.workspaces.release(self.work_dir)
+            else:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
 
 
 class CodeExecutor:
     """Handles secure code execution for multiple programming languages"""
-    
+
     def __init__(self):
         self.timeout = getattr(settings, 'CODE_EXECUTION_TIMEOUT', 10)
+        self.compile_timeout = getattr(settings, 'CODE_COMPILE_TIMEOUT', 5)
         self.execution_dir = getattr(settings, 'EXECUTION_DIR', None)
         if not self.execution_dir:
             self.execution_dir = tempfile.mkdtemp()
-    
-    def execute(self, language, code, input_data=''):
-        """Execute code based on language"""
+        self.compile_cache = None
+        if getattr(settings, 'COMPILE_CACHE_ENABLED', True):
+            self.compile_cache = CompileCache()
+        self.scheduler = get_scheduler()
+        self.workspaces = get_workspace_pool()
+
+    def execute(self, language, code, input_data='', owner=None):
+        """Execute code based on language (compile and run once)"""
+        program = self.compile(language, code, owner=owner)
+        try:
+            if not program.success:
+                return {'success': False, 'error': program.error}
+            return self.run(program, input_data)
+        finally:
+            program.cleanup()
+
+    def compile(self, language, code, owner=None):
+        """Compile code once and return a CompiledProgram for repeated runs.
+
+        owner (usually the user id) is used for fair scheduling of the
+        compile and of every later run of the program.
+        """
         handlers = {
-            'c': self._execute_c,
-            'cpp': self._execute_cpp,
-            'java': self._execute_java,
-            'python': self._execute_python,
+            'c': self._compile_c,
+            'cpp': self._compile_cpp,
+            'java': self._compile_java,
+            'python': self._compile_python,
         }
-        
-        handler = handlers.get(language.lower())
+
+        language = (language or '').lower()
+        handler = handlers.get(language)
         if not handler:
-            return {'success': False, 'error': f'Unsupported language: {language}'}
-        
+            return CompiledProgram(language, None, error=f'Unsupported language: {language}')
+
+        temp_dir = self.workspaces.acquire()
         try:
-            return handler(code, input_data)
+            command, error = handler(code, temp_dir, owner)
+        except subprocess.TimeoutExpired:
+            command, error = None, 'Compilation timed out'
+        except Exception as e:
+            command, error = None, f'Execution error: {str(e)}'
+
+        if error:
+            self.workspaces.release(temp_dir)
+            return CompiledProgram(language, None, error=error, owner=owner)
+        return CompiledProgram(language, temp_dir, command, owner=owner, workspaces=self.workspaces)
+
+    def run(self, program, input_data='', checker=None, pass_fds=(), input_file=None):
+        """Run a compiled program against a single input.
+
+        The run is bounded by execution_limits(program.language). memory_mb
+        applies to resident memory: the launcher or the fork server kill the
+        program once it goes over. RLIMIT_AS is only set to the larger
+        address_space_mb, so most allocations that are too big succeed and
+        are caught as the program touches them. One bigger than
+        address_space_mb fails at once; the uncaught MemoryError or
+        std::bad_alloc the program then dies of counts as going over the
+        memory limit too, as does the JVM's OutOfMemoryError.
+
+        Besides success/output/error the result carries status ('ok',
+        'runtime_error', 'time_limit', 'memory_limit', 'output_limit' or
+        'wrong_answer'), cpu_time (user + sys seconds), wall_time (seconds)
+        and memory_kb (peak RSS); cpu_time and memory_kb are None where
+        they can't be measured. returncode is the exit status as subprocess
+        reports it.
+
+        With a checker (see checkers.py) stdout is judged while it streams
+        in: the result gets 'matched', the program is stopped with status
+        'wrong_answer' as soon as the output can't be correct, and only the
+        first OUTPUT_PREVIEW_BYTES of output are kept.
+
+        pass_fds are inherited by the program under the same numbers. The
+        fork server can't pass them on, so such runs start a fresh process.
+
+        input_file (a path) replaces input_data: the program's stdin is
+        opened on the file itself, so the input is never read into Python.
+        """
+        if not program.success:
+            return {'success': False, 'error': program.error}
+
+        limits = execution_limits(program.language)
+        if program.language == 'python' and not pass_fds:
+            forkserver = get_forkserver(program.command[0])
+            if forkserver is not None:
+                try:
+                    return self._run_forked(forkserver, program, input_data, limits, checker, input_file)
+                except OSError:
+                    pass  # Server unavailable; fall back to a fresh interpreter
+                except Exception as e:
+                    return {'success': False, 'error': f'Execution error: {str(e)}'}
+
+        try:
+            with self.scheduler.slot(program.owner):
+                return self._run_process(program, input_data, limits, checker, pass_fds, input_file)
         except Exception as e:
             return {'success': False, 'error': f'Execution error: {str(e)}'}
-    
-    def _execute_c(self, code, input_data):
-        """Execute C code"""
-        temp_dir = tempfile.mkdtemp(dir=self.execution_dir)
+
+    def _run_process(self, program, input_data, limits, checker=None, pass_fds=(), input_file=None):
+        """Run a program as a child process and measure it with wait4"""
+        start_time = time.monotonic()
+        rlimits = _rlimits(program.language, limits)
+        command = program.command
+        preexec_fn = None
+        launcher = get_launcher()
+        report_r = report_w = None
+        if launcher:
+            report_r, report_w = os.pipe()
+            command = launcher_command(launcher, report_w, self.timeout, rlimits, command)
+        else:
+            rlimits = _unwatched_rlimits(rlimits)
+            if resource is not None:
+                preexec_fn = functools.partial(_apply_rlimits, rlimits)
+        stdin = open(input_file, 'rb') if input_file else subprocess.PIPE
         try:
-            source_file = os.path.join(temp_dir, 'program.c')
-            # Add .exe extension on Windows
-            executable_name = 'program.exe' if platform.system() == 'Windows' else 'program'
-            executable = os.path.join(temp_dir, executable_name)
-            
-            with open(source_file, 'w', encoding='utf-8') as f:
-                f.write(code)
-            
-            # Compile
-            compile_cmd = ['gcc', source_file, '-o', executable, '-lm', '-std=c11']
-            compile_result = subprocess.run(
-                compile_cmd,
-                capture_output=True,
-                text=True,
-                timeout=5,
-                cwd=temp_dir
+            proc = subprocess.Popen(
+                command,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=program.work_dir,
+                # Own process group, so a timeout also kills anything the program forked
+                start_new_session=hasattr(os, 'killpg'),
+                pass_fds=tuple(pass_fds) + ((report_w,) if launcher else ()),
+                preexec_fn=preexec_fn,
             )
-            
-            if compile_result.returncode != 0:
-                return {
-                    'success': False,
-                    'error': compile_result.stderr
-                }
-            
-            # Execute
-            run_result = subprocess.run(
-                [executable],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                cwd=temp_dir
-            )
-            
-            return {
-                'success': run_result.returncode == 0,
-                'output': run_result.stdout,
-                'error': run_result.stderr if run_result.returncode != 0 else ''
-            }
-        
+        except Exception:
+            if report_r is not None:
+                os.close(report_r)
+            raise
         finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-    
-    def _execute_cpp(self, code, input_data):
-        """Execute C++ code"""
-        temp_dir = tempfile.mkdtemp(dir=self.execution_dir)
+            if report_w is not None:
+                os.close(report_w)
+            if input_file:
+                stdin.close()
+
+        timed_out = threading.Event()
+        memory_exceeded = False
+
+        def on_timeout():
+            timed_out.set()
+            _kill_process_group(proc)
+
+        def stop(reason):
+            if launcher:
+                proc.terminate()  # The launcher kills the program and still reports its usage
+            else:
+                _kill_process_group(proc)
+
+        # The launcher enforces the timeout itself; then this timer is only a backstop
+        timer = threading.Timer(self.timeout + (1 if launcher else 0), on_timeout)
+        timer.start()
         try:
-            source_file = os.path.join(temp_dir, 'program.cpp')
-            # Add .exe extension on Windows
-            executable_name = 'program.exe' if platform.system() == 'Windows' else 'program'
-            executable = os.path.join(temp_dir, executable_name)
-            
-            with open(source_file, 'w', encoding='utf-8') as f:
-                f.write(code)
-            
-            # Compile
-            compile_cmd = ['g++', source_file, '-o', executable, '-std=c++17']
-            compile_result = subprocess.run(
-                compile_cmd,
-                capture_output=True,
-                text=True,
-                timeout=5,
-                cwd=temp_dir
-            )
-            
-            if compile_result.returncode != 0:
-                return {
-                    'success': False,
-                    'error': compile_result.stderr
-                }
-            
-            # Execute
-            run_result = subprocess.run(
-                [executable],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                cwd=temp_dir
-            )
-            
-            return {
-                'success': run_result.returncode == 0,
-                'output': run_result.stdout,
-                'error': run_result.stderr if run_result.returncode != 0 else ''
-            }
-        
+            stdout, stderr, stop_reason, truncated = _communicate(
+                proc, _input_bytes(input_data, input_file), limits.get('output_bytes'), stop, checker)
+            if launcher:
+                proc.wait()
+                with os.fdopen(report_r) as report_file:
+                    report_r = None
+                    report = parse_report(report_file.read())
+                returncode, usage = proc.returncode, {'cpu_time': None, 'memory_kb': None}
+                if report is not None:
+                    returncode, launcher_timed_out, (utime, stime, maxrss), memory_exceeded = report
+                    usage = _usage_stats(utime, stime, maxrss)
+                    if launcher_timed_out:
+                        timed_out.set()
+            else:
+                returncode, usage = _reap(proc)
         finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-    
-    def _execute_java(self, code, input_data):
-        """Execute Java code"""
-        temp_dir = tempfile.mkdtemp(dir=self.execution_dir)
-        try:
-            # Extract class name from code (simple heuristic)
-            class_name = 'Main'
-            if 'class' in code:
-                for line in code.split('\n'):
-                    if 'class' in line and '{' in line:
-                        parts = line.split()
-                        if 'class' in parts:
-                            idx = parts.index('class')
-                            if idx + 1 < len(parts):
-                                class_name = parts[idx + 1].split('{')[0].strip()
-                                break
-            
-            source_file = os.path.join(temp_dir, f'{class_name}.java')
-            
-            with open(source_file, 'w', encoding='utf-8') as f:
-                f.write(code)
-            
-            # Compile
-            compile_cmd = ['javac', source_file]
+            timer.cancel()
+            if report_r is not None:
+                os.close(report_r)
+        usage['wall_time'] = time.monotonic() - start_time
+
+        return _run_result(returncode, stdout, stderr, usage, rlimits, timed_out.is_set(),
+                           stop_reason, truncated, checker, _memory_limit_kb(limits), memory_exceeded)
+
+    def _run_forked(self, forkserver, program, input_data, limits, checker=None, input_file=None):
+        """Run a Python program as a fork of the warm interpreter server"""
+        script = program.command[-1]
+        rlimits = _rlimits(program.language, limits)
+        with self.scheduler.slot(program.owner):
+            start_time = time.monotonic()
+            if input_file:
+                with open(input_file, 'rb') as stdin:
+                    proc = forkserver.spawn(script, program.work_dir, self.timeout, rlimits,
+                                            stdin_fd=stdin.fileno())
+            else:
+                proc = forkserver.spawn(script, program.work_dir, self.timeout, rlimits)
+            try:
+                stdout, stderr, stop_reason, truncated = _communicate(
+                    proc, _input_bytes(input_data, input_file), limits.get('output_bytes'),
+                    lambda reason: proc.kill(), checker)
+                proc.wait()
+            except BaseException:
+                # Don't leave the program running on a broken connection
+                proc.kill()
+                proc.close()
+                raise
+            usage = _usage_stats(**proc.rusage)
+            usage['wall_time'] = time.monotonic() - start_time
+
+        return _run_result(proc.returncode, stdout, stderr, usage, rlimits, proc.timed_out,
+                           stop_reason, truncated, checker, _memory_limit_kb(limits), proc.memory_exceeded)
+
+    def _run_compiler(self, language, code, compiler, flags, source_file, output_args, temp_dir, owner,
+                      launcher_args=()):
+        """Compile source_file into temp_dir, reusing a cached build when possible.
+
+        launcher_args only tune the compiler process (e.g. JVM options) and
+        are not part of the cache key. Returns the compiler's stderr on
+        failure, '' on success.
+        """
+        cache_key = None
+        if self.compile_cache is not None:
+            cache_key = self.compile_cache.key(language, code, compiler, flags)
+            if self.compile_cache.fetch(cache_key, temp_dir):
+                return ''
+
+        compile_cmd = [compiler] + list(launcher_args) + [source_file] + output_args + flags
+        with self.scheduler.slot(owner):
             compile_result = subprocess.run(
                 compile_cmd,
                 capture_output=True,
                 text=True,
-                timeout=5,
-                cwd=temp_dir
-            )
-            
-            if compile_result.returncode != 0:
-                return {
-                    'success': False,
-                    'error': compile_result.stderr
-                }
-            
-            # Execute
-            run_result = subprocess.run(
-                ['java', '-cp', temp_dir, class_name],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
+                timeout=self.compile_timeout,
                 cwd=temp_dir
             )
-            
-            return {
-                'success': run_result.returncode == 0,
-                'output': run_result.stdout,
-                'error': run_result.stderr if run_result.returncode != 0 else ''
-            }
-        
-        finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-    
-    def _execute_python(self, code, input_data):
-        """Execute Python code"""
-        temp_dir = tempfile.mkdtemp(dir=self.execution_dir)
+        if compile_result.returncode != 0:
+            return compile_result.stderr or 'Compilation failed'
+
+        if cache_key is not None:
+            self.compile_cache.store(cache_key, temp_dir, exclude=(os.path.basename(source_file),))
+        return ''
+
+    def _compile_c(self, code, temp_dir, owner):
+        """Compile C code"""
+        source_file = os.path.join(temp_dir, 'program.c')
+        # Add .exe extension on Windows
+        executable_name = 'program.exe' if platform.system() == 'Windows' else 'program'
+        executable = os.path.join(temp_dir, executable_name)
+
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+        error = self._run_compiler('c', code, 'gcc', ['-lm', '-std=c11'],
+                                   source_file, ['-o', executable], temp_dir, owner)
+        return [executable], error
+
+    def _compile_cpp(self, code, temp_dir, owner):
+        """Compile C++ code"""
+        source_file = os.path.join(temp_dir, 'program.cpp')
+        # Add .exe extension on Windows
+        executable_name = 'program.exe' if platform.system() == 'Windows' else 'program'
+        executable = os.path.join(temp_dir, executable_name)
+
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+        error = self._run_compiler('cpp', code, 'g++', ['-std=c++17'],
+                                   source_file, ['-o', executable], temp_dir, owner)
+        return [executable], error
+
+    def _compile_java(self, code, temp_dir, owner):
+        """Compile Java code"""
+        # Extract class name from code (simple heuristic)
+        class_name = 'Main'
+        if 'class' in code:
+            for line in code.split('\n'):
+                if 'class' in line and '{' in line:
+                    parts = line.split()
+                    if 'class' in parts:
+                        idx = parts.index('class')
+                        if idx + 1 < len(parts):
+                            class_name = parts[idx + 1].split('{')[0].strip()
+                            break
+
+        source_file = os.path.join(temp_dir, f'{class_name}.java')
+
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+        error = self._run_compiler('java', code, 'javac', [], source_file, [], temp_dir, owner,
+                                   launcher_args=java_cds.javac_launcher_args())
+        # The memory limit caps the heap; see _rlimits
+        memory_mb = execution_limits('java').get('memory_mb')
+        heap_args = [f'-Xmx{memory_mb}m'] if memory_mb else []
+        return ['java'] + java_cds.java_launcher_args() + heap_args + ['-cp', temp_dir, class_name], error
+
+    def _compile_python(self, code, temp_dir, owner):
+        """Prepare Python code (no compilation step)"""
+        script_file = os.path.join(temp_dir, 'program.py')
+
+        with open(script_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+        # Use python3 on Unix, python on Windows
+        python_cmd = 'python3' if platform.system() != 'Windows' else 'python'
+        return [python_cmd, script_file], ''
+
+
+def execution_limits(language):
+    """Resource limits for one run: EXECUTION_LIMITS['default'] with per-language overrides"""
+    configured = getattr(settings, 'EXECUTION_LIMITS', {})
+    limits = dict(DEFAULT_EXECUTION_LIMITS)
+    limits.update(configured.get('default', {}))
+    limits.update(configured.get(language, {}))
+    return limits
+
+
+def _rlimits(language, limits):
+    """Limits for a run, keyed by RLIMIT_ name; unset limits are left out.
+
+    'RSS' is not set with setrlimit (Linux ignores RLIMIT_RSS): the
+    launcher or the fork server watch the program's resident memory and
+    kill it once it goes over. Neither is 'NPROC', since RLIMIT_NPROC
+    counts every process of the account running the judge: they count
+    the processes in the program's group instead.
+    """
+    memory_mb = limits.get('memory_mb')
+    address_space_mb = max(limits.get('address_space_mb') or 0, memory_mb or 0)
+    cpu_seconds = limits.get('cpu_seconds')
+    # The JVM reserves far more address space than it touches, so Java gets -Xmx instead
+    java = language == 'java'
+    rlimits = {
+        'AS': address_space_mb * 1024 * 1024 if address_space_mb and not java else None,
+        'RSS': memory_mb * 1024 * 1024 if memory_mb and not java else None,
+        'CPU': math.ceil(cpu_seconds) if cpu_seconds else None,
+        'NPROC': limits.get('processes'),
+        'NOFILE': limits.get('open_files'),
+    }
+    return {name: int(value) for name, value in rlimits.items() if value}
+
+
+def _unwatched_rlimits(rlimits):
+    """Limits for a program started without the launcher: nothing watches its
+    resident memory, so the memory limit caps its address space instead.
+    Nothing counts its processes either, and RLIMIT_NPROC isn't per run,
+    so it gets no process limit."""
+    rlimits = dict(rlimits)
+    rlimits.pop('NPROC', None)
+    resident = rlimits.pop('RSS', None)
+    if resident:
+        rlimits['AS'] = min(rlimits.get('AS', resident), resident)
+    return rlimits
+
+
+def _memory_limit_kb(limits):
+    memory_mb = limits.get('memory_mb')
+    return memory_mb * 1024 if memory_mb else None
+
+
+def _apply_rlimits(rlimits):
+    """preexec_fn for programs started without the launcher"""
+    for name, value in rlimits.items():
+        resource_id = getattr(resource, 'RLIMIT_' + name, None)
+        if resource_id is None:
+            continue
+        _, hard = resource.getrlimit(resource_id)
+        # SIGXCPU at the soft CPU limit, SIGKILL a second later
+        wanted = value + 1 if name == 'CPU' else value
+        if hard != resource.RLIM_INFINITY:
+            wanted = min(wanted, hard)
+        resource.setrlimit(resource_id, (min(value, wanted), wanted))
+
+
+def _communicate(proc, input_bytes, output_limit=None, stop=None, checker=None):
+    """Feed stdin and drain stdout/stderr concurrently so no pipe can fill up.
+
+    Once stdout and stderr together exceed output_limit bytes
+    ('output_limit'), or the checker rejects stdout ('mismatch'),
+    stop(reason) is called and the rest of the output is discarded. With a
+    checker only a preview of stdout is kept.
+    input_bytes is None when proc reads its stdin from a file.
+    Returns (stdout, stderr, stop_reason, stdout_truncated).
+    """
+    chunks = {'stdout': [], 'stderr': []}
+    state = {'total': 0, 'kept': 0, 'stop_reason': None, 'truncated': False}
+    lock = threading.Lock()
+
+    def feed():
         try:
-            script_file = os.path.join(temp_dir, 'program.py')
-            
-            with open(script_file, 'w', encoding='utf-8') as f:
-                f.write(code)
-            
-            # Use python3 on Unix, python on Windows
-            python_cmd = 'python3' if platform.system() != 'Windows' else 'python'
-            
-            # Execute
-            run_result = subprocess.run(
-                [python_cmd, script_file],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                cwd=temp_dir
-            )
-            
-            return {
-                'success': run_result.returncode == 0,
-                'output': run_result.stdout,
-                'error': run_result.stderr if run_result.returncode != 0 else ''
-            }
-        
+            proc.stdin.write(input_bytes)
+        except BrokenPipeError:
+            pass
         finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def drain(name):
+        stream = getattr(proc, name)
+        for chunk in iter(lambda: stream.read1(65536), b''):
+            reason = None
+            with lock:
+                if state['stop_reason']:
+                    continue
+                state['total'] += len(chunk)
+                if output_limit is not None and state['total'] > output_limit:
+                    reason = 'output_limit'
+                    chunk = chunk[:len(chunk) - (state['total'] - output_limit)]
+                if name == 'stdout' and checker is not None:
+                    if reason is None and not checker.feed(chunk):
+                        reason = 'mismatch'
+                    # The checker has seen the chunk; keep only what will be displayed
+                    room = max(0, OUTPUT_PREVIEW_BYTES - state['kept'])
+                    if len(chunk) > room:
+                        state['truncated'] = True
+                        chunk = chunk[:room]
+                    state['kept'] += len(chunk)
+                chunks[name].append(chunk)
+                state['stop_reason'] = reason
+            if reason and stop is not None:
+                stop(reason)
+        stream.close()
+
+    threads = [
+        threading.Thread(target=drain, args=('stdout',), daemon=True),
+        threading.Thread(target=drain, args=('stderr',), daemon=True),
+    ]
+    if input_bytes is not None:
+        threads.append(threading.Thread(target=feed, daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (b''.join(chunks['stdout']), b''.join(chunks['stderr']),
+            state['stop_reason'], state['truncated'])
+
+
+def _input_bytes(input_data, input_file):
+    return None if input_file else (input_data or '').encode('utf-8')
+
+
+def _kill_process_group(proc):
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
+
+
+def _reap(proc):
+    """Wait for a directly started program; returns (returncode, usage)"""
+    if not hasattr(os, 'wait4'):
+        proc.wait()
+        return proc.returncode, {'cpu_time': None, 'memory_kb': None}
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss of a program exec'd from this process includes our own
+    # high-water mark, so only the CPU time is meaningful here
+    return proc.returncode, {'cpu_time': rusage.ru_utime + rusage.ru_stime, 'memory_kb': None}
+
+
+def _usage_stats(utime, stime, maxrss):
+    """CPU seconds (user + sys) and peak resident memory in KB"""
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    memory_kb = maxrss // 1024 if sys.platform == 'darwin' else maxrss
+    return {'cpu_time': utime + stime, 'memory_kb': int(memory_kb)}
+
+
+def _run_result(returncode, stdout, stderr, usage, rlimits, timed_out=False, stop_reason=None,
+                truncated=False, checker=None, memory_limit_kb=None, memory_exceeded=False):
+    """Build a run result and classify how the program ended"""
+    result = dict(usage, success=False, output='', error='', returncode=returncode)
+    if checker is not None:
+        result['matched'] = False
+        result['output_truncated'] = truncated
+    if stop_reason == 'mismatch':
+        return dict(result, status='wrong_answer', output=_decode_output(stdout))
+    if stop_reason == 'output_limit':
+        return dict(result, status='output_limit', error='Output limit exceeded')
+
+    output = _decode_output(stdout)
+    error = _decode_output(stderr)
+    if _out_of_memory(returncode, error, usage, rlimits, memory_limit_kb, memory_exceeded):
+        return dict(result, status='memory_limit', output=output, error='Memory limit exceeded')
+    if timed_out or _cpu_limit_exceeded(returncode, usage, rlimits):
+        return dict(result, status='time_limit', error='Time limit exceeded')
+    if returncode == 0:
+        if checker is not None:
+            result['matched'] = checker.finish()
+        return dict(result, status='ok', success=True, output=output)
+    return dict(result, status='runtime_error', output=output, error=error)
+
+
+def _cpu_limit_exceeded(returncode, usage, rlimits):
+    if 'CPU' not in rlimits or returncode >= 0:
+        return False
+    if returncode == -getattr(signal, 'SIGXCPU', 0):
+        return True
+    # Killed at the hard limit
+    return usage.get('cpu_time') is not None and usage['cpu_time'] >= rlimits['CPU']
+
+
+def _out_of_memory(returncode, error, usage, rlimits, memory_limit_kb, memory_exceeded):
+    """Whether a run went over its memory limit.
+
+    Goes by the memory it used, or by the program dying of an allocation
+    the limits refused; an out-of-memory message printed on its own is
+    still a runtime error.
+    """
+    if memory_exceeded:
+        return True  # Killed for it by the launcher or the fork server
+    if returncode != 0:
+        if 'AS' in rlimits and ALLOCATION_REFUSED.search(error):
+            return True
+        if 'AS' not in rlimits and JAVA_OUT_OF_MEMORY in error:
+            # Java: the JVM throws OutOfMemoryError at -Xmx, also for a single
+            # allocation too big for the heap, which never shows in its peak
+            return True
+    peak_kb = usage.get('memory_kb')
+    if peak_kb is None or not memory_limit_kb:
+        return False
+    # Went over between two checks of its resident memory
+    return 'RSS' in rlimits and peak_kb > memory_limit_kb
+
 
+def _decode_output(data):
+    """Decode like subprocess text mode (universal newlines)"""
+    return data.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+STATS_FILE = 'stats.json'
+LOCK_FILE = '.lock'
+
+_toolchain_versions = {}
+_toolchain_lock = threading.Lock()
+
+
+def toolchain_version(compiler):
+    """Return the first line of `compiler --version`, memoized per process"""
+    with _toolchain_lock:
+        if compiler not in _toolchain_versions:
+            try:
+                result = subprocess.run(
+                    [compiler, '-version' if compiler == 'javac' else '--version'],
+                    capture_output=True,
+                    text=True,
+                    timeout=5
+                )
+                output = (result.stdout or result.stderr).strip()
+                _toolchain_versions[compiler] = output.splitlines()[0] if output else 'unknown'
+            except Exception:
+                _toolchain_versions[compiler] = 'unknown'
+        return _toolchain_versions[compiler]
+
+
+class CompileCache:
+    """
+    Content-addressed on-disk cache of compiled programs.
+
+    Entries live under COMPILE_CACHE_DIR (inside EXECUTION_DIR by default),
+    keyed by language, source hash, compiler flags and compiler version, so
+    they survive process restarts. Each entry directory's mtime is its
+    last-used time; once the cache grows past COMPILE_CACHE_MAX_BYTES the
+    least recently used entries are evicted. Hit/miss counters are kept in
+    stats.json next to the entries.
+
+    Artifacts are copied in and out rather than linked: a program runs in
+    the directory it was built or fetched into and can rewrite its own
+    files there (e.g. Java's Main.class), which through a hard link would
+    change the cached entry for every later identical submission. Cached
+    files are also made read-only.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        if root is None:
+            root = getattr(settings, 'COMPILE_CACHE_DIR', None)
+        if root is None:
+            root = os.path.join(settings.EXECUTION_DIR, 'compile_cache')
+        self.root = str(root)
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(language, code, compiler, flags):
+        """Build the cache key for a source file and its toolchain"""
+        digest = hashlib.sha256()
+        for part in (language, compiler, toolchain_version(compiler), ' '.join(flags)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(code.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key, dest_dir):
+        """Copy a cached entry's artifacts into dest_dir. Returns True on a hit"""
+        entry_dir = self._entry_dir(key)
+        try:
+            names = os.listdir(entry_dir)
+            for name in names:
+                self._copy(os.path.join(entry_dir, name), os.path.join(dest_dir, name), writable=True)
+            # Touch the entry so LRU eviction sees it as recently used
+            os.utime(entry_dir)
+        except OSError:
+            self._record('misses')
+            return False
+        self._record('hits')
+        return True
+
+    def store(self, key, build_dir, exclude=()):
+        """Copy the artifacts in build_dir (minus excluded names) into the cache"""
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            return
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=self.root, prefix='.staging-')
+        try:
+            for name in os.listdir(build_dir):
+                path = os.path.join(build_dir, name)
+                if name in exclude or not os.path.isfile(path):
+                    continue
+                self._copy(path, os.path.join(staging_dir, name), writable=False)
+            # Atomic publish; if another worker beat us to it keep theirs
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        total = 0
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard.startswith('.') or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                entry_dir = os.path.join(shard_dir, key)
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(entry_dir, name))
+                        for name in os.listdir(entry_dir)
+                    )
+                    entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+                except OSError:
+                    continue
+                total += size
+
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            evicted += 1
+        self._record('evictions', evicted)
+
+    def stats(self):
+        """Return persisted hit/miss/eviction counters"""
+        with self._locked():
+            return self._read_stats()
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.root, STATS_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _record(self, counter, amount=1):
+        if not amount:
+            return
+        try:
+            with self._locked():
+                stats = self._read_stats()
+                stats[counter] = stats.get(counter, 0) + amount
+                stats_path = os.path.join(self.root, STATS_FILE)
+                with open(stats_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(stats, f)
+                os.replace(stats_path + '.tmp', stats_path)
+        except OSError:
+            pass
+
+    def _locked(self):
+        return FileLock(os.path.join(self.root, LOCK_FILE))
+
+    @staticmethod
+    def _copy(src, dst, writable):
+        """Copy a file and its permissions, with or without the write bits"""
+        mode = stat.S_IMODE(os.stat(src).st_mode)
+        shutil.copyfile(src, dst)
+        if writable:
+            mode |= stat.S_IWUSR
+        else:
+            mode &= ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+        os.chmod(dst, mode)
+
+
+class FileLock:
+    """Cross-process (flock) and cross-thread lock on a file path.
+
+    Only the thread lock applies where fcntl is unavailable.
+    """
+
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        with self._thread_locks_guard:
+            self._thread_lock = self._thread_locks.setdefault(path, threading.Lock())
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        self._thread_lock.release()
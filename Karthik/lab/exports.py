@@ -0,0 +1,166 @@
+"""
+Streaming exports of submissions and grades, as CSV or JSON lines.
+
+Rows are read with a chunked iterator (a server-side cursor where the
+database has one) and written to a StreamingHttpResponse as they come, a
+few hundred lines per chunk, so an export of any size holds only one chunk
+of rows in memory.
+
+A grade row is a student with their total score, plus the problems they
+solved and the points those earned within the export's filters: for one
+problem, or between two dates, those give the marks for that problem or
+period.
+"""
+import csv
+import json
+
+from django.db.models import Count, Q, Sum
+from django.http import StreamingHttpResponse
+
+from .models import Submission, UserProfile
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+ITERATOR_CHUNK_SIZE = 2000  # rows fetched from the database at a time
+LINES_PER_CHUNK = 500  # lines sent to the client at a time
+
+SUBMISSION_COLUMNS = [
+    ('id', 'id'),
+    ('username', 'user__username'),
+    ('branch', 'user__userprofile__branch'),
+    ('year', 'user__userprofile__year'),
+    ('semester', 'user__userprofile__semester'),
+    ('problem_id', 'problem_id'),
+    ('problem', 'problem__title'),
+    ('language', 'language'),
+    ('status', 'status'),
+    ('test_cases_passed', 'test_cases_passed'),
+    ('total_test_cases', 'total_test_cases'),
+    ('execution_time', 'execution_time'),
+    ('peak_memory_kb', 'peak_memory_kb'),
+    ('submitted_at', 'submitted_at'),
+]
+
+GRADE_COLUMNS = [
+    ('username', 'user__username'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('email', 'user__email'),
+    ('branch', 'branch'),
+    ('year', 'year'),
+    ('semester', 'semester'),
+    ('score', 'score'),
+    ('solved', 'solved'),
+    ('points', 'points'),
+]
+
+
+def submissions(branch=None, year=None, semester=None, problem=None, since=None, until=None):
+    """Submissions to export, oldest first; since and until are datetimes (until exclusive)"""
+    queryset = Submission.objects.all()
+    if branch:
+        queryset = queryset.filter(user__userprofile__branch=branch)
+    if year is not None:
+        queryset = queryset.filter(user__userprofile__year=year)
+    if semester is not None:
+        queryset = queryset.filter(user__userprofile__semester=semester)
+    if problem is not None:
+        queryset = queryset.filter(problem_id=problem)
+    if since is not None:
+        queryset = queryset.filter(submitted_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(submitted_at__lt=until)
+    return queryset
+
+
+def grades(branch=None, year=None, semester=None, problem=None, since=None, until=None):
+    """Student profiles to export, annotated with the problems solved and points earned within the filters"""
+    queryset = UserProfile.objects.filter(role='student')
+    if branch:
+        queryset = queryset.filter(branch=branch)
+    if year is not None:
+        queryset = queryset.filter(year=year)
+    if semester is not None:
+        queryset = queryset.filter(semester=semester)
+    return annotate_grades(queryset, problem=problem, since=since, until=until)
+
+
+def annotate_grades(queryset, problem=None, since=None, until=None):
+    solves = Q()
+    if problem is not None:
+        solves &= Q(user__solved_problems__problem_id=problem)
+    if since is not None:
+        solves &= Q(user__solved_problems__solved_at__gte=since)
+    if until is not None:
+        solves &= Q(user__solved_problems__solved_at__lt=until)
+    return queryset.annotate(
+        solved=Count('user__solved_problems', filter=solves),
+        points=Sum('user__solved_problems__points', filter=solves, default=0),
+    )
+
+
+def submission_rows(queryset):
+    return _rows(queryset.order_by('submitted_at', 'id'), SUBMISSION_COLUMNS)
+
+
+def grade_rows(queryset):
+    return _rows(queryset.order_by('branch', 'year', 'user__username'), GRADE_COLUMNS)
+
+
+def _rows(queryset, columns):
+    """Dicts of the export's columns, fetched ITERATOR_CHUNK_SIZE rows at a time"""
+    lookups = [lookup for _, lookup in columns]
+    for values in queryset.values_list(*lookups).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield {name: value for (name, _), value in zip(columns, values)}
+
+
+class _Lines:
+    """File-like target for csv.writer that hands back what was written"""
+
+    def write(self, line):
+        return line
+
+
+def _csv_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    # Spreadsheets run cells starting with these as formulas
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def lines(rows, columns, file_format):
+    """The export's text, a chunk of LINES_PER_CHUNK lines at a time"""
+    names = [name for name, _ in columns]
+    writer = csv.writer(_Lines())
+
+    def encode(row):
+        if file_format == 'csv':
+            return writer.writerow([_csv_value(row[name]) for name in names])
+        return json.dumps(row, default=_json_value) + '\n'
+
+    chunk = [writer.writerow(names)] if file_format == 'csv' else []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) >= LINES_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def streaming_response(rows, columns, file_format, filename):
+    """A download of the rows in file_format ('csv' or 'jsonl'), streamed as it is generated"""
+    response = StreamingHttpResponse(lines(rows, columns, file_format), content_type=FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
@@ -0,0 +1,189 @@
+"""
+Client for the warm Python fork server (see pyrunner_server.py).
+
+Each Django or judge worker process starts its own server on first use.
+Every Python run is then a fork of an already initialized interpreter
+instead of a fresh `python3` start.
+"""
+import atexit
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+from django.conf import settings
+
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyrunner_server.py')
+
+
+class ForkServerProcess:
+    """Popen-like handle for a program started by the fork server"""
+
+    def __init__(self, conn, pid, stdin, stdout, stderr):
+        self.conn = conn
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+        self.timed_out = False
+        self.memory_exceeded = False
+        self.rusage = None
+        self._reader = conn.makefile('rb')
+
+    def wait(self):
+        """Block until the server reports the program's exit"""
+        if self.returncode is None:
+            line = self._reader.readline()
+            self._reader.close()
+            self.conn.close()
+            if not line:
+                raise OSError('Python fork server closed the connection')
+            try:
+                result = json.loads(line)
+                returncode, timed_out, rusage = result['returncode'], result['timed_out'], result['rusage']
+                memory_exceeded = result['memory_exceeded']
+            except (ValueError, TypeError, KeyError):
+                raise ValueError(f'Malformed exit report from the Python fork server: {line[:200]!r}')
+            self.returncode, self.timed_out, self.rusage = returncode, timed_out, rusage
+            self.memory_exceeded = memory_exceeded
+        return self.returncode
+
+    def kill(self):
+        """Ask the server to kill the program"""
+        try:
+            self.conn.sendall(b'kill\n')
+        except OSError:
+            pass
+
+    def close(self):
+        """Close the pipes and the connection to the server"""
+        for stream in (self.stdin, self.stdout, self.stderr, self._reader):
+            if stream is not None:
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+        self.conn.close()
+
+
+class PythonForkServer:
+    """Starts, restarts and talks to one pyrunner_server.py process"""
+
+    def __init__(self, python_cmd):
+        self.python_cmd = python_cmd
+        self.process = None
+        self.socket_dir = None
+        self.socket_path = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self.process is not None and self.process.poll() is None:
+                return
+            self._cleanup()
+            # Unix socket paths are length-limited, so keep it short and out of EXECUTION_DIR
+            self.socket_dir = tempfile.mkdtemp(prefix='pyfork-')
+            self.socket_path = os.path.join(self.socket_dir, 'sock')
+            self.process = subprocess.Popen(
+                [self.python_cmd, SERVER_SCRIPT, self.socket_path],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                cwd=self.socket_dir,
+                start_new_session=True,
+            )
+            if self.process.stdout.readline().strip() != b'ready':
+                self._cleanup()
+                raise OSError('Python fork server failed to start')
+
+    def spawn(self, script, cwd, timeout, rlimits=None, stdin_fd=None):
+        """Start script in a forked interpreter and return a ForkServerProcess.
+
+        rlimits maps RLIMIT_ names without the prefix (e.g. 'AS') to values;
+        'RSS' is the resident memory the server lets the program use and
+        'NPROC' the processes in its group.
+        With stdin_fd (e.g. an open input file) the program reads that
+        instead of a pipe and the returned process has no stdin.
+        """
+        self._ensure_started()
+
+        if stdin_fd is None:
+            stdin_r, stdin_w = os.pipe()
+        else:
+            # A duplicate, so closing it below leaves the caller's descriptor open
+            stdin_r, stdin_w = os.dup(stdin_fd), None
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            request = json.dumps({'script': script, 'cwd': cwd, 'timeout': timeout,
+                                  'rlimits': rlimits or {}})
+            socket.send_fds(conn, [request.encode('utf-8')], [stdin_r, stdout_w, stderr_w])
+        except OSError:
+            conn.close()
+            for fd in (stdin_r, stdin_w, stdout_r, stdout_w, stderr_r, stderr_w):
+                if fd is not None:
+                    os.close(fd)
+            raise
+
+        # The child has its own copies now
+        for fd in (stdin_r, stdout_w, stderr_w):
+            os.close(fd)
+
+        proc = ForkServerProcess(
+            conn, None,
+            os.fdopen(stdin_w, 'wb') if stdin_w is not None else None,
+            os.fdopen(stdout_r, 'rb'),
+            os.fdopen(stderr_r, 'rb'),
+        )
+        try:
+            reply = json.loads(proc._reader.readline() or b'{}')
+        except (OSError, ValueError):
+            reply = {'error': 'Python fork server sent a malformed reply'}
+        if not isinstance(reply, dict) or not isinstance(reply.get('pid'), int):
+            proc.close()
+            # Nothing was started, so the caller can still run the program another way
+            error = reply.get('error') if isinstance(reply, dict) else None
+            raise OSError(error or 'Python fork server did not start the program')
+        proc.pid = reply['pid']
+        return proc
+
+    def stop(self):
+        with self._lock:
+            self._cleanup()
+
+    def _cleanup(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            self.process.stdout.close()
+            self.process = None
+        if self.socket_dir:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+            self.socket_dir = None
+
+
+_forkserver = None
+_forkserver_lock = threading.Lock()
+
+
+def get_forkserver(python_cmd):
+    """Process-wide fork server, or None where it is disabled or unsupported"""
+    global _forkserver
+    if not getattr(settings, 'PYTHON_FORKSERVER_ENABLED', True):
+        return None
+    if not hasattr(os, 'fork') or not hasattr(socket, 'send_fds'):
+        return None
+    with _forkserver_lock:
+        if _forkserver is None:
+            _forkserver = PythonForkServer(python_cmd)
+            atexit.register(_forkserver.stop)
+        return _forkserver
@@ -0,0 +1,145 @@
+"""
+Class-data-sharing (CDS) archives that cut JVM startup for javac and java.
+
+javac's own classes (jdk.compiler) are not in the JDK's default CDS
+archive, and neither are many classes student programs use (Scanner,
+BufferedReader, collections, formatting). Once per JDK version we run a
+small warmup program, dump the list of classes javac and java load, and
+build one static archive for each. Later compiles and runs map those
+archives instead of loading and verifying the classes again.
+
+Archives live in EXECUTION_DIR/java_cds/<jdk hash>/. If the JDK can't
+build them (old JDK, no write access) a <jdk hash>.failed marker is left
+and Java runs without them; delete the marker to retry.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from django.conf import settings
+
+from .compile_cache import toolchain_version, FileLock
+
+
+WARMUP_SOURCE = '''import java.io.*;
+import java.util.*;
+
+public class Warmup {
+    public static void main(String[] args) throws IOException {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
+        Scanner scanner = new Scanner("3 1 2\\nhello");
+        List<Integer> values = new ArrayList<>();
+        Map<String, Integer> counts = new HashMap<>();
+        while (scanner.hasNextInt()) {
+            values.add(scanner.nextInt());
+        }
+        counts.put(scanner.next(), values.size());
+        Collections.sort(values);
+        int[] array = values.stream().mapToInt(Integer::intValue).toArray();
+        Arrays.sort(array);
+        StringBuilder builder = new StringBuilder();
+        for (int value : array) {
+            builder.append(value).append(' ');
+        }
+        PrintWriter out = new PrintWriter(new BufferedWriter(new OutputStreamWriter(System.out)));
+        out.println(builder.toString().trim() + counts + Math.max(1, 2) + reader.readLine());
+        System.out.printf("%.2f%n", 1.0);
+        out.flush();
+    }
+}
+'''
+
+# Faster JVM startup for short-lived processes; these do not change program semantics
+JAVAC_JVM_FLAGS = ['-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC']
+JAVA_JVM_FLAGS = ['-XX:+UseSerialGC']
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def _archive_dir():
+    jdk = toolchain_version('java') + '|' + toolchain_version('javac')
+    jdk_hash = hashlib.sha256(jdk.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(str(settings.EXECUTION_DIR), 'java_cds', jdk_hash)
+
+
+def _build_archives(archive_dir):
+    """Generate javac.jsa and java.jsa from a warmup run. Returns True on success"""
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(archive_dir))
+    try:
+        source_file = os.path.join(work_dir, 'Warmup.java')
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(WARMUP_SOURCE)
+
+        javac_classlist = os.path.join(work_dir, 'javac.classlist')
+        java_classlist = os.path.join(work_dir, 'java.classlist')
+        steps = [
+            ['javac', f'-J-XX:DumpLoadedClassList={javac_classlist}', source_file],
+            ['java', f'-XX:DumpLoadedClassList={java_classlist}', '-cp', work_dir, 'Warmup'],
+            ['java', '-Xshare:dump', f'-XX:SharedClassListFile={javac_classlist}',
+             f'-XX:SharedArchiveFile={os.path.join(work_dir, "javac.jsa")}', '-Xlog:disable'],
+            ['java', '-Xshare:dump', f'-XX:SharedClassListFile={java_classlist}',
+             f'-XX:SharedArchiveFile={os.path.join(work_dir, "java.jsa")}', '-Xlog:disable'],
+        ]
+        for cmd in steps:
+            result = subprocess.run(cmd, input='', capture_output=True, text=True,
+                                    timeout=120, cwd=work_dir)
+            if result.returncode != 0:
+                return False
+
+        os.makedirs(archive_dir, exist_ok=True)
+        for name in ('javac.jsa', 'java.jsa'):
+            os.replace(os.path.join(work_dir, name), os.path.join(archive_dir, name))
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def get_archives():
+    """Return (javac_archive, java_archive) paths, building them on first use.
+
+    Returns (None, None) when CDS is disabled or the archives can't be built.
+    """
+    if not getattr(settings, 'JAVA_CDS_ENABLED', True):
+        return None, None
+
+    archive_dir = _archive_dir()
+    with _archives_lock:
+        if archive_dir not in _archives:
+            os.makedirs(os.path.dirname(archive_dir), exist_ok=True)
+            failed_marker = archive_dir + '.failed'
+            javac_archive = os.path.join(archive_dir, 'javac.jsa')
+            java_archive = os.path.join(archive_dir, 'java.jsa')
+            # Only one process builds; the others wait on the lock and reuse the result
+            with FileLock(archive_dir + '.lock'):
+                if not os.path.exists(java_archive) and not os.path.exists(failed_marker):
+                    if not _build_archives(archive_dir):
+                        open(failed_marker, 'w').close()
+            if os.path.exists(javac_archive) and os.path.exists(java_archive):
+                _archives[archive_dir] = (javac_archive, java_archive)
+            else:
+                _archives[archive_dir] = (None, None)
+        return _archives[archive_dir]
+
+
+def javac_launcher_args():
+    """Extra `-J` options for javac"""
+    javac_archive, _ = get_archives()
+    args = ['-J' + flag for flag in JAVAC_JVM_FLAGS]
+    if javac_archive:
+        args += ['-J-Xshare:auto', f'-J-XX:SharedArchiveFile={javac_archive}', '-J-Xlog:disable']
+    return args
+
+
+def java_launcher_args():
+    """Extra JVM options for running student programs"""
+    _, java_archive = get_archives()
+    args = list(JAVA_JVM_FLAGS)
+    if java_archive:
+        # -Xlog:disable keeps CDS warnings out of the program's stdout
+        args += ['-Xshare:auto', f'-XX:SharedArchiveFile={java_archive}', '-Xlog:disable']
+    return args
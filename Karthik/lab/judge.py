@@ -0,0 +1,398 @@
+"""
+Judging pipeline shared by the /execute/ view and the judge_worker command.
+
+Submissions are queued as JudgeJob rows; a standalone worker process
+(`python manage.py judge_worker`) claims jobs, runs the test cases and
+writes the verdict back onto the Submission.
+"""
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .checkers import ExactChecker, checker_for
+from .code_executor import CodeExecutor
+from .models import Submission, TestCaseResult, JudgeJob
+from .scoring import record_solve
+from . import verdict_cache
+
+
+# Run statuses from CodeExecutor.run that are reported as their own verdict
+LIMIT_VERDICTS = ('runtime_error', 'time_limit', 'memory_limit', 'output_limit')
+
+
+def parallel_test_workers():
+    """Number of test cases of one submission run concurrently"""
+    workers = getattr(settings, 'JUDGE_TEST_WORKERS', None)
+    return workers or os.cpu_count() or 1
+
+
+def judge_test_case(executor, program, test_case, make_checker=ExactChecker):
+    """Run a compiled program against one test case and compare the output.
+
+    make_checker builds the checker for the test case's expected output
+    (see checkers.checker_for).
+    """
+    # The output is compared while it streams in; the run stops at the first wrong byte
+    # File-backed test data is read by the program and the checker in place (see test_data.py)
+    checker = make_checker(test_case.expected_output_buffer())
+    checker_message = ''
+    try:
+        test_result = executor.run(program, test_case.input_data, checker=checker,
+                                   input_file=test_case.input_path)
+        if test_result.get('matched') and hasattr(checker, 'judge'):
+            # A special judge's checker program runs once the output is complete
+            test_result['matched'], checker_message = checker.judge(
+                executor, test_case.input_data, test_case.input_path)
+    finally:
+        if hasattr(checker, 'close'):
+            checker.close()
+    actual_output = test_result.get('output', '').strip()
+    error_msg = test_result.get('error', '').strip()
+    expected_output = test_case.expected_output_preview().strip()
+
+    passed = (test_result.get('success', False) and
+              test_result.get('matched', False))
+
+    if test_result.get('output_truncated'):
+        actual_output += '\n... (output truncated)'
+
+    if checker_message and not passed:
+        actual_output += f"\nChecker: {checker_message}"
+
+    # If there was an error, append it to actual output so user sees it
+    if error_msg:
+        if actual_output:
+            actual_output += f"\nError: {error_msg}"
+        else:
+            actual_output = error_msg
+
+    if passed:
+        verdict = 'passed'
+    elif test_result.get('status') in LIMIT_VERDICTS:
+        verdict = test_result['status']
+    else:
+        verdict = 'failed'
+
+    return {
+        'test_case': test_case,
+        'passed': passed,
+        'verdict': verdict,
+        # None when the executor failed instead of running the program (see verdict_cache.cacheable)
+        'run_status': test_result.get('status'),
+        'input': test_case.input_preview(),
+        'expected': expected_output,
+        'actual': actual_output,
+        'is_sample': test_case.is_sample,
+        'cpu_time': test_result.get('cpu_time'),
+        'wall_time': test_result.get('wall_time'),
+        'memory_kb': test_result.get('memory_kb'),
+    }
+
+
+def skipped_test_case(test_case):
+    """Result for a test case the verdict policy decided not to run"""
+    return {
+        'test_case': test_case,
+        'passed': False,
+        'verdict': 'skipped',
+        'run_status': 'skipped',
+        'input': test_case.input_preview(),
+        'expected': test_case.expected_output_preview().strip(),
+        'actual': '',
+        'is_sample': test_case.is_sample,
+        'cpu_time': None,
+        'wall_time': None,
+        'memory_kb': None,
+    }
+
+
+def _run_batch(executor, program, test_cases, make_checker, stop_on_failure=False):
+    """Run test cases on a bounded pool, optionally stopping after the first failure.
+
+    With stop_on_failure, cases after the earliest failing one (in order)
+    are not started and are reported as skipped, even if they already ran.
+    """
+    first_failure = [len(test_cases)]
+    lock = threading.Lock()
+
+    def run(index):
+        if index > first_failure[0]:
+            return None
+        result = judge_test_case(executor, program, test_cases[index], make_checker)
+        if stop_on_failure and not result['passed']:
+            with lock:
+                first_failure[0] = min(first_failure[0], index)
+        return result
+
+    workers = min(len(test_cases), parallel_test_workers())
+    if workers <= 1:
+        results = [run(index) for index in range(len(test_cases))]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, range(len(test_cases))))
+
+    return [
+        result if index <= first_failure[0] and result is not None else skipped_test_case(test_case)
+        for index, (test_case, result) in enumerate(zip(test_cases, results))
+    ]
+
+
+def run_test_cases(executor, language, code, test_cases, owner=None, policy='all',
+                   make_checker=ExactChecker):
+    """Compile once and run the program against the test cases on a bounded pool.
+
+    policy is one of Problem.VERDICT_POLICY_CHOICES:
+    'all' runs everything, 'first_failure' stops at the first failing case,
+    'samples_first' skips the hidden cases when a sample fails. Results are
+    returned in the order of test_cases regardless of which run finishes first.
+    make_checker is the problem's checker, from checkers.checker_for(problem).
+    """
+    outcome = {
+        'passed': 0,
+        'total': len(test_cases),
+        'compile_error': '',
+        'results': [],
+    }
+
+    with executor.compile(language, code, owner=owner) as program:
+        if not program.success:
+            # A compile error fails every test case, so report it once
+            outcome['compile_error'] = program.error.strip()
+            return outcome
+
+        if policy == 'samples_first':
+            samples = [test_case for test_case in test_cases if test_case.is_sample]
+            hidden = [test_case for test_case in test_cases if not test_case.is_sample]
+            sample_results = _run_batch(executor, program, samples, make_checker)
+            if all(result['passed'] for result in sample_results):
+                hidden_results = _run_batch(executor, program, hidden, make_checker)
+            else:
+                hidden_results = [skipped_test_case(test_case) for test_case in hidden]
+
+            # Put results back in test case order
+            by_test_case = {
+                id(result['test_case']): result
+                for result in sample_results + hidden_results
+            }
+            results = [by_test_case[id(test_case)] for test_case in test_cases]
+        else:
+            results = _run_batch(executor, program, test_cases, make_checker,
+                                 stop_on_failure=(policy == 'first_failure'))
+
+    outcome['results'] = results
+    outcome['passed'] = sum(1 for result in results if result['passed'])
+    return outcome
+
+
+def outcome_status(outcome):
+    """Map a run_test_cases outcome to a Submission.status value"""
+    if outcome['compile_error']:
+        return 'compile_error'
+    if outcome['total'] > 0:
+        if outcome['passed'] == outcome['total']:
+            return 'accepted'
+        if outcome['passed'] > 0:
+            return 'partial'
+        return 'failed'
+    return 'success'
+
+
+def resource_summary(results):
+    """Slowest CPU time and largest peak memory over the test cases that ran"""
+    cpu_times = [result['cpu_time'] for result in results if result.get('cpu_time') is not None]
+    memory = [result['memory_kb'] for result in results if result.get('memory_kb') is not None]
+    return {
+        'execution_time': max(cpu_times) if cpu_times else None,
+        'peak_memory_kb': max(memory) if memory else None,
+    }
+
+
+def serialize_results(results):
+    """Strip model instances and judge internals so results can be returned as JSON"""
+    return [
+        {key: value for key, value in result.items() if key not in ('test_case', 'run_status')}
+        for result in results
+    ]
+
+
+def judge_submission(submission, executor=None, owner=None, award_points=True, use_cache=True):
+    """Run every test case of the submission's problem and store the verdict.
+
+    Code already judged against the problem's current test cases gets the
+    cached verdict instead (see verdict_cache.py), unless use_cache is
+    False. owner is the scheduler owner (the submitting user by default).
+    Returns the run_test_cases outcome, or None when the verdict came from
+    the cache.
+    """
+    if use_cache and apply_cached_verdict(submission, award_points=award_points):
+        return None
+
+    executor = executor or CodeExecutor()
+    problem = submission.problem
+    # Read before the test cases, so a verdict is never cached under a newer revision than it saw
+    test_revision = problem.test_revision if problem else None
+    test_cases = list(problem.test_cases.all()) if problem else []
+
+    outcome = run_test_cases(executor, submission.language, submission.code, test_cases,
+                             owner=submission.user_id if owner is None else owner,
+                             policy=submission.verdict_policy,
+                             make_checker=checker_for(problem))
+    summary = resource_summary(outcome['results'])
+
+    verdict = {
+        'status': outcome_status(outcome),
+        'error_message': outcome['compile_error'],
+        'execution_time': summary['execution_time'],
+        'peak_memory_kb': summary['peak_memory_kb'],
+        'test_cases_passed': outcome['passed'],
+        'total_test_cases': outcome['total'],
+    }
+    results = [
+        {
+            'test_case_id': result['test_case'].id,
+            'order': index,
+            'is_sample': result['is_sample'],
+            'passed': result['passed'],
+            'verdict': result['verdict'],
+            'output': result['actual'],
+            'cpu_time': result['cpu_time'],
+            'wall_time': result['wall_time'],
+            'memory_kb': result['memory_kb'],
+        }
+        for index, result in enumerate(outcome['results'])
+    ]
+    record_verdict(submission, verdict, results, award_points=award_points)
+    if problem and verdict_cache.cacheable(outcome):
+        verdict_cache.store(submission, test_revision, verdict, results)
+    return outcome
+
+
+def apply_cached_verdict(submission, award_points=True):
+    """Give the submission its code's cached verdict, if there is one. Returns True if so"""
+    entry = verdict_cache.lookup(submission)
+    if entry is None:
+        return False
+    record_verdict(submission, verdict_cache.verdict_fields(entry), entry.results, award_points=award_points)
+    return True
+
+
+def record_verdict(submission, verdict, results, award_points=True):
+    """Save a verdict (Submission fields) and its per-test results.
+
+    Points are awarded on a first solve, unless award_points is False
+    (rejudges settle scores once they are done, see rejudge.py).
+    """
+    problem = submission.problem
+    with transaction.atomic():
+        submission.test_results.all().delete()
+        TestCaseResult.objects.bulk_create([
+            TestCaseResult(submission=submission, **result) for result in results
+        ])
+
+        for field, value in verdict.items():
+            setattr(submission, field, value)
+        submission.save(update_fields=list(verdict))
+
+        # Dynamic Score Update: the first accepted submission per problem awards its points
+        if award_points and submission.status == 'accepted' and problem:
+            record_solve(submission)
+
+
+def submission_result(submission):
+    """Build the API payload for a (possibly still pending) submission"""
+    data = {
+        'success': True,
+        'submission_id': submission.id,
+        'status': submission.status,
+        'execution_time': round(submission.execution_time, 3) if submission.execution_time is not None else None,
+        'peak_memory_kb': submission.peak_memory_kb,
+        'test_cases_passed': submission.test_cases_passed,
+        'total_test_cases': submission.total_test_cases,
+        'verdict_policy': submission.verdict_policy,
+        'compile_error': (submission.error_message or '') if submission.status == 'compile_error' else '',
+        'test_results': [],
+    }
+    if submission.status in ('pending', 'running'):
+        return data
+
+    for result in submission.test_results.select_related('test_case'):
+        test_case = result.test_case
+        data['test_results'].append({
+            'passed': result.passed,
+            'verdict': result.verdict,
+            'input': test_case.input_preview() if test_case else '',
+            'expected': test_case.expected_output_preview().strip() if test_case else '',
+            'actual': result.output,
+            'is_sample': result.is_sample,
+            'cpu_time': result.cpu_time,
+            'wall_time': result.wall_time,
+            'memory_kb': result.memory_kb,
+        })
+    return data
+
+
+# Queue
+
+def enqueue_submission(submission):
+    """Queue a pending submission for the judge worker"""
+    return JudgeJob.objects.create(submission=submission)
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker_name):
+    """Atomically claim the oldest queued job, or return None if the queue is empty"""
+    while True:
+        job = JudgeJob.objects.filter(status='queued').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+
+        # Conditional UPDATE so two workers can never claim the same job
+        claimed = JudgeJob.objects.filter(id=job.id, status='queued').update(
+            status='running',
+            worker=worker_name,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            Submission.objects.filter(id=job.submission_id).update(status='running')
+            job.refresh_from_db()
+            return job
+
+
+def process_job(job, executor=None):
+    """Judge a claimed job and record how it finished"""
+    submission = job.submission
+    try:
+        judge_submission(submission, executor=executor)
+        job.status = 'done'
+        job.error = ''
+    except Exception:
+        job.status = 'failed'
+        job.error = traceback.format_exc()
+        Submission.objects.filter(id=submission.id).update(status='error')
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(timeout_seconds, max_attempts=3):
+    """Return jobs abandoned by a crashed worker to the queue"""
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    stale = JudgeJob.objects.filter(status='running', started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=max_attempts)
+    Submission.objects.filter(judge_job__in=failed).update(status='error')
+    failed.update(status='failed', error='Abandoned by worker', finished_at=timezone.now())
+    requeued = stale.update(status='queued', worker='', started_at=None)
+    Submission.objects.filter(judge_job__status='queued', status='running').update(status='pending')
+    return requeued
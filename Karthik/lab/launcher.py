@@ -0,0 +1,347 @@
+"""
+Tiny native launcher that measures a student program's resources.
+
+A program started straight from the web or judge worker process reports a
+useless peak RSS: on exec Linux carries the parent's memory high-water
+mark over into the child's ru_maxrss, so every run appears to use as much
+memory as Django itself. The launcher (a few KB of C) forks, execs the
+program under the run's resource limits (setrlimit between fork and
+exec), reaps it with wait4 and writes
+
+    <wait status> <timed out> <user seconds> <sys seconds> <max rss> <memory exceeded>
+
+to a report descriptor. Since the program is forked from the launcher
+rather than from Django, its ru_maxrss is its own. The launcher also kills
+the program's process group when its wall-clock timeout expires or when
+it receives SIGTERM, and still reports the usage. On Linux it is a child
+subreaper, so it can kill and reap whatever the program forked.
+
+The memory limit is enforced on resident memory rather than address
+space: RLIMIT_AS is set to a larger headroom, and every WATCH_INTERVAL_MS
+the launcher reads the program's resident size from /proc and kills it
+once that goes over the limit, reporting "memory exceeded". A program
+that allocates too much then runs out of memory as it touches the pages,
+where under an address space limit of the same size the allocation would
+just fail and the program crash with a verdict that looks like any other
+runtime error.
+
+The process limit is kept per run the same way. RLIMIT_NPROC would count
+every process of the account running the judge, so instead every
+PROCESS_WATCH_TICKS ticks the launcher counts the processes in the
+program's group under /proc and kills the group once there are too many.
+
+The binary is built with gcc once per compiler version under
+EXECUTION_DIR/launcher/<hash>/. If it can't be built a <hash>.failed
+marker is left and programs are started directly; delete the marker to
+retry.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from django.conf import settings
+
+from .compile_cache import toolchain_version, FileLock
+
+
+LAUNCHER_SOURCE = r'''#define _GNU_SOURCE
+#include <dirent.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+#include <time.h>
+#include <unistd.h>
+#ifdef __linux__
+#include <sys/prctl.h>
+#endif
+
+/*
+ * usage: launcher -r REPORT_FD [-t TIMEOUT_MS] [-m AS_BYTES] [-s RSS_BYTES]
+ *                 [-c CPU_SECONDS] [-p NPROC] [-f NOFILE] -- COMMAND [ARGS...]
+ */
+
+#define WATCH_INTERVAL_MS 10
+/* Counting processes reads all of /proc, so it is done less often */
+#define PROCESS_WATCH_TICKS 5
+
+static pid_t child;
+
+static void on_tick(int sig) {
+    /* Only interrupts wait4, so the main loop can check the clock and memory */
+    (void)sig;
+}
+
+static void on_term(int sig) {
+    (void)sig;
+    kill(-child, SIGKILL);
+}
+
+static int limit(int resource, long long soft, long long hard) {
+    struct rlimit rl;
+    if (soft <= 0 || getrlimit(resource, &rl) != 0) {
+        return 0;
+    }
+    /* Only root may raise a hard limit; stay within the one we inherited */
+    if (rl.rlim_max != RLIM_INFINITY && (rlim_t)hard > rl.rlim_max) {
+        hard = (long long)rl.rlim_max;
+    }
+    rl.rlim_cur = (rlim_t)(soft < hard ? soft : hard);
+    rl.rlim_max = (rlim_t)hard;
+    return setrlimit(resource, &rl);
+}
+
+/* Resident memory of a process in bytes, or -1 if it can't be read (e.g. it has exited) */
+static long long resident_bytes(pid_t pid) {
+    char path[64], buf[128];
+    long long size, resident;
+    snprintf(path, sizeof path, "/proc/%d/statm", (int)pid);
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) {
+        return -1;
+    }
+    ssize_t n = read(fd, buf, sizeof buf - 1);
+    close(fd);
+    if (n <= 0) {
+        return -1;
+    }
+    buf[n] = '\0';
+    if (sscanf(buf, "%lld %lld", &size, &resident) != 2) {
+        return -1;
+    }
+    return resident * sysconf(_SC_PAGESIZE);
+}
+
+/* Number of processes in a process group, or -1 if /proc can't be read */
+static long long group_size(pid_t pgid) {
+    DIR *proc = opendir("/proc");
+    if (proc == NULL) {
+        return -1;
+    }
+    long long count = 0;
+    struct dirent *entry;
+    while ((entry = readdir(proc)) != NULL) {
+        char path[64], buf[512];
+        if (entry->d_name[0] < '0' || entry->d_name[0] > '9') {
+            continue;
+        }
+        snprintf(path, sizeof path, "/proc/%s/stat", entry->d_name);
+        int fd = open(path, O_RDONLY);
+        if (fd < 0) {
+            continue;
+        }
+        ssize_t n = read(fd, buf, sizeof buf - 1);
+        close(fd);
+        if (n <= 0) {
+            continue;
+        }
+        buf[n] = '\0';
+        /* pid (comm) state ppid pgrp ...; comm may itself hold spaces and parentheses */
+        char *fields = strrchr(buf, ')');
+        int ppid, pgrp;
+        if (fields != NULL && sscanf(fields + 1, " %*c %d %d", &ppid, &pgrp) == 2 && pgrp == pgid) {
+            count++;
+        }
+    }
+    closedir(proc);
+    return count;
+}
+
+static long elapsed_ms(const struct timespec *start) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (now.tv_sec - start->tv_sec) * 1000 + (now.tv_nsec - start->tv_nsec) / 1000000;
+}
+
+int main(int argc, char **argv) {
+    int report_fd = -1, opt, timed_out = 0, memory_exceeded = 0, too_many_processes = 0;
+    long ticks = 0;
+    long timeout_ms = 0;
+    long long as_bytes = 0, rss_bytes = 0, cpu_seconds = 0, nproc = 0, nofile = 0;
+    struct timespec start;
+
+    while ((opt = getopt(argc, argv, "r:t:m:s:c:p:f:")) != -1) {
+        switch (opt) {
+        case 'r': report_fd = atoi(optarg); break;
+        case 't': timeout_ms = atol(optarg); break;
+        case 'm': as_bytes = atoll(optarg); break;
+        case 's': rss_bytes = atoll(optarg); break;
+        case 'c': cpu_seconds = atoll(optarg); break;
+        case 'p': nproc = atoll(optarg); break;
+        case 'f': nofile = atoll(optarg); break;
+        default: return 127;
+        }
+    }
+    if (report_fd < 0 || optind >= argc) {
+        fprintf(stderr, "usage: %s -r REPORT_FD [limits] -- COMMAND [ARGS...]\n", argv[0]);
+        return 127;
+    }
+
+#ifdef __linux__
+    prctl(PR_SET_CHILD_SUBREAPER, 1);
+#endif
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    child = fork();
+    if (child < 0) {
+        perror("fork");
+        return 127;
+    }
+    if (child == 0) {
+        setpgid(0, 0);
+#ifdef __linux__
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+#endif
+        close(report_fd);
+        /* SIGXCPU at the soft CPU limit, SIGKILL a second later */
+        if (limit(RLIMIT_AS, as_bytes, as_bytes) || limit(RLIMIT_CPU, cpu_seconds, cpu_seconds + 1) ||
+            limit(RLIMIT_NOFILE, nofile, nofile)) {
+            perror("setrlimit");
+            _exit(127);
+        }
+        execvp(argv[optind], argv + optind);
+        fprintf(stderr, "%s: %s\n", argv[optind], strerror(errno));
+        _exit(127);
+    }
+    setpgid(child, child);
+
+    struct sigaction tick;
+    memset(&tick, 0, sizeof tick);
+    tick.sa_handler = on_tick;  /* No SA_RESTART: each tick must interrupt wait4 */
+    sigaction(SIGALRM, &tick, NULL);
+    signal(SIGTERM, on_term);
+    struct itimerval timer = {{0, WATCH_INTERVAL_MS * 1000}, {0, WATCH_INTERVAL_MS * 1000}};
+    if (timeout_ms > 0 || rss_bytes > 0 || nproc > 0) {
+        setitimer(ITIMER_REAL, &timer, NULL);
+    }
+
+    int status;
+    struct rusage usage;
+    while (wait4(child, &status, 0, &usage) < 0) {
+        if (errno != EINTR) {
+            perror("wait4");
+            return 127;
+        }
+        if (timeout_ms > 0 && !timed_out && elapsed_ms(&start) >= timeout_ms) {
+            timed_out = 1;
+            kill(-child, SIGKILL);
+        }
+        if (rss_bytes > 0 && !memory_exceeded && resident_bytes(child) > rss_bytes) {
+            memory_exceeded = 1;
+            kill(-child, SIGKILL);
+        }
+        if (nproc > 0 && !too_many_processes && ++ticks % PROCESS_WATCH_TICKS == 0 && group_size(child) > nproc) {
+            too_many_processes = 1;
+            kill(-child, SIGKILL);
+        }
+    }
+    memset(&timer, 0, sizeof timer);
+    setitimer(ITIMER_REAL, &timer, NULL);
+    /*
+     * Don't leave anything the program forked behind. As a subreaper we
+     * inherit its orphans, so keep killing the group and reaping until
+     * none are left (or give up after about a second).
+     */
+    for (int i = 0; i < 1000; i++) {
+        kill(-child, SIGKILL);
+        pid_t pid = waitpid(-1, NULL, WNOHANG);
+        if (pid < 0 && errno == ECHILD) {
+            break;
+        }
+        if (pid <= 0) {
+            usleep(1000);
+        }
+    }
+
+    dprintf(report_fd, "%d %d %ld.%06ld %ld.%06ld %ld %d\n", status, timed_out,
+            (long)usage.ru_utime.tv_sec, (long)usage.ru_utime.tv_usec,
+            (long)usage.ru_stime.tv_sec, (long)usage.ru_stime.tv_usec,
+            (long)usage.ru_maxrss, memory_exceeded);
+    return 0;
+}
+'''
+
+_launchers = {}
+_launchers_lock = threading.Lock()
+
+
+def _launcher_dir():
+    digest = hashlib.sha256()
+    digest.update(toolchain_version('gcc').encode('utf-8'))
+    digest.update(LAUNCHER_SOURCE.encode('utf-8'))
+    return os.path.join(str(settings.EXECUTION_DIR), 'launcher', digest.hexdigest()[:16])
+
+
+def _build_launcher(launcher_dir):
+    """Compile the launcher into launcher_dir. Returns True on success"""
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(launcher_dir))
+    try:
+        source_file = os.path.join(work_dir, 'launcher.c')
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(LAUNCHER_SOURCE)
+        binary = os.path.join(work_dir, 'launcher')
+        result = subprocess.run(['gcc', '-O2', '-o', binary, source_file],
+                                capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            return False
+        os.makedirs(launcher_dir, exist_ok=True)
+        os.replace(binary, os.path.join(launcher_dir, 'launcher'))
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def get_launcher():
+    """Return the launcher binary's path, building it on first use.
+
+    Returns None when the launcher is disabled, unsupported on this
+    platform or can't be built.
+    """
+    if not getattr(settings, 'EXECUTION_LAUNCHER_ENABLED', True) or not hasattr(os, 'fork'):
+        return None
+
+    launcher_dir = _launcher_dir()
+    with _launchers_lock:
+        if launcher_dir not in _launchers:
+            os.makedirs(os.path.dirname(launcher_dir), exist_ok=True)
+            failed_marker = launcher_dir + '.failed'
+            binary = os.path.join(launcher_dir, 'launcher')
+            # Only one process builds; the others wait on the lock and reuse the result
+            with FileLock(launcher_dir + '.lock'):
+                if not os.path.exists(binary) and not os.path.exists(failed_marker):
+                    if not _build_launcher(launcher_dir):
+                        open(failed_marker, 'w').close()
+            _launchers[launcher_dir] = binary if os.path.exists(binary) else None
+        return _launchers[launcher_dir]
+
+
+def launcher_command(launcher, report_fd, timeout, rlimits, command):
+    """Wrap command so it runs under the launcher with the given rlimits"""
+    options = {'AS': '-m', 'RSS': '-s', 'CPU': '-c', 'NPROC': '-p', 'NOFILE': '-f'}
+    args = [launcher, '-r', str(report_fd), '-t', str(int(timeout * 1000))]
+    for name, value in rlimits.items():
+        args += [options[name], str(value)]
+    return args + ['--'] + list(command)
+
+
+def parse_report(report):
+    """Parse the launcher's report line.
+
+    Returns (returncode, timed_out, usage, memory_exceeded) with returncode
+    as subprocess reports it (negative for a signal), or None if the report
+    is missing.
+    """
+    try:
+        status, timed_out, utime, stime, maxrss, memory_exceeded = report.split()
+        returncode = os.waitstatus_to_exitcode(int(status))
+        return returncode, timed_out == '1', (float(utime), float(stime), int(maxrss)), memory_exceeded == '1'
+    except ValueError:
+        return None
@@ -0,0 +1,139 @@
+"""
+Student leaderboard, optionally for one branch, year and/or semester.
+
+Students are ranked by UserProfile.score, highest first, with the profile
+id breaking ties, which is the order of the lab_profile_rank_idx and
+lab_profile_cohort_rank_idx indexes. Scores only change through single-row
+F() updates (scoring.py), so the database keeps that order up to date as
+it happens; nothing is sorted per request. Students with the same score
+share a rank (1, 2, 2, 4).
+
+Pages use keyset pagination: the cursor is the (score, id) of the last row
+shown, and the next page starts right after it in index order, however
+deep it is. A page costs three queries:
+- the rows;
+- one COUNT for the first row's rank;
+- solved-problem counts for the page.
+
+Pages are cached for LEADERBOARD_CACHE_SECONDS under a version number
+that invalidate() bumps whenever a score or a student's profile changes.
+With a per-process cache (the default LocMemCache) other processes only
+see the bump once their copies expire; use a shared cache backend to
+invalidate everywhere at once.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import SolvedProblem, UserProfile
+from .pagination import decode_cursor, encode_cursor
+
+
+VERSION_KEY = 'leaderboard:version'
+MAX_PAGE_SIZE = 200
+
+
+def page_size():
+    return getattr(settings, 'LEADERBOARD_PAGE_SIZE', 50)
+
+
+def cache_seconds():
+    return getattr(settings, 'LEADERBOARD_CACHE_SECONDS', 60)
+
+
+def invalidate():
+    """Drop every cached leaderboard page"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), None)
+
+
+def _new_version():
+    # Time-based, so a version lost from the cache never comes back to revive old pages
+    return time.time_ns()
+
+
+def students(branch=None, year=None, semester=None):
+    queryset = UserProfile.objects.filter(role='student', user__is_active=True)
+    if branch:
+        queryset = queryset.filter(branch=branch)
+    if year is not None:
+        queryset = queryset.filter(year=year)
+    if semester is not None:
+        queryset = queryset.filter(semester=semester)
+    return queryset
+
+
+def leaderboard_page(branch=None, year=None, semester=None, cursor=None, limit=None):
+    """One page of the leaderboard as an API payload; served from the cache when possible"""
+    limit = max(1, min(limit or page_size(), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, int, int) if cursor else None  # (score, profile id)
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    key = f'leaderboard:{version}:{branch or ""}:{year or ""}:{semester or ""}:{cursor or ""}:{limit}'
+    data = cache.get(key)
+    if data is None:
+        data = _build_page(branch, year, semester, after, limit)
+        cache.set(key, data, cache_seconds())
+    return data
+
+
+def _build_page(branch, year, semester, after, limit):
+    queryset = students(branch, year, semester)
+    page = queryset
+    if after is not None:
+        score, profile_id = after
+        page = page.filter(Q(score__lt=score) | Q(score=score, id__gt=profile_id))
+    # One extra row tells whether there is a next page
+    rows = list(
+        page.order_by('-score', 'id')
+        .values('id', 'user_id', 'user__username', 'user__first_name', 'user__last_name',
+                'branch', 'year', 'semester', 'score')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = []
+    if rows:
+        first = rows[0]
+        # Students ranked above the first row, and those tied with it but listed earlier
+        counts = queryset.filter(score__gte=first['score']).aggregate(
+            higher=Count('id', filter=Q(score__gt=first['score'])),
+            tied_before=Count('id', filter=Q(score=first['score'], id__lt=first['id'])),
+        )
+        solved = dict(
+            SolvedProblem.objects.filter(user_id__in=[row['user_id'] for row in rows])
+            .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+        )
+        position = counts['higher'] + counts['tied_before']
+        rank = counts['higher'] + 1
+        previous_score = first['score']
+        for row in rows:
+            position += 1
+            if row['score'] != previous_score:
+                rank = position
+                previous_score = row['score']
+            name = f"{row['user__first_name']} {row['user__last_name']}".strip()
+            results.append({
+                'rank': rank,
+                'username': row['user__username'],
+                'name': name or row['user__username'],
+                'branch': row['branch'],
+                'year': row['year'],
+                'semester': row['semester'],
+                'score': row['score'],
+                'solved': solved.get(row['user_id'], 0),
+            })
+
+    last = rows[-1] if rows else None
+    return {
+        'results': results,
+        'next_cursor': encode_cursor(last['score'], last['id']) if has_more else None,
+        'filters': {'branch': branch, 'year': year, 'semester': semester},
+    }
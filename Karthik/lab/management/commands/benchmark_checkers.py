@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from lab.checkers import CHECKERS
+
+
+CHUNK_BYTES = 64 * 1024  # what the executor reads from the program's stdout at a time
+
+
+def generate_output(size_bytes, seed=0):
+    """Lines of space-separated integers and decimals, about size_bytes long"""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size_bytes:
+        line = ' '.join(
+            str(rng.randint(-10 ** 9, 10 ** 9)) if rng.random() < 0.5 else f'{rng.uniform(-1e6, 1e6):.6f}'
+            for _ in range(rng.randint(1, 12))
+        )
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+
+class Command(BaseCommand):
+    help = 'Time each output checker on generated multi-megabyte outputs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, action='append',
+                            help='Output size to test (repeatable, default 1, 8 and 32)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+
+    def handle(self, *args, **options):
+        sizes = options['size_mb'] or [1, 8, 32]
+        for size_mb in sizes:
+            expected = generate_output(int(size_mb * 1024 * 1024))
+            # What a program prints: the same output with CRLF line endings, plus
+            # trailing spaces for the checkers that ignore them
+            crlf_output = expected.replace('\n', '\r\n').encode('utf-8')
+            spaced_output = expected.replace('\n', ' \r\n').encode('utf-8')
+            self.stdout.write(f'{size_mb:g} MB output:')
+            for name, checker_class in CHECKERS.items():
+                actual = crlf_output if name == 'exact' else spaced_output
+                best = None
+                accepted = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    checker = checker_class(expected)
+                    for offset in range(0, len(actual), CHUNK_BYTES):
+                        checker.feed(actual[offset:offset + CHUNK_BYTES])
+                    accepted = checker.finish()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(
+                    f'  {name:<7} {best * 1000:8.1f} ms  {len(actual) / best / 1024 / 1024:7.1f} MB/s  '
+                    f'{"accepted" if accepted else "rejected"}'
+                )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lab.judge import default_worker_name
+from lab.user_import import (
+    chunk_size, claim_import, claim_next_import, hash_processes, queue_import, run_import,
+)
+
+
+class Command(BaseCommand):
+    help = 'Import users from a CSV file (or run imports queued from the admin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', nargs='?', help='CSV file with username, email, password, ... columns')
+        parser.add_argument('--queued', action='store_true', help='Run the imports queued from the admin instead')
+        parser.add_argument('--processes', type=int, default=hash_processes(),
+                            help='Processes hashing passwords')
+        parser.add_argument('--chunk-size', type=int, default=chunk_size(),
+                            help='Users created per transaction')
+
+    def handle(self, *args, **options):
+        if options['queued']:
+            worker_name = default_worker_name()
+            while True:
+                user_import = claim_next_import(worker_name)
+                if user_import is None:
+                    break
+                self._run(user_import, options)
+            return
+
+        if not options['csv_file']:
+            raise CommandError('Pass a CSV file, or --queued to run imports queued from the admin')
+        try:
+            with open(options['csv_file'], encoding='utf-8-sig', newline='') as f:
+                csv_data = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"Can't read {options['csv_file']}: {e}")
+        user_import = queue_import(csv_data, file_name=options['csv_file'], processes=options['processes'])
+        claim_import(user_import, default_worker_name())
+        self._run(user_import, options)
+
+    def _run(self, user_import, options):
+        self.stdout.write(f'{user_import}: {user_import.total} row(s), {options["processes"]} hashing process(es)')
+
+        def progress(processed, total):
+            self.stdout.write(f'[{processed}/{total}]')
+
+        user_import = run_import(user_import, processes=options['processes'], size=options['chunk_size'],
+                                 progress=progress)
+        for error in user_import.errors:
+            self.stdout.write(self.style.WARNING(error))
+        elapsed = (user_import.finished_at - user_import.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {user_import.imported} user(s) in {elapsed:.1f}s, skipped {user_import.skipped}'
+        ))
@@ -0,0 +1,82 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from lab.code_executor import CodeExecutor
+from lab.judge import claim_next_job, process_job, requeue_stale_jobs, default_worker_name
+from lab.rejudge import RejudgeRunner
+from lab.user_import import UserImportRunner
+
+
+class Command(BaseCommand):
+    help = 'Run a judge worker that processes queued submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'JUDGE_POLL_INTERVAL', 0.5),
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--name', default='', help='Worker name recorded on claimed jobs')
+        parser.add_argument('--no-rejudge', action='store_true',
+                            help='Leave rejudges queued from the admin to other workers')
+        parser.add_argument('--no-import', action='store_true',
+                            help='Leave user imports queued from the admin to other workers')
+
+    def handle(self, *args, **options):
+        worker_name = options['name'] or default_worker_name()
+        poll_interval = options['poll_interval']
+        executor = CodeExecutor()
+        # Queued rejudges run in the background while live submissions keep being judged here
+        rejudges = None if options['no_rejudge'] else RejudgeRunner(worker_name, executor)
+        imports = None if options['no_import'] else UserImportRunner(worker_name)
+        background = [runner for runner in (rejudges, imports) if runner is not None]
+
+        # Jobs left 'running' by a crashed worker go back on the queue, checked
+        # at startup and then every JUDGE_STALE_CHECK_INTERVAL seconds
+        stale_timeout = getattr(settings, 'JUDGE_STALE_JOB_TIMEOUT', 600)
+        stale_check_interval = getattr(settings, 'JUDGE_STALE_CHECK_INTERVAL', 60)
+        next_stale_check = time.monotonic()
+
+        self.stdout.write(self.style.SUCCESS(f'Judge worker {worker_name} started'))
+        try:
+            while True:
+                close_old_connections()
+                if time.monotonic() >= next_stale_check:
+                    requeued = requeue_stale_jobs(stale_timeout)
+                    if requeued:
+                        self.stdout.write(f'Requeued {requeued} stale job(s)')
+                    next_stale_check = time.monotonic() + stale_check_interval
+                if rejudges is not None:
+                    rejudge = rejudges.poll()
+                    if rejudge is not None:
+                        self.stdout.write(f'Started {rejudge}')
+                if imports is not None:
+                    user_import = imports.poll()
+                    if user_import is not None:
+                        self.stdout.write(f'Started {user_import}')
+                job = claim_next_job(worker_name)
+                if job is None:
+                    if options['once'] and not any(runner.busy for runner in background):
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                job = process_job(job, executor=executor)
+                self.stdout.write(f'Submission {job.submission_id}: {job.status}')
+        except KeyboardInterrupt:
+            self.stdout.write('Judge worker stopped')
+        finally:
+            if rejudges is not None and rejudges.busy:
+                self.stdout.write('Stopping the running rejudge')
+                rejudges.stop()
+            if imports is not None and imports.busy:
+                self.stdout.write('Stopping the running user import')
+                imports.stop()
+            stats = executor.workspaces.stats()
+            self.stdout.write(
+                f"Workspaces: {stats['acquired']} used, {stats['reused']} reused, "
+                f"{stats['acquire_seconds'] * 1000:.1f} ms acquiring, {stats['cleanup_seconds'] * 1000:.1f} ms cleaning up"
+            )
@@ -0,0 +1,82 @@
+from datetime import datetime, time as day_start
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from lab.code_executor import CodeExecutor
+from lab.judge import default_worker_name
+from lab.models import Problem, Submission
+from lab.rejudge import (
+    claim_next_rejudge, claim_rejudge, queue_rejudge, rejudge_delay, rejudge_workers, run_rejudge,
+    select_submissions,
+)
+
+
+class Command(BaseCommand):
+    help = "Rejudge a problem's submissions (or run rejudges queued from the admin) and settle scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--problem', type=int, help='Problem id whose submissions are rejudged')
+        parser.add_argument('--status', action='append', choices=[
+            'accepted', 'partial', 'failed', 'compile_error', 'success', 'error',
+        ], help='Only submissions with this status (repeatable)')
+        parser.add_argument('--language', action='append', choices=[code for code, _ in Submission.LANGUAGE_CHOICES],
+                            help='Only submissions in this language (repeatable)')
+        parser.add_argument('--since', help='Only submissions made on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--queued', action='store_true', help='Run the rejudges queued from the admin instead')
+        parser.add_argument('--workers', type=int, default=rejudge_workers(),
+                            help='Submissions rejudged at once')
+        parser.add_argument('--delay', type=float, default=rejudge_delay(),
+                            help='Seconds each worker pauses after a submission')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Judge identical code again instead of reusing cached verdicts')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the submissions that would be rejudged')
+
+    def handle(self, *args, **options):
+        executor = CodeExecutor()
+        if options['queued']:
+            worker_name = default_worker_name()
+            while True:
+                rejudge = claim_next_rejudge(worker_name)
+                if rejudge is None:
+                    break
+                self._run(rejudge, executor, options)
+            return
+
+        if options['problem'] is None:
+            raise CommandError('Pass --problem ID, or --queued to run rejudges queued from the admin')
+        try:
+            problem = Problem.objects.get(pk=options['problem'])
+        except Problem.DoesNotExist:
+            raise CommandError(f"Problem {options['problem']} does not exist")
+
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.combine(datetime.strptime(options['since'], '%Y-%m-%d'), day_start()))
+            except ValueError:
+                raise CommandError('--since must be a date, YYYY-MM-DD')
+
+        ids = select_submissions(problem=problem, statuses=options['status'], languages=options['language'],
+                                 since=since)
+        if options['dry_run']:
+            self.stdout.write(f'{len(ids)} submission(s) of "{problem.title}" would be rejudged')
+            return
+        rejudge = queue_rejudge(ids, problem=problem, use_cache=not options['no_cache'])
+        claim_rejudge(rejudge, default_worker_name())
+        self._run(rejudge, executor, options)
+
+    def _run(self, rejudge, executor, options):
+        self.stdout.write(f'{rejudge}: {rejudge.total} submission(s), {options["workers"]} worker(s)')
+
+        def progress(processed, total, submission_id, old_status, new_status):
+            change = f'{old_status} -> {new_status}' if new_status else 'skipped'
+            self.stdout.write(f'[{processed}/{total}] Submission {submission_id}: {change}')
+
+        rejudge = run_rejudge(rejudge, executor=executor, workers=options['workers'], delay=options['delay'],
+                              progress=progress)
+        elapsed = (rejudge.finished_at - rejudge.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rejudged {rejudge.processed} submission(s) in {elapsed:.1f}s: {rejudge.changed} changed status, '
+            f'{rejudge.errors} error(s), {rejudge.score_changes} score(s) corrected'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:38
+
+from django.db import migrations, models
+
+
+def mark_passed_results(apps, schema_editor):
+    TestCaseResult = apps.get_model('lab', 'TestCaseResult')
+    TestCaseResult.objects.filter(passed=True).update(verdict='passed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0007_judge_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='verdict_policy',
+            field=models.CharField(choices=[('all', 'Run all test cases'), ('first_failure', 'Stop at first failure (ICPC)'), ('samples_first', 'Run samples first, skip hidden cases if a sample fails')], default='all', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='verdict_policy',
+            field=models.CharField(choices=[('all', 'Run all test cases'), ('first_failure', 'Stop at first failure (ICPC)'), ('samples_first', 'Run samples first, skip hidden cases if a sample fails')], default='all', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='verdict',
+            field=models.CharField(choices=[('passed', 'Passed'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='failed', max_length=20),
+        ),
+        migrations.RunPython(mark_passed_results, migrations.RunPython.noop),
+    ]
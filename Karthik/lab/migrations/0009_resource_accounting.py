@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0008_verdict_policy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='peak_memory_kb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='cpu_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='memory_kb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testcaseresult',
+            name='wall_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0009_resource_accounting'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testcaseresult',
+            name='verdict',
+            field=models.CharField(choices=[('passed', 'Passed'), ('failed', 'Wrong Answer'), ('runtime_error', 'Runtime Error'), ('time_limit', 'Time Limit Exceeded'), ('memory_limit', 'Memory Limit Exceeded'), ('output_limit', 'Output Limit Exceeded'), ('skipped', 'Skipped')], default='failed', max_length=20),
+        ),
+    ]
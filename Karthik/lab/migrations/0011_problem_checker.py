@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0010_run_limit_verdicts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='checker',
+            field=models.CharField(choices=[('exact', 'Exact match (ignoring leading/trailing whitespace)'), ('lines', 'Line by line, ignoring trailing spaces'), ('tokens', 'Whitespace-separated tokens'), ('float', 'Tokens, numbers within a tolerance')], default='exact', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='checker_tolerance',
+            field=models.FloatField(default=1e-06),
+        ),
+    ]
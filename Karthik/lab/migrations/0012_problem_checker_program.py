@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0011_problem_checker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='checker_code',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='checker_compile_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='checker_language',
+            field=models.CharField(choices=[('cpp', 'C++'), ('python', 'Python')], default='cpp', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='problem',
+            name='checker',
+            field=models.CharField(choices=[('exact', 'Exact match (ignoring leading/trailing whitespace)'), ('lines', 'Line by line, ignoring trailing spaces'), ('tokens', 'Whitespace-separated tokens'), ('float', 'Tokens, numbers within a tolerance'), ('custom', 'Custom checker program')], default='exact', max_length=20),
+        ),
+    ]
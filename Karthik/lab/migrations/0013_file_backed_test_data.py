@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:02
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from lab import test_data
+
+
+def move_large_test_data(apps, schema_editor):
+    """Move test data above TEST_DATA_FILE_THRESHOLD out of the database"""
+    TestCase = apps.get_model('lab', 'TestCase')
+    threshold = test_data.file_threshold()
+    if threshold is None:
+        return
+    # Length counts characters and a character takes at most 4 bytes in UTF-8;
+    # offload() checks the exact size. Rows are then loaded one at a time.
+    candidates = TestCase.objects.annotate(
+        input_length=Length('input_data'), output_length=Length('expected_output'),
+    ).filter(Q(input_length__gt=threshold // 4) | Q(output_length__gt=threshold // 4))
+    for pk in candidates.values_list('pk', flat=True):
+        test_case = TestCase.objects.get(pk=pk)
+        test_case.input_data, test_case.input_file = test_data.offload(
+            test_case.input_data, test_case.input_file)
+        test_case.expected_output, test_case.expected_output_file = test_data.offload(
+            test_case.expected_output, test_case.expected_output_file)
+        test_case.save(update_fields=['input_data', 'input_file', 'expected_output', 'expected_output_file'])
+
+
+def restore_test_data(apps, schema_editor):
+    TestCase = apps.get_model('lab', 'TestCase')
+    file_backed = TestCase.objects.exclude(input_file='', expected_output_file='')
+    for pk in file_backed.values_list('pk', flat=True):
+        test_case = TestCase.objects.get(pk=pk)
+        if test_case.input_file:
+            test_case.input_data = test_data.read_text(test_case.input_file)
+        if test_case.expected_output_file:
+            test_case.expected_output = test_data.read_text(test_case.expected_output_file)
+        test_case.input_file = test_case.expected_output_file = ''
+        test_case.save(update_fields=['input_data', 'input_file', 'expected_output', 'expected_output_file'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0012_problem_checker_program'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='expected_output_file',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='input_file',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='expected_output',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='input_data',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(move_large_test_data, restore_test_data),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0013_file_backed_test_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='test_revision',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='VerdictCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(choices=[('c', 'C'), ('cpp', 'C++'), ('java', 'Java'), ('python', 'Python')], max_length=10)),
+                ('code_hash', models.CharField(max_length=64)),
+                ('test_revision', models.PositiveIntegerField()),
+                ('verdict_policy', models.CharField(choices=[('all', 'Run all test cases'), ('first_failure', 'Stop at first failure (ICPC)'), ('samples_first', 'Run samples first, skip hidden cases if a sample fails')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('execution_time', models.FloatField(blank=True, null=True)),
+                ('peak_memory_kb', models.PositiveIntegerField(blank=True, null=True)),
+                ('test_cases_passed', models.IntegerField(default=0)),
+                ('total_test_cases', models.IntegerField(default=0)),
+                ('results', models.JSONField(default=list)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verdict_cache', to='lab.problem')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='verdictcacheentry',
+            constraint=models.UniqueConstraint(fields=('problem', 'language', 'code_hash', 'test_revision', 'verdict_policy'), name='lab_verdictcache_key'),
+        ),
+    ]
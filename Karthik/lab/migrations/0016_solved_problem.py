@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_solved_problems(apps, schema_editor):
+    """One row per (user, problem) with an accepted submission, from the earliest one.
+
+    Scores already include these points, so they are left alone.
+    """
+    Submission = apps.get_model('lab', 'Submission')
+    SolvedProblem = apps.get_model('lab', 'SolvedProblem')
+    accepted = (
+        Submission.objects.filter(status='accepted', problem__isnull=False)
+        .order_by('user_id', 'problem_id', 'submitted_at', 'id')
+        .values_list('id', 'user_id', 'problem_id', 'submitted_at', 'problem__points')
+    )
+    batch = []
+    last_pair = None
+    for submission_id, user_id, problem_id, submitted_at, points in accepted.iterator():
+        if (user_id, problem_id) == last_pair:
+            continue
+        last_pair = (user_id, problem_id)
+        batch.append(SolvedProblem(user_id=user_id, problem_id=problem_id, submission_id=submission_id,
+                                   points=points, solved_at=submitted_at))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            SolvedProblem.objects.bulk_create(batch)
+            batch = []
+    SolvedProblem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('lab', '0015_rejudge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolvedProblem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('solved_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solved_by', to='lab.problem')),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='lab.submission')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solved_problems', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-solved_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='solvedproblem',
+            constraint=models.UniqueConstraint(fields=('user', 'problem'), name='lab_solvedproblem_user_problem'),
+        ),
+        migrations.RunPython(backfill_solved_problems, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lab', '0016_solved_problem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['role', '-score', 'id'], name='lab_profile_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['role', 'branch', 'year', '-score', 'id'], name='lab_profile_cohort_rank_idx'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from . import test_data
+
 
 class Topic(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -43,9 +46,16 @@ class UserProfile(models.Model):
     semester = models.IntegerField(default=1)
     score = models.IntegerField(default=0)
     email_verified = models.BooleanField(default=False)
-    verification_token = models.CharField(max_length=100, blank=True, null=True)
+    verification_token = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Leaderboard order (see leaderboard.py), overall and per cohort
+            models.Index(fields=['role', '-score', 'id'], name='lab_profile_rank_idx'),
+            models.Index(fields=['role', 'branch', 'year', '-score', 'id'], name='lab_profile_cohort_rank_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} ({self.role})"
 
@@ -72,6 +82,25 @@ class Problem(models.Model):
         ('hard', 'Hard'),
     ]
     
+    VERDICT_POLICY_CHOICES = [
+        ('all', 'Run all test cases'),
+        ('first_failure', 'Stop at first failure (ICPC)'),
+        ('samples_first', 'Run samples first, skip hidden cases if a sample fails'),
+    ]
+    
+    CHECKER_CHOICES = [
+        ('exact', 'Exact match (ignoring leading/trailing whitespace)'),
+        ('lines', 'Line by line, ignoring trailing spaces'),
+        ('tokens', 'Whitespace-separated tokens'),
+        ('float', 'Tokens, numbers within a tolerance'),
+        ('custom', 'Custom checker program'),
+    ]
+    
+    CHECKER_LANGUAGE_CHOICES = [
+        ('cpp', 'C++'),
+        ('python', 'Python'),
+    ]
+    
     title = models.CharField(max_length=200)
     topic = models.ForeignKey(Topic, on_delete=models.SET_NULL, null=True, blank=True, related_name='problems')
     description = models.TextField()
@@ -81,26 +110,74 @@ class Problem(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     points = models.IntegerField(default=10)
+    verdict_policy = models.CharField(max_length=20, choices=VERDICT_POLICY_CHOICES, default='all')
+    checker = models.CharField(max_length=20, choices=CHECKER_CHOICES, default='exact')
+    checker_tolerance = models.FloatField(default=1e-6)  # absolute, or relative for values above 1 ('float' checker)
+    checker_language = models.CharField(max_length=10, choices=CHECKER_LANGUAGE_CHOICES, default='cpp')
+    checker_code = models.TextField(blank=True, default='')  # 'custom' checker: run as `checker INPUT OUTPUT ANSWER`
+    checker_compile_error = models.TextField(blank=True, null=True)  # set when the problem is saved
+    # Bumped whenever a test case or the checker changes (see signals.py); keys the verdict cache
+    test_revision = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at'], name='lab_problem_active_idx'),
+        ]
     
     def __str__(self):
         return self.title
+    
+    def clean(self):
+        if self.checker == 'custom' and not self.checker_code.strip():
+            raise ValidationError({'checker_code': 'A custom checker needs a checker program.'})
 
 
 class TestCase(models.Model):
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='test_cases')
-    input_data = models.TextField()
-    expected_output = models.TextField()
+    input_data = models.TextField(blank=True)  # empty when stored in input_file
+    expected_output = models.TextField(blank=True)  # empty when stored in expected_output_file
+    # SHA-256 of data too large for the database, stored under TEST_DATA_DIR (see test_data.py)
+    input_file = models.CharField(max_length=64, blank=True, default='')
+    expected_output_file = models.CharField(max_length=64, blank=True, default='')
     is_sample = models.BooleanField(default=False)  # Sample test cases shown to students
     order = models.IntegerField(default=0)
     
     class Meta:
         ordering = ['order', 'id']
+        indexes = [
+            models.Index(fields=['problem', 'is_sample', 'order', 'id'], name='lab_testcase_problem_idx'),
+        ]
     
     def __str__(self):
         return f"Test case for {self.problem.title}"
+    
+    def save(self, *args, **kwargs):
+        self.input_data, self.input_file = test_data.offload(self.input_data, self.input_file)
+        self.expected_output, self.expected_output_file = test_data.offload(
+            self.expected_output, self.expected_output_file)
+        super().save(*args, **kwargs)
+    
+    @property
+    def input_path(self):
+        """The input's file, or None when the input is in the database; raises test_data.MissingTestData if it is gone"""
+        return test_data.existing_path(self.input_file) if self.input_file else None
+    
+    def expected_output_buffer(self):
+        """The expected output for a checker: a str, or an mmap of its file"""
+        if self.expected_output_file:
+            return test_data.open_mapped(self.expected_output_file)
+        return self.expected_output
+    
+    def input_preview(self):
+        if self.input_file:
+            return test_data.preview(self.input_file)
+        return self.input_data
+    
+    def expected_output_preview(self):
+        if self.expected_output_file:
+            return test_data.preview(self.expected_output_file)
+        return self.expected_output
 
 
 class Submission(models.Model):
@@ -118,16 +195,206 @@ class Submission(models.Model):
     input_data = models.TextField(blank=True, null=True)
     output = models.TextField(blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
-    execution_time = models.FloatField(null=True, blank=True)  # in seconds
+    execution_time = models.FloatField(null=True, blank=True)  # CPU seconds of the slowest test case
+    peak_memory_kb = models.PositiveIntegerField(null=True, blank=True)  # largest peak RSS of any test case
     status = models.CharField(max_length=20, default='pending')  # pending, success, error, timeout
     test_cases_passed = models.IntegerField(default=0)
     total_test_cases = models.IntegerField(default=0)
+    verdict_policy = models.CharField(max_length=20, choices=Problem.VERDICT_POLICY_CHOICES, default='all')
     submitted_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-submitted_at']
+        indexes = [
+            # A user's history, all of it or for one problem, newest first
+            models.Index(fields=['user', '-submitted_at'], name='lab_sub_user_time_idx'),
+            models.Index(fields=['user', 'problem', '-submitted_at'], name='lab_sub_user_problem_idx'),
+            # Everyone's submissions, all of them or for one problem, newest first (admins, rejudges)
+            models.Index(fields=['problem', '-submitted_at'], name='lab_sub_problem_time_idx'),
+            models.Index(fields=['-submitted_at'], name='lab_sub_time_idx'),
+        ]
     
     def __str__(self):
         problem_name = self.problem.title if self.problem else "Practice"
         return f"{self.user.username} - {problem_name} - {self.language} - {self.submitted_at}"
 
+
+
+class SolvedProblem(models.Model):
+    """
+    A problem a user has solved, created by their first accepted submission.
+    
+    The unique (user, problem) pair makes awarding points a single insert:
+    only the submission whose insert succeeds adds them to UserProfile.score.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='solved_problems')
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='solved_by')
+    submission = models.ForeignKey(Submission, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    points = models.IntegerField()  # awarded, and taken back if a rejudge unsolves it
+    solved_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-solved_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'problem'], name='lab_solvedproblem_user_problem'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} solved {self.problem.title}"
+
+
+class TestCaseResult(models.Model):
+    """Outcome of running a submission against a single test case"""
+    VERDICT_CHOICES = [
+        ('passed', 'Passed'),
+        ('failed', 'Wrong Answer'),
+        ('runtime_error', 'Runtime Error'),
+        ('time_limit', 'Time Limit Exceeded'),
+        ('memory_limit', 'Memory Limit Exceeded'),
+        ('output_limit', 'Output Limit Exceeded'),
+        ('skipped', 'Skipped'),
+    ]
+    
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='test_results')
+    test_case = models.ForeignKey(TestCase, on_delete=models.SET_NULL, null=True, blank=True, related_name='results')
+    order = models.IntegerField(default=0)
+    is_sample = models.BooleanField(default=False)
+    passed = models.BooleanField(default=False)
+    verdict = models.CharField(max_length=20, choices=VERDICT_CHOICES, default='failed')
+    output = models.TextField(blank=True, default='')
+    cpu_time = models.FloatField(null=True, blank=True)  # user + sys seconds
+    wall_time = models.FloatField(null=True, blank=True)  # seconds
+    memory_kb = models.PositiveIntegerField(null=True, blank=True)  # peak RSS
+    
+    class Meta:
+        ordering = ['order', 'id']
+    
+    def __str__(self):
+        return f"Result {self.order} for submission {self.submission_id}"
+
+
+class JudgeJob(models.Model):
+    """DB-backed queue entry picked up by the judge_worker management command"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, related_name='judge_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='lab_judgejob_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Judge job for submission {self.submission_id} ({self.status})"
+
+
+class Rejudge(models.Model):
+    """Bulk rejudge of existing submissions, e.g. after a test case was fixed (see rejudge.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, null=True, blank=True, related_name='rejudges')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    submission_ids = models.JSONField(default=list)
+    use_cache = models.BooleanField(default=True)  # False rejudges identical code again (e.g. after changing limits)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    changed = models.IntegerField(default=0)  # submissions whose status changed
+    errors = models.IntegerField(default=0)
+    score_changes = models.IntegerField(default=0)  # profiles whose score was corrected
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        target = self.problem.title if self.problem else 'selected submissions'
+        return f"Rejudge of {target} ({self.processed}/{self.total}, {self.status})"
+
+
+class UserImport(models.Model):
+    """Bulk import of users from a CSV file, run by a judge worker (see user_import.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    file_name = models.CharField(max_length=255, blank=True, default='')
+    csv_data = models.TextField(blank=True, default='')  # holds passwords; cleared once the import has run
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    total = models.IntegerField(default=0)  # rows in the file
+    processed = models.IntegerField(default=0)
+    imported = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    errors = models.JSONField(default=list)  # why each skipped row was skipped
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"User import {self.file_name or self.pk} ({self.processed}/{self.total}, {self.status})"
+
+
+class VerdictCacheEntry(models.Model):
+    """
+    Stored verdict of a program on a problem's test set (see verdict_cache.py).
+
+    Identical code judged again against the same test revision reuses it
+    instead of running anything.
+    """
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='verdict_cache')
+    language = models.CharField(max_length=10, choices=Submission.LANGUAGE_CHOICES)
+    code_hash = models.CharField(max_length=64)  # SHA-256 of the normalized code
+    test_revision = models.PositiveIntegerField()
+    verdict_policy = models.CharField(max_length=20, choices=Problem.VERDICT_POLICY_CHOICES)
+    status = models.CharField(max_length=20)
+    error_message = models.TextField(blank=True, default='')
+    execution_time = models.FloatField(null=True, blank=True)
+    peak_memory_kb = models.PositiveIntegerField(null=True, blank=True)
+    test_cases_passed = models.IntegerField(default=0)
+    total_test_cases = models.IntegerField(default=0)
+    results = models.JSONField(default=list)  # TestCaseResult fields, one dict per test case
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['problem', 'language', 'code_hash', 'test_revision', 'verdict_policy'],
+                name='lab_verdictcache_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Cached {self.status} for {self.language} code on problem {self.problem_id}"
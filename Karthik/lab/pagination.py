@@ -0,0 +1,30 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor holds the sort key of the last row on a page, e.g. a leaderboard
+(score, id); the next page is the rows after it in the same order, found
+through the index instead of skipped over like an OFFSET.
+"""
+import base64
+import binascii
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    text = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, *converters):
+    """The values of a cursor, each passed through its converter (e.g. int); raises InvalidCursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        if len(parts) != len(converters):
+            raise ValueError(cursor)
+        return tuple(convert(part) for convert, part in zip(converters, parts))
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise InvalidCursor(f'Invalid cursor: {cursor}')
@@ -0,0 +1,267 @@
+"""
+Import of problem banks from the admin: a CSV file, or a zip holding the
+CSV and test data files.
+
+CSV rows are read one at a time from the upload, never as a whole. Rows
+with the same key (the `key` column, or the title when there is none)
+belong to one problem: the first one gives the problem's fields, and each
+row with test_input and test_output adds a test case, in row order.
+
+A zip holds one .csv file at its top level plus test data in a folder
+per problem key:
+
+    problems.csv
+    <key>/01.in, <key>/01.out, <key>/02.in, ...   hidden test cases
+    <key>/samples/01.in, <key>/samples/01.out     sample test cases
+
+Each problem's test cases from the zip come after those from the CSV,
+samples first, in the order of their numbers.
+
+A bad row is reported and skipped, whatever is wrong with it: missing
+fields, bytes that are not UTF-8, or a malformed CSV record.
+
+Problems and test cases are written with bulk_create, CHUNK_SIZE rows (or
+CHUNK_BYTES of test data) per transaction, and topics are looked up once
+and kept in memory. A chunk the database refuses is rolled back on its
+own: the chunks before it stay imported, and the rows and files of that
+chunk are reported as not imported, along with later rows of its
+problems. bulk_create skips TestCase.save, so test data too
+large for the database is moved to the test data store here (see
+test_data.py). Imported problems are new and have no verdicts cached, and
+their checker is the default one, so the signals bulk_create skips have
+nothing to do.
+"""
+import csv
+import io
+import re
+import zipfile
+
+from django.db import DatabaseError, connection, transaction
+
+from . import test_data
+from .models import Problem, TestCase, Topic
+
+
+CHUNK_SIZE = 500
+CHUNK_BYTES = 16 * 1024 * 1024
+DIFFICULTIES = ('easy', 'medium', 'hard')
+TEST_FILE = re.compile(r'^(?P<key>[^/]+)/(?:(?P<samples>samples)/)?(?P<number>\d+)\.(?P<kind>in|out)$')
+# Bytes that are not UTF-8, as decoded with errors='surrogateescape'
+UNDECODABLE = re.compile('[\udc80-\udcff]')
+
+
+def open_text(binary_file):
+    """The CSV's text; bytes that are not UTF-8 are kept as surrogates for read_csv to report"""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', errors='surrogateescape', newline='')
+
+
+class ProblemImporter:
+    """Collects problems and test cases and writes them in chunks; call finish() at the end"""
+
+    def __init__(self, created_by=None, chunk_size=CHUNK_SIZE):
+        self.created_by = created_by
+        self.chunk_size = chunk_size
+        self.topics = None  # name -> Topic
+        self.problem_ids = {}  # key -> id, for problems already written
+        self.pending = {}  # key -> Problem not written yet
+        self.test_cases = []  # (key, TestCase) not written yet
+        self.pending_bytes = 0
+        self.pending_rows = []  # numbers of the CSV rows in the next flush
+        self.pending_files = []  # zip test data files in the next flush
+        self.next_order = {}  # key -> order of the problem's next test case
+        self.problem_count = 0
+        self.test_case_count = 0
+        self.errors = []
+
+    def read_csv(self, text_file):
+        """Import the rows of a CSV opened with open_text, reporting and skipping bad ones"""
+        reader = csv.DictReader(text_file)
+        try:
+            fieldnames = reader.fieldnames or []
+        except csv.Error as e:
+            self.errors.append(f'Row 1: {e}')
+            return
+        if any(UNDECODABLE.search(name) for name in fieldnames):
+            self.errors.append('Row 1: the header is not UTF-8 text')
+            return
+        row_num = 1  # Row 1 is the header
+        while True:
+            row_num += 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                self.errors.append(f'Row {row_num}: {e}')
+                continue
+            try:
+                if any(UNDECODABLE.search(value) for value in row.values() if isinstance(value, str)):
+                    raise ValueError('Not UTF-8 text')
+                self.add_row(row_num, row)
+            except ValueError as e:
+                self.errors.append(f'Row {row_num}: {e}')
+
+    def add_row(self, row_num, row):
+        title = (row.get('title') or '').strip()
+        key = (row.get('key') or '').strip() or title
+        if not key:
+            raise ValueError('Missing title or description')
+        if key not in self.next_order:
+            description = (row.get('description') or '').strip()
+            if not title or not description:
+                self.next_order[key] = None  # Later rows of this problem are skipped too
+                raise ValueError('Missing title or description')
+            self.add_problem(key, row, row_num)
+        elif self.next_order[key] is None:
+            raise ValueError(f"Problem '{key}' was not imported")
+
+        test_input = (row.get('test_input') or '').strip()
+        test_output = (row.get('test_output') or '').strip()
+        if test_input and test_output:
+            is_sample = (row.get('is_sample') or 'false').strip().lower() == 'true'
+            self.add_test_case(key, test_input, test_output, is_sample, row=row_num)
+
+    def add_problem(self, key, row, row_num):
+        difficulty = (row.get('difficulty') or 'easy').strip().lower()
+        points = (row.get('points') or '10').strip()
+        self.pending[key] = Problem(
+            title=row['title'].strip(),
+            description=row['description'].strip(),
+            difficulty=difficulty if difficulty in DIFFICULTIES else 'easy',
+            is_active=(row.get('is_active') or 'true').strip().lower() == 'true',
+            points=int(points) if points.isdigit() else 10,
+            topic=self.topic((row.get('topic') or '').strip()),
+            created_by=self.created_by,
+        )
+        self.next_order[key] = 0
+        self.pending_rows.append(row_num)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def topic(self, name):
+        if not name:
+            return None
+        if self.topics is None:
+            self.topics = {topic.name: topic for topic in Topic.objects.all()}
+        if name not in self.topics:
+            self.topics[name], _ = Topic.objects.get_or_create(name=name)
+        return self.topics[name]
+
+    def add_test_case(self, key, input_data, expected_output, is_sample, row=None, file_name=None):
+        """Add a test case to a problem, from a CSV row or a zip file (named in error reports)"""
+        test_case = TestCase(is_sample=is_sample, order=self.next_order[key])
+        test_case.input_data, test_case.input_file = test_data.offload(input_data, '')
+        test_case.expected_output, test_case.expected_output_file = test_data.offload(expected_output, '')
+        self.next_order[key] += 1
+        self.test_cases.append((key, test_case))
+        if file_name is not None:
+            self.pending_files.append(file_name)
+        elif not self.pending_rows or self.pending_rows[-1] != row:
+            self.pending_rows.append(row)
+        self.pending_bytes += len(test_case.input_data) + len(test_case.expected_output)
+        if len(self.test_cases) >= self.chunk_size or self.pending_bytes >= CHUNK_BYTES:
+            self.flush()
+
+    def has_problem(self, key):
+        return self.next_order.get(key) is not None
+
+    def flush(self):
+        """Write the problems and test cases collected so far, in one transaction.
+
+        If the database refuses them, nothing of the chunk is written: its
+        rows are reported, and its problems count as not imported.
+        """
+        if not self.pending and not self.test_cases:
+            return
+        problems = list(self.pending.values())
+        try:
+            with transaction.atomic():
+                if connection.features.can_return_rows_from_bulk_insert:
+                    Problem.objects.bulk_create(problems)
+                else:
+                    for problem in problems:  # Ids are needed for the test cases
+                        problem.save()
+                for key, problem in self.pending.items():
+                    self.problem_ids[key] = problem.pk
+                for key, test_case in self.test_cases:
+                    test_case.problem_id = self.problem_ids[key]
+                TestCase.objects.bulk_create([test_case for _, test_case in self.test_cases])
+        except DatabaseError as e:
+            for key in self.pending:
+                self.problem_ids.pop(key, None)
+                self.next_order[key] = None
+            self.errors.append(f'{self.describe_pending()} not imported, the database refused them: {e}')
+        else:
+            self.problem_count += len(problems)
+            self.test_case_count += len(self.test_cases)
+        self.pending = {}
+        self.test_cases = []
+        self.pending_bytes = 0
+        self.pending_rows = []
+        self.pending_files = []
+
+    def describe_pending(self):
+        """The CSV rows (as ranges) and zip files in the next flush"""
+        ranges = []
+        for row in self.pending_rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        parts = []
+        if ranges:
+            parts.append(('Rows ' if len(self.pending_rows) > 1 else 'Row ') + ', '.join(str(first) if first == last else f'{first}-{last}'
+                                             for first, last in ranges))
+        if self.pending_files:
+            names = ', '.join(self.pending_files[:5])
+            more = len(self.pending_files) - 5
+            parts.append(f"test files {names}{f' and {more} more' if more > 0 else ''}")
+        text = ' and '.join(parts)
+        return text[:1].upper() + text[1:]
+
+    def finish(self):
+        self.flush()
+        return self
+
+
+def import_csv(upload, created_by=None):
+    """Import problems from a CSV file object opened in binary mode. Returns the finished ProblemImporter"""
+    importer = ProblemImporter(created_by=created_by)
+    importer.read_csv(open_text(upload))
+    return importer.finish()
+
+
+def import_zip(upload, created_by=None):
+    """Import problems from a zip of a CSV file and test data files. Returns the finished ProblemImporter"""
+    importer = ProblemImporter(created_by=created_by)
+    with zipfile.ZipFile(upload) as archive:
+        names = archive.namelist()
+        csv_names = [name for name in names if '/' not in name and name.lower().endswith('.csv')]
+        if len(csv_names) != 1:
+            raise ValueError('The zip must hold exactly one .csv file at its top level')
+        with archive.open(csv_names[0]) as f:
+            importer.read_csv(open_text(f))
+
+        pairs = {}  # (key, sample?, number) -> {'in': name, 'out': name}
+        for name in names:
+            match = TEST_FILE.match(name)
+            if match:
+                test = (match['key'], match['samples'] is None, int(match['number']))
+                pairs.setdefault(test, {})[match['kind']] = name
+        # Per problem: samples first, then by number
+        for (key, hidden, number), files in sorted(pairs.items()):
+            if not importer.has_problem(key):
+                importer.errors.append(f"{files.get('in') or files['out']}: no problem with key '{key}'")
+            elif set(files) != {'in', 'out'}:
+                present = files.get('in') or files['out']
+                importer.errors.append(f'{present}: no matching .{"out" if "in" in files else "in"} file')
+            else:
+                try:
+                    input_data = archive.read(files['in']).decode('utf-8')
+                    expected_output = archive.read(files['out']).decode('utf-8')
+                except UnicodeDecodeError:
+                    importer.errors.append(f"{files['in']}: test data is not UTF-8 text")
+                    continue
+                importer.add_test_case(key, input_data, expected_output, is_sample=not hidden,
+                                       file_name=files['in'])
+    return importer.finish()
@@ -0,0 +1,399 @@
+"""
+Warm fork server for running student Python programs.
+
+Started by lab.forkserver as `python3 pyrunner_server.py SOCKET_PATH`.
+This script only uses the standard library: it must not import Django or
+anything from the lab package, since every forked child inherits its
+interpreter state.
+
+Protocol, one connection per run:
+
+* The client connects and sends one JSON request line, passing its
+  stdin/stdout/stderr pipe ends as SCM_RIGHTS file descriptors.
+  Request: {"script": ..., "cwd": ..., "timeout": ..., "rlimits": {"AS": ...}}
+  "RSS" in rlimits is not set with setrlimit: the server checks the
+  child's resident memory every WATCH_INTERVAL seconds and kills it once
+  it goes over. Neither is "NPROC", which would count every process of
+  the server's account: every PROCESS_WATCH_INTERVAL seconds the server
+  counts the processes in the child's group and kills the group once
+  there are too many.
+* The server forks. The child runs the script as __main__ on those fds,
+  the way `python3 SCRIPT` would: sys.modules looks like a fresh
+  interpreter's (the preloaded modules are only handed out when
+  imported), the streams are buffered, and on the way out non-daemon
+  threads are joined, atexit handlers run and the streams are flushed.
+  The server replies {"pid": ...}.
+* The client may send "kill" to stop the run early. Closing the
+  connection also kills it.
+* When the child exits the server replies
+  {"returncode": ..., "timed_out": ..., "memory_exceeded": ..., "rusage": {...}}
+  and closes.
+"""
+import sys
+
+# What a fresh interpreter has loaded before running a script; children hide the rest
+FRESH_MODULES = frozenset(sys.modules)
+
+import atexit
+import importlib.machinery
+import json
+import os
+import select
+import signal
+import socket
+import threading
+import time
+import traceback
+import types
+
+# Modules student programs commonly import, loaded once so children start warm
+import array  # noqa: F401
+import bisect  # noqa: F401
+import collections  # noqa: F401
+import copy  # noqa: F401
+import decimal  # noqa: F401
+import fractions  # noqa: F401
+import functools  # noqa: F401
+import heapq  # noqa: F401
+import io
+import itertools  # noqa: F401
+import math  # noqa: F401
+import operator  # noqa: F401
+import random  # noqa: F401
+import re  # noqa: F401
+import resource
+import statistics  # noqa: F401
+import string  # noqa: F401
+import typing  # noqa: F401
+
+MAX_REQUEST_BYTES = 65536
+WATCH_INTERVAL = 0.01  # seconds between checks of the children's resident memory
+PROCESS_WATCH_INTERVAL = 0.05  # seconds between counts of the children's processes, which read all of /proc
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# Started with python3 -u or PYTHONUNBUFFERED, as a fresh interpreter would have been
+UNBUFFERED = isinstance(getattr(sys.__stdout__, 'buffer', None), io.FileIO)
+
+
+def apply_rlimits(rlimits):
+    """Apply {"AS": bytes, "CPU": seconds, ...} to the current process"""
+    for name, value in rlimits.items():
+        resource_id = getattr(resource, 'RLIMIT_' + name, None)
+        if resource_id is None:
+            continue
+        _, hard = resource.getrlimit(resource_id)
+        # SIGXCPU at the soft CPU limit, SIGKILL a second later
+        wanted = value + 1 if name == 'CPU' else value
+        if hard != resource.RLIM_INFINITY:
+            wanted = min(wanted, hard)
+        resource.setrlimit(resource_id, (min(value, wanted), wanted))
+
+
+class WarmModules:
+    """Import hook handing out the modules the server preloaded.
+
+    A child takes them out of sys.modules, so it starts with what a fresh
+    interpreter has; importing one then returns the loaded module instead
+    of running it again.
+    """
+
+    def __init__(self, modules):
+        self.modules = modules
+
+    def find_spec(self, name, path=None, target=None):
+        module = self.modules.get(name)
+        if module is None:
+            return None
+        spec = importlib.machinery.ModuleSpec(name, self)
+        original = getattr(module, '__spec__', None)
+        if original is not None:
+            spec.origin = original.origin
+            spec.submodule_search_locations = original.submodule_search_locations
+            spec.has_location = original.has_location
+        return spec
+
+    def create_module(self, spec):
+        return self.modules.pop(spec.name)
+
+    def exec_module(self, module):
+        pass
+
+
+def hide_preloaded_modules():
+    warm = {name: sys.modules.pop(name) for name in list(sys.modules) if name not in FRESH_MODULES}
+    sys.meta_path.insert(0, WarmModules(warm))
+
+
+def open_stream(fd, mode, line_buffering=False, errors=None):
+    """A text stream on fd buffered like the interpreter's own stdin/stdout/stderr"""
+    if mode == 'w' and UNBUFFERED:
+        return io.TextIOWrapper(io.FileIO(fd, mode, closefd=False), encoding='utf-8', errors=errors,
+                                line_buffering=line_buffering, write_through=True)
+    return io.open(fd, mode, buffering=1 if line_buffering else -1, encoding='utf-8', errors=errors,
+                   closefd=False)
+
+
+def run_script(script):
+    """Run script as __main__, like `python3 script`"""
+    main = types.ModuleType('__main__')
+    main.__file__ = script
+    main.__cached__ = None
+    main.__loader__ = importlib.machinery.SourceFileLoader('__main__', script)
+    main.__builtins__ = __builtins__
+    sys.modules['__main__'] = main
+    with open(script, 'rb') as f:
+        code = compile(f.read(), script, 'exec')
+    exec(code, main.__dict__)
+
+
+def run_child(request, fds):
+    """Runs in the forked child: become the student program and never return"""
+    exit_code = 0
+    try:
+        os.setsid()
+        signal.set_wakeup_fd(-1)
+        for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        os.closerange(3, os.sysconf('SC_OPEN_MAX') if hasattr(os, 'sysconf') else 1024)
+
+        os.chdir(request['cwd'])
+        apply_rlimits(request.get('rlimits', {}))
+        script = request['script']
+        sys.argv = [script]
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+        sys.stdin = open_stream(0, 'r')
+        sys.stdout = open_stream(1, 'w', line_buffering=os.isatty(1))
+        # Python 3.9+ line-buffers stderr even when it isn't a terminal
+        sys.stderr = open_stream(2, 'w', errors='backslashreplace', line_buffering=True)
+        atexit._clear()  # Handlers registered by the server, not the program
+        hide_preloaded_modules()
+
+        run_script(script)
+    except SystemExit as e:
+        exit_code = exit_status(e)
+    except BaseException as e:
+        # Hide this server's frames, like a plain `python3 script.py`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request.get('script'):
+            tb = tb.tb_next
+        try:
+            sys.excepthook(type(e), e, tb or e.__traceback__)
+        except BaseException:
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+        exit_code = 1
+    finally:
+        exit_code = finish(exit_code)
+        os._exit(exit_code & 0xFF)
+
+
+def exit_status(e):
+    """The exit status of a SystemExit, printing a non-integer code like the interpreter"""
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    try:
+        print(e.code, file=sys.stderr)
+    except Exception:
+        pass
+    return 1
+
+
+def finish(exit_code):
+    """Shut down like the interpreter: join non-daemon threads, run atexit handlers, flush the streams"""
+    try:
+        threading._shutdown()
+    except BaseException:
+        traceback.print_exc()
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            # The interpreter exits with 120 when it can't flush its output
+            if exit_code == 0:
+                exit_code = 120
+    return exit_code
+
+
+def resident_bytes(pid):
+    """Resident memory of a process, or None if it can't be read (e.g. it has exited)"""
+    try:
+        with open(f'/proc/{pid}/statm', 'rb') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def group_sizes():
+    """Number of processes in each process group, from /proc"""
+    sizes = {}
+    try:
+        names = os.listdir('/proc')
+    except OSError:
+        return sizes
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                stat = f.read()
+            # pid (comm) state ppid pgrp ...; comm may itself hold spaces and parentheses
+            pgrp = int(stat[stat.rindex(b')') + 1:].split()[2])
+        except (OSError, ValueError, IndexError):
+            continue
+        sizes[pgrp] = sizes.get(pgrp, 0) + 1
+    return sizes
+
+
+class Run:
+    def __init__(self, conn, pid, timeout, memory_limit=None, process_limit=None):
+        self.conn = conn
+        self.pid = pid
+        self.deadline = time.monotonic() + timeout
+        self.memory_limit = memory_limit
+        self.process_limit = process_limit
+        self.timed_out = False
+        self.memory_exceeded = False
+        self.killed = False
+
+    def kill(self):
+        if not self.killed:
+            self.killed = True
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except OSError:
+                # The child may not have called setsid() yet
+                try:
+                    os.kill(self.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+
+def serve(socket_path):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda *args: None)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    runs = {}  # pid -> Run
+    by_conn = {}  # conn fileno -> Run
+    next_process_count = 0
+
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+
+    while True:
+        now = time.monotonic()
+        deadlines = [run.deadline for run in runs.values() if not run.killed]
+        if any(run.memory_limit or run.process_limit for run in runs.values() if not run.killed):
+            deadlines.append(now + WATCH_INTERVAL)
+        timeout = max(0, min(deadlines) - now) if deadlines else None
+        try:
+            readable, _, _ = select.select([listener, wakeup_r] + [run.conn for run in by_conn.values()],
+                                           [], [], timeout)
+        except InterruptedError:
+            readable = []
+
+        for sock in readable:
+            if sock is listener:
+                conn, _ = listener.accept()
+                try:
+                    data, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST_BYTES, 3)
+                    request = json.loads(data.decode('utf-8'))
+                    if len(fds) != 3:
+                        raise ValueError('expected stdin, stdout and stderr descriptors')
+                    memory_limit = request.setdefault('rlimits', {}).pop('RSS', None)
+                    process_limit = request['rlimits'].pop('NPROC', None)
+                except Exception as e:
+                    conn.sendall(json.dumps({'error': str(e)}).encode('utf-8') + b'\n')
+                    conn.close()
+                    continue
+
+                pid = os.fork()
+                if pid == 0:
+                    listener.close()
+                    for run in by_conn.values():
+                        run.conn.close()
+                    conn.close()
+                    run_child(request, fds)
+                for fd in fds:
+                    os.close(fd)
+                run = Run(conn, pid, float(request.get('timeout', 10)), memory_limit, process_limit)
+                runs[pid] = run
+                by_conn[conn.fileno()] = run
+                conn.sendall(json.dumps({'pid': pid}).encode('utf-8') + b'\n')
+            elif sock == wakeup_r:
+                os.read(wakeup_r, 4096)
+            else:
+                run = by_conn.get(sock.fileno())
+                try:
+                    message = sock.recv(64)
+                except OSError:
+                    message = b''
+                # 'kill' or a closed connection both end the run
+                if run is not None and (not message or message.startswith(b'kill')):
+                    run.kill()
+
+        # Enforce wall-clock timeouts, memory and process limits
+        now = time.monotonic()
+        sizes = None
+        if now >= next_process_count and any(run.process_limit for run in runs.values() if not run.killed):
+            sizes = group_sizes()
+            next_process_count = now + PROCESS_WATCH_INTERVAL
+        for run in runs.values():
+            if run.killed:
+                continue
+            if now >= run.deadline:
+                run.timed_out = True
+                run.kill()
+            elif run.memory_limit and (resident_bytes(run.pid) or 0) > run.memory_limit:
+                run.memory_exceeded = True
+                run.kill()
+            elif sizes is not None and run.process_limit and sizes.get(run.pid, 0) > run.process_limit:
+                run.kill()
+
+        # Reap finished children and report their status
+        while runs:
+            try:
+                pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            run = runs.pop(pid, None)
+            if run is None:
+                continue
+            by_conn.pop(run.conn.fileno(), None)
+            if run.killed:
+                # Make sure nothing the program forked outlives it
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            result = {
+                'returncode': os.waitstatus_to_exitcode(status),
+                'timed_out': run.timed_out,
+                'memory_exceeded': run.memory_exceeded,
+                'rusage': {
+                    'utime': rusage.ru_utime,
+                    'stime': rusage.ru_stime,
+                    'maxrss': rusage.ru_maxrss,
+                },
+            }
+            try:
+                run.conn.sendall(json.dumps(result).encode('utf-8') + b'\n')
+            except OSError:
+                pass
+            run.conn.close()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
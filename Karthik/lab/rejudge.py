@@ -0,0 +1,264 @@
+"""
+Bulk rejudging of existing submissions, e.g. after a wrong test case was
+fixed in the admin.
+
+A Rejudge row lists the submissions to judge again. It is queued from the
+admin (the "Rejudge" actions on problems and submissions) and run by a
+judge worker in a background thread, so live submissions keep being
+judged, or run in the foreground by `python manage.py rejudge`. With
+JUDGE_ASYNC off no worker runs, and the admin runs the rejudge inside the
+request instead.
+
+Submissions are rejudged on a pool of REJUDGE_WORKERS threads. Every
+compile and run goes through the execution scheduler as one owner,
+REJUDGE_OWNER, which runs many at once and so gives up free slots to any
+live user running fewer: a rejudge uses the capacity nobody else is
+waiting for. REJUDGE_DELAY adds a pause after each submission on top of
+that.
+
+Rejudged verdicts don't award points as they are stored. Once every
+submission is done, the solves of the (user, problem) pairs involved are
+settled (see scoring.py): a pair that gained its first accepted submission
+is solved and awards its points, and one that lost all of them loses its
+solve and the points.
+"""
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .code_executor import CodeExecutor
+from .judge import default_worker_name, judge_submission
+from .models import Rejudge, SolvedProblem, Submission
+from .scoring import record_solve, revoke_solve
+
+logger = logging.getLogger(__name__)
+
+REJUDGE_OWNER = 'rejudge'
+# Submissions still in the judge queue are left to it
+SKIPPED_STATUSES = ('pending', 'running')
+
+
+def rejudge_workers():
+    return getattr(settings, 'REJUDGE_WORKERS', None) or 2
+
+
+def rejudge_delay():
+    return getattr(settings, 'REJUDGE_DELAY', 0)
+
+
+def select_submissions(problem=None, submissions=None, statuses=None, languages=None, since=None):
+    """Ids of the submissions to rejudge, oldest first.
+
+    submissions narrows an existing queryset (the admin's selection);
+    problem, statuses, languages and since (a datetime) filter it further.
+    Practice runs and submissions still queued are left out.
+    """
+    queryset = Submission.objects.all() if submissions is None else submissions
+    queryset = queryset.filter(problem__isnull=False).exclude(status__in=SKIPPED_STATUSES)
+    if problem is not None:
+        queryset = queryset.filter(problem=problem)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if languages:
+        queryset = queryset.filter(language__in=languages)
+    if since is not None:
+        queryset = queryset.filter(submitted_at__gte=since)
+    return list(queryset.order_by('submitted_at', 'id').values_list('id', flat=True))
+
+
+def queue_rejudge(submission_ids, problem=None, requested_by=None, use_cache=True):
+    """Queue a Rejudge for a judge worker to run"""
+    return Rejudge.objects.create(
+        problem=problem,
+        requested_by=requested_by,
+        submission_ids=list(submission_ids),
+        use_cache=use_cache,
+        total=len(submission_ids),
+    )
+
+
+def start_rejudge(submission_ids, problem=None, requested_by=None, use_cache=True):
+    """Queue a Rejudge, or with JUDGE_ASYNC off, when no worker would run it, run it now"""
+    rejudge = queue_rejudge(submission_ids, problem=problem, requested_by=requested_by, use_cache=use_cache)
+    if getattr(settings, 'JUDGE_ASYNC', True):
+        return rejudge
+    claim_rejudge(rejudge, default_worker_name())
+    try:
+        return run_rejudge(rejudge)
+    except Exception:
+        rejudge.refresh_from_db()  # The failure is recorded on it
+        return rejudge
+
+
+def claim_rejudge(rejudge, worker_name):
+    """Mark a queued Rejudge as running on worker_name, e.g. to run it in the foreground"""
+    Rejudge.objects.filter(pk=rejudge.pk).update(status='running', worker=worker_name, started_at=timezone.now())
+    rejudge.refresh_from_db()
+
+
+def claim_next_rejudge(worker_name):
+    """Atomically claim the oldest queued Rejudge, or return None"""
+    while True:
+        rejudge = Rejudge.objects.filter(status='queued').order_by('created_at', 'id').first()
+        if rejudge is None:
+            return None
+        claimed = Rejudge.objects.filter(id=rejudge.id, status='queued').update(
+            status='running', worker=worker_name, started_at=timezone.now(),
+        )
+        if claimed:
+            rejudge.refresh_from_db()
+            return rejudge
+
+
+def run_rejudge(rejudge, executor=None, workers=None, delay=None, progress=None, stop=None):
+    """Rejudge the submissions of a claimed Rejudge, record progress on it and settle scores.
+
+    progress, if given, is called with (processed, total, submission_id,
+    old status, new status) after each submission, from the pool's threads.
+    Setting the stop event ends the rejudge early; the submissions already
+    rejudged still have their scores settled, and the Rejudge is marked
+    failed.
+    """
+    executor = executor or CodeExecutor()
+    workers = workers or rejudge_workers()
+    delay = rejudge_delay() if delay is None else delay
+    ids = list(rejudge.submission_ids)
+    Rejudge.objects.filter(pk=rejudge.pk).update(
+        status='running', total=len(ids), started_at=rejudge.started_at or timezone.now())
+
+    lock = threading.Lock()
+    counts = {'processed': 0, 'changed': 0, 'errors': 0}
+    pairs = set()  # (user id, problem id) of the submissions rejudged
+
+    def run(submission_id):
+        if stop is not None and stop.is_set():
+            return
+        old_status = new_status = None
+        failed = False
+        try:
+            submission = Submission.objects.select_related('problem', 'user').filter(pk=submission_id).first()
+            if submission is not None and submission.status not in SKIPPED_STATUSES:
+                old_status = submission.status
+                with lock:
+                    pairs.add((submission.user_id, submission.problem_id))
+                judge_submission(submission, executor=executor, owner=REJUDGE_OWNER,
+                                 award_points=False, use_cache=rejudge.use_cache)
+                new_status = submission.status
+        except Exception:
+            failed = True
+            logger.error('Rejudge %s: submission %s failed\n%s', rejudge.pk, submission_id, traceback.format_exc())
+
+        try:
+            with lock:
+                counts['processed'] += 1
+                if new_status is not None and new_status != old_status:
+                    counts['changed'] += 1
+                if failed:
+                    counts['errors'] += 1
+                snapshot = dict(counts)
+                Rejudge.objects.filter(pk=rejudge.pk).update(**snapshot)
+        finally:
+            # Each pool thread has its own database connection
+            connection.close()
+        if progress:
+            progress(snapshot['processed'], len(ids), submission_id, old_status, new_status)
+        if delay:
+            time.sleep(delay)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ids) or 1))) as pool:
+            list(pool.map(run, ids))
+        score_changes = settle_scores(pairs)
+    except Exception:
+        Rejudge.objects.filter(pk=rejudge.pk).update(
+            status='failed', error=traceback.format_exc(), finished_at=timezone.now(), **counts)
+        raise
+    stopped = counts['processed'] < len(ids)
+    Rejudge.objects.filter(pk=rejudge.pk).update(
+        status='failed' if stopped else 'done',
+        error=f"Stopped after {counts['processed']} of {len(ids)} submissions" if stopped else '',
+        score_changes=score_changes, finished_at=timezone.now(), **counts)
+    rejudge.refresh_from_db()
+    return rejudge
+
+
+def settle_scores(pairs):
+    """Bring the solves of rejudged (user, problem) pairs in line with their verdicts.
+
+    A pair with an accepted submission now is solved by the earliest one;
+    a pair without one loses its solve and the points with it. Returns the
+    number of users whose score changed.
+    """
+    if not pairs:
+        return 0
+    user_ids = {user_id for user_id, _ in pairs}
+    problem_ids = {problem_id for _, problem_id in pairs}
+
+    first_accepted = {}
+    accepted = (
+        Submission.objects.filter(status='accepted', user_id__in=user_ids, problem_id__in=problem_ids)
+        .select_related('problem').order_by('submitted_at', 'id')
+    )
+    for submission in accepted.iterator():
+        pair = (submission.user_id, submission.problem_id)
+        if pair in pairs:
+            first_accepted.setdefault(pair, submission)
+    solved = set(
+        SolvedProblem.objects.filter(user_id__in=user_ids, problem_id__in=problem_ids)
+        .values_list('user_id', 'problem_id')
+    )
+
+    changed = set()
+    for pair in pairs:
+        if pair in first_accepted and pair not in solved:
+            if record_solve(first_accepted[pair]):
+                changed.add(pair[0])
+        elif pair not in first_accepted and pair in solved:
+            if revoke_solve(*pair):
+                changed.add(pair[0])
+    return len(changed)
+
+
+class RejudgeRunner:
+    """Runs queued rejudges one at a time in a background thread of a judge worker"""
+
+    def __init__(self, worker_name, executor=None):
+        self.worker_name = worker_name
+        self.executor = executor
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def poll(self):
+        """Start the next queued rejudge unless one is running. Returns the Rejudge started, if any"""
+        if self.busy:
+            return None
+        rejudge = claim_next_rejudge(self.worker_name)
+        if rejudge is None:
+            return None
+        self.thread = threading.Thread(target=self._run, args=(rejudge,), name=f'rejudge-{rejudge.pk}', daemon=True)
+        self.thread.start()
+        return rejudge
+
+    def _run(self, rejudge):
+        try:
+            run_rejudge(rejudge, executor=self.executor, stop=self.stop_event)
+        except Exception:
+            pass  # Recorded on the Rejudge row
+        finally:
+            connection.close()
+
+    def stop(self):
+        """Stop the running rejudge after the submissions already started, and wait for it"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
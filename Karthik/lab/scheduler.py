@@ -0,0 +1,254 @@
+"""
+Admission control for code execution.
+
+Every compile and run goes through ExecutionScheduler.slot(owner). At
+most EXECUTION_MAX_CONCURRENT of them run at once on the host, and the
+scheduler is work-conserving: a slot is never left idle while someone is
+waiting for it, so a single user's submission can use every core of an
+otherwise idle host.
+
+Slots are only shared out when there is contention. A free slot goes to
+the waiting owner (usually the user id) with the fewest executions
+running, and between owners running as many, round-robin; one user's
+burst of submissions then can't starve anyone queued behind it, and
+shares even out as runs finish.
+
+* Inside a process the waiting requests are granted in that order.
+* Across processes (web workers and judge workers), slot files under
+  EXECUTION_DIR/slots held with flock cap the total. Each owner's running
+  executions are counted by the files it holds under slots/users, and an
+  owner waiting in any process marks itself under slots/waiting; an owner
+  passes up a free slot while another owner running fewer executions is
+  waiting for one. The last holder of an owner's file removes it, so
+  those directories only list the owners running or waiting right now.
+
+Where fcntl is unavailable (Windows) only the in-process scheduling applies.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class ExecutionScheduler:
+    """Caps concurrent executions and shares them between owners when they contend"""
+
+    def __init__(self, max_concurrent, slot_dir=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.slot_dir = str(slot_dir) if slot_dir else None
+        self._cond = threading.Condition()
+        self._waiting = OrderedDict()  # owner -> deque of tickets, in round-robin order
+        self._running = 0
+        self._running_by_owner = {}
+        if self.slot_dir and fcntl is not None:
+            os.makedirs(os.path.join(self.slot_dir, 'users'), exist_ok=True)
+            os.makedirs(os.path.join(self.slot_dir, 'waiting'), exist_ok=True)
+
+    @contextmanager
+    def slot(self, owner=None):
+        """Block until owner may start a process, and hold the slot while it runs"""
+        owner = 'anonymous' if owner is None else str(owner)
+        self._acquire_local(owner)
+        held = []
+        try:
+            if self.slot_dir and fcntl is not None:
+                held.extend(self._acquire_files(owner))
+            yield
+        finally:
+            for fd, path in reversed(held):
+                self._release_file(fd, path)
+            self._release_local(owner)
+
+    def queue_depth(self):
+        """Snapshot of waiting and running executions"""
+        with self._cond:
+            waiting_by_owner = {owner: len(tickets) for owner, tickets in self._waiting.items()}
+            data = {
+                'running': self._running,
+                'waiting': sum(waiting_by_owner.values()),
+                'waiting_by_owner': waiting_by_owner,
+                'max_concurrent': self.max_concurrent,
+            }
+        if self.slot_dir and fcntl is not None:
+            data['running_all_workers'] = sum(
+                1 for path in self._global_slot_paths() if self._is_held(path)
+            )
+        return data
+
+    # In-process scheduling
+
+    def _acquire_local(self, owner):
+        ticket = object()
+        with self._cond:
+            self._waiting.setdefault(owner, deque()).append(ticket)
+            while not self._can_start(owner, ticket):
+                self._cond.wait()
+
+            tickets = self._waiting.pop(owner)
+            tickets.popleft()
+            if tickets:
+                # Served owners go to the back of the line
+                self._waiting[owner] = tickets
+            self._running += 1
+            self._running_by_owner[owner] = self._running_by_owner.get(owner, 0) + 1
+            self._cond.notify_all()
+
+    def _can_start(self, owner, ticket):
+        if self._running >= self.max_concurrent:
+            return False
+        # The owner with the fewest running goes next; min() keeps the first, in round-robin order, of a tie
+        candidate = min(self._waiting, key=lambda waiting: self._running_by_owner.get(waiting, 0))
+        return candidate == owner and self._waiting[owner][0] is ticket
+
+    def _release_local(self, owner):
+        with self._cond:
+            self._running -= 1
+            self._running_by_owner[owner] -= 1
+            if not self._running_by_owner[owner]:
+                del self._running_by_owner[owner]
+            self._cond.notify_all()
+
+    # Cross-process slots
+
+    def _acquire_files(self, owner):
+        """Lock a global slot file and one of the owner's running files, polling with backoff.
+
+        Returns (fd, path) pairs to release; path is the file to remove on
+        release, None for the global slot files, which are kept.
+        """
+        owner_hash = hashlib.sha1(owner.encode('utf-8')).hexdigest()[:16]
+        waiting_path = os.path.join(self.slot_dir, 'waiting', owner_hash)
+        waiting_fd = self._lock_file(waiting_path, fcntl.LOCK_SH)
+        try:
+            delay = 0.005
+            while True:
+                if not self._should_yield(owner_hash):
+                    slot_fd = self._lock_free_file(self._global_slot_paths())
+                    if slot_fd is not None:
+                        break
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        finally:
+            self._release_file(waiting_fd, waiting_path)
+        held = [(slot_fd, None)]
+        # An owner holds at most max_concurrent slots, so one of its files is free
+        for path in self._owner_paths(owner_hash):
+            running_fd = self._lock_file(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if running_fd is not None:
+                held.append((running_fd, path))
+                break
+        return held
+
+    def _should_yield(self, owner_hash):
+        """True while another owner waiting for a slot has fewer executions running than this one"""
+        waiting_dir = os.path.join(self.slot_dir, 'waiting')
+        # Files left behind by a process that died while waiting are removed on the way
+        others = [
+            name for name in os.listdir(waiting_dir)
+            if name != owner_hash and self._is_held(os.path.join(waiting_dir, name), remove=True)
+        ]
+        if not others:
+            return False
+        running = self._running_count(owner_hash)
+        return any(self._running_count(other) < running for other in others)
+
+    def _running_count(self, owner_hash):
+        return sum(1 for path in self._owner_paths(owner_hash) if self._is_held(path, remove=True))
+
+    def _global_slot_paths(self):
+        return [os.path.join(self.slot_dir, f'slot-{i}') for i in range(self.max_concurrent)]
+
+    def _owner_paths(self, owner_hash):
+        return [os.path.join(self.slot_dir, 'users', f'{owner_hash}-{i}') for i in range(self.max_concurrent)]
+
+    @classmethod
+    def _lock_free_file(cls, paths):
+        """Lock the first free file in paths and return its fd, or None if all are held"""
+        for path in paths:
+            fd = cls._lock_file(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if fd is not None:
+                return fd
+        return None
+
+    @staticmethod
+    def _lock_file(path, operation):
+        """Create path if needed and flock it; returns the fd, or None if a non-blocking lock is refused.
+
+        The file may be removed by its last holder between the open and the
+        flock: then the lock is on a file nobody else can see, so start over.
+        """
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR)
+            try:
+                fcntl.flock(fd, operation)
+            except OSError:
+                os.close(fd)
+                return None
+            try:
+                if os.path.samestat(os.fstat(fd), os.stat(path)):
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    @staticmethod
+    def _release_file(fd, path=None):
+        """Unlock fd, first removing path if it is given and nobody else holds it"""
+        try:
+            if path is not None:
+                try:
+                    # Nobody else can lock it once it is gone; a shared lock becomes exclusive only if unshared
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.unlink(path)
+                except OSError:
+                    pass
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @staticmethod
+    def _is_held(path, remove=False):
+        """True if someone holds a lock on path; with remove, a file nobody holds is removed"""
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return True
+        try:
+            if remove and os.path.samestat(os.fstat(fd), os.stat(path)):
+                os.unlink(path)
+        except OSError:
+            pass
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return False
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide ExecutionScheduler configured from settings"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            execution_dir = getattr(settings, 'EXECUTION_DIR', None)
+            _scheduler = ExecutionScheduler(
+                max_concurrent=getattr(settings, 'EXECUTION_MAX_CONCURRENT', None) or os.cpu_count() or 1,
+                slot_dir=os.path.join(execution_dir, 'slots') if execution_dir else None,
+            )
+        return _scheduler
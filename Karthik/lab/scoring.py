@@ -0,0 +1,51 @@
+"""
+Scores: UserProfile.score is the sum of the points of the problems a user
+has solved.
+
+Each solve is a SolvedProblem row, unique per (user, problem) and created
+by the user's first accepted submission. Points move only together with
+such a row, in one transaction, as an F() update of the score. So an
+accepted verdict costs one insert whatever the user's history, and two
+submissions accepted at the same moment can't both award the points or
+overwrite each other's score. Every score change invalidates the cached
+leaderboard once committed.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import leaderboard
+from .models import SolvedProblem, UserProfile
+
+
+def record_solve(submission):
+    """Mark the submission's problem solved by its user. Returns True if this was the first solve.
+
+    Only the first solve awards the problem's points.
+    """
+    problem = submission.problem
+    with transaction.atomic():
+        solved, created = SolvedProblem.objects.get_or_create(
+            user_id=submission.user_id,
+            problem_id=problem.id,
+            defaults={
+                'submission': submission,
+                'points': problem.points,
+                'solved_at': submission.submitted_at,
+            },
+        )
+        if created:
+            UserProfile.objects.filter(user_id=submission.user_id).update(score=F('score') + solved.points)
+            transaction.on_commit(leaderboard.invalidate)
+    return created
+
+
+def revoke_solve(user_id, problem_id):
+    """Undo a solve, e.g. after a rejudge failed the only accepted submission. Returns True if there was one"""
+    with transaction.atomic():
+        solved = SolvedProblem.objects.select_for_update().filter(user_id=user_id, problem_id=problem_id).first()
+        if solved is None:
+            return False
+        solved.delete()
+        UserProfile.objects.filter(user_id=user_id).update(score=F('score') - solved.points)
+        transaction.on_commit(leaderboard.invalidate)
+    return True
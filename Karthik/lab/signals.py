@@ -1,15 +1,24 @@
-from django.db.models.signals import post_save
+import shutil
+
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, GhostCredential, Problem, TestCase
+from .special_judge import compile_checker, problem_checker_dir
+from . import leaderboard, verdict_cache
+
+# Problem fields that change verdicts without touching a test case
+CHECKER_FIELDS = ('checker', 'checker_tolerance', 'checker_language', 'checker_code')
 
 
 @receiver(post_save, sender=User)
-def handle_user_profile(sender, instance, created, **kwargs):
+def handle_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """Automatically create UserProfile and sync GhostCredential when a User is saved"""
     if created:
         UserProfile.objects.get_or_create(user=instance, defaults={'role': 'student'})
         GhostCredential.objects.get_or_create(user=instance, defaults={'username': instance.username})
+    elif update_fields is not None and set(update_fields) == {'last_login'}:
+        return  # A login can't change the username
     else:
         # Sync username to ghost table on update
         GhostCredential.objects.update_or_create(
@@ -17,3 +26,54 @@ def handle_user_profile(sender, instance, created, **kwargs):
             defaults={'username': instance.username}
         )
 
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_leaderboard(sender, instance, **kwargs):
+    """Scores edited by hand and branch/year/role changes move students on the leaderboard"""
+    leaderboard.invalidate()
+
+
+@receiver(post_save, sender=User)
+def invalidate_leaderboard_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Logins only update last_login, which the leaderboard doesn't show
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        leaderboard.invalidate()
+
+
+@receiver(post_save, sender=Problem)
+def compile_problem_checker(sender, instance, **kwargs):
+    """Build a custom checker program once, when the problem is saved, instead of per submission"""
+    if instance.checker != 'custom':
+        return
+    error = compile_checker(instance) or None
+    if error != instance.checker_compile_error:
+        Problem.objects.filter(pk=instance.pk).update(checker_compile_error=error)
+        instance.checker_compile_error = error
+
+
+@receiver(post_delete, sender=Problem)
+def remove_problem_checker(sender, instance, **kwargs):
+    shutil.rmtree(problem_checker_dir(instance.pk), ignore_errors=True)
+
+
+@receiver(post_save, sender=TestCase)
+@receiver(post_delete, sender=TestCase)
+def invalidate_cached_verdicts(sender, instance, **kwargs):
+    """Adding, editing or deleting a test case (admin inlines included) starts a new test revision"""
+    verdict_cache.invalidate(instance.problem_id)
+
+
+@receiver(pre_save, sender=Problem)
+def invalidate_cached_verdicts_on_checker_change(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = Problem.objects.filter(pk=instance.pk).values(*CHECKER_FIELDS, 'test_revision').first()
+    if previous is None:
+        return
+    if any(previous[field] != getattr(instance, field) for field in CHECKER_FIELDS):
+        verdict_cache.invalidate(instance.pk)
+        previous['test_revision'] += 1
+    # The save writes test_revision back; an instance loaded earlier must not undo a bump
+    instance.test_revision = previous['test_revision']
+
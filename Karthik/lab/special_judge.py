@@ -0,0 +1,190 @@
+"""
+Special judges: checker programs written by the problem author, for problems
+that accept more than one correct output.
+
+A problem with checker = 'custom' carries checker_code in C++ or Python.
+The checker is built once, when the problem is saved (see signals.py), into
+
+    EXECUTION_DIR/checkers/<problem id>/<hash of language, toolchain and source>/
+
+and every web and judge worker process reuses that build. A worker that
+finds no build (a new host, a wiped EXECUTION_DIR) compiles it on first use.
+
+For every test case the submission passes on its own, the checker runs under
+the same resource limits as student code in its language, as
+
+    checker INPUT OUTPUT ANSWER
+
+in testlib's argument order: the test input, the submission's output and the
+expected output. They are paths of the form /dev/fd/N, naming descriptors
+the checker inherits, so nothing is copied into its working directory.
+Exit status 0 accepts the output and 1 or 2 (testlib's wrong answer and
+presentation error) reject it. Anything else is reported as a checker
+failure. Whatever the checker prints is shown with the verdict.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from django.conf import settings
+
+from .code_executor import CodeExecutor, CompiledProgram
+from .compile_cache import FileLock, toolchain_version
+
+
+CHECKER_COMPILERS = {'cpp': 'g++', 'python': 'python3'}
+REJECT_EXIT_CODES = (1, 2)
+MESSAGE_CHARS = 1000  # checker output shown with a verdict
+COMMAND_FILE = 'command.json'
+
+
+class CachedProgram(CompiledProgram):
+    """A checker build shared by every run; compile_checker replaces it"""
+
+    def cleanup(self):
+        pass
+
+
+def problem_checker_dir(problem_id):
+    return os.path.join(str(settings.EXECUTION_DIR), 'checkers', str(problem_id))
+
+
+def checker_build_dir(problem):
+    digest = hashlib.sha256()
+    compiler = CHECKER_COMPILERS.get(problem.checker_language, problem.checker_language)
+    for part in (problem.checker_language, toolchain_version(compiler), problem.checker_code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return os.path.join(problem_checker_dir(problem.pk), digest.hexdigest()[:16])
+
+
+def compile_checker(problem, executor=None):
+    """Build the problem's checker program unless the current version is built.
+
+    Returns the compile error, or '' on success. Builds of earlier versions
+    of the checker are removed.
+    """
+    if problem.checker_language not in CHECKER_COMPILERS:
+        return f'Unsupported checker language: {problem.checker_language}'
+    if problem.checker_language == 'python':
+        # Python has no build step, so at least catch syntax errors on save
+        try:
+            compile(problem.checker_code, 'checker.py', 'exec')
+        except SyntaxError as e:
+            return f'{e.__class__.__name__}: {e.msg} (line {e.lineno})'
+
+    build_dir = checker_build_dir(problem)
+    parent = os.path.dirname(build_dir)
+    os.makedirs(parent, exist_ok=True)
+    # Only one process builds; the others wait on the lock and reuse the result
+    with FileLock(os.path.join(parent, '.lock')):
+        if not os.path.exists(os.path.join(build_dir, COMMAND_FILE)):
+            executor = executor or CodeExecutor()
+            program = executor.compile(problem.checker_language, problem.checker_code)
+            if not program.success:
+                return program.error.strip() or 'Compilation failed'
+            # The command names files in the build directory, which is about to move
+            command = [arg.replace(program.work_dir, '{dir}') for arg in program.command]
+            with open(os.path.join(program.work_dir, COMMAND_FILE), 'w', encoding='utf-8') as f:
+                json.dump(command, f)
+            shutil.rmtree(build_dir, ignore_errors=True)
+            # A move rather than a rename: workspaces may be on another filesystem (tmpfs)
+            shutil.move(program.work_dir, build_dir)
+            program.cleanup()
+
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            if path != build_dir and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+    return ''
+
+
+def load_checker(problem):
+    """The problem's checker build as a CompiledProgram, building it first if needed"""
+    build_dir = checker_build_dir(problem)
+    command_file = os.path.join(build_dir, COMMAND_FILE)
+    if not os.path.exists(command_file):
+        error = compile_checker(problem)
+        if error:
+            return CachedProgram(problem.checker_language, None, error=error)
+    with open(command_file, encoding='utf-8') as f:
+        command = [arg.replace('{dir}', build_dir) for arg in json.load(f)]
+    return CachedProgram(problem.checker_language, build_dir, command)
+
+
+def _to_bytes(text):
+    return text.encode('utf-8') if isinstance(text, str) else text
+
+
+class SpecialJudge:
+    """Checker factory (see checkers.checker_for) for a problem with a checker program"""
+
+    def __init__(self, program):
+        self.program = program
+
+    def __call__(self, expected_output):
+        return CheckerRun(self, expected_output)
+
+    def check(self, executor, input_data, expected_output, output_file, input_path=None):
+        """Run the checker program on one test case and return (accepted, message).
+
+        input_path is the input's test data file, used in place of input_data.
+        """
+        if not self.program.success:
+            return False, f'Checker failed to compile: {self.program.error}'
+
+        input_file = open(input_path, 'rb') if input_path else tempfile.TemporaryFile()
+        with input_file, tempfile.TemporaryFile() as answer_file:
+            if not input_path:
+                input_file.write(_to_bytes(input_data or ''))
+            answer_file.write(_to_bytes(expected_output or ''))
+            files = (input_file, output_file, answer_file)
+            for f in files:
+                f.flush()
+                f.seek(0)
+            fds = [f.fileno() for f in files]
+            program = CompiledProgram(
+                self.program.language, self.program.work_dir,
+                self.program.command + [f'/dev/fd/{fd}' for fd in fds],
+            )
+            result = executor.run(program, pass_fds=fds)
+
+        message = '\n'.join(
+            part.strip() for part in (result.get('output', ''), result.get('error', '')) if part.strip()
+        )[:MESSAGE_CHARS]
+        status = result.get('status')
+        if status == 'ok':
+            return True, message
+        if status == 'runtime_error' and result.get('returncode') in REJECT_EXIT_CODES:
+            return False, message
+        message = message or f"exit status {result.get('returncode')}"
+        return False, f"Checker failed ({status or 'error'}): {message}"
+
+
+class CheckerRun:
+    """The streaming-checker side of a special judge for one test case.
+
+    It records the submission's output instead of judging it; the judge
+    calls judge() once the run is over and close() when done.
+    """
+
+    def __init__(self, special_judge, expected_output):
+        self.special_judge = special_judge
+        self.expected_output = expected_output
+        self.output_file = tempfile.TemporaryFile()
+
+    def feed(self, chunk):
+        self.output_file.write(chunk)
+        return True
+
+    def finish(self):
+        return True
+
+    def judge(self, executor, input_data, input_path=None):
+        """Run the checker program on the recorded output. Returns (accepted, message)"""
+        return self.special_judge.check(executor, input_data, self.expected_output, self.output_file,
+                                        input_path)
+
+    def close(self):
+        self.output_file.close()
@@ -0,0 +1,135 @@
+"""
+Content-addressed file storage for large test case data.
+
+Test inputs and expected outputs above TEST_DATA_FILE_THRESHOLD bytes are
+kept out of the database as files named by their SHA-256,
+
+    TEST_DATA_DIR/<first two hex digits>/<sha256>
+
+and the TestCase row only stores the digest (see TestCase.save). Identical
+data is stored once. The judge never loads such a file into Python: the
+program's stdin is opened straight from the input file, and the expected
+output is compared through a read-only mmap.
+
+A stored file can go missing (deleted by hand, or never copied to a new
+host). Displays then show MISSING_PREVIEW, and judging raises
+MissingTestData, so the submission fails with an error instead of a
+verdict.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+from django.conf import settings
+
+
+PREVIEW_CHARS = 2000  # shown where file-backed data is displayed
+MISSING_PREVIEW = '(test data file missing)'
+
+
+class MissingTestData(Exception):
+    """A test case's stored file is not in the store"""
+
+    def __init__(self, digest):
+        super().__init__(f'Test data file {digest} is missing from {store_dir()}')
+        self.digest = digest
+
+
+def store_dir():
+    directory = getattr(settings, 'TEST_DATA_DIR', None)
+    return str(directory or os.path.join(settings.BASE_DIR, 'test_data'))
+
+
+def file_threshold():
+    """Size in bytes above which test data is stored as a file, or None to keep everything in the database"""
+    return getattr(settings, 'TEST_DATA_FILE_THRESHOLD', None)
+
+
+def path(digest):
+    return os.path.join(store_dir(), digest[:2], digest)
+
+
+def existing_path(digest):
+    """path(digest), raising MissingTestData when there is no such file"""
+    file_path = path(digest)
+    if not os.path.isfile(file_path):
+        raise MissingTestData(digest)
+    return file_path
+
+
+def size(digest):
+    """Size of a stored file in bytes, or None when it is missing"""
+    try:
+        return os.path.getsize(path(digest))
+    except FileNotFoundError:
+        return None
+
+
+def store(data):
+    """Write data (str or bytes) to the store unless it is already there; returns its digest"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    target = path(digest)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write under a temporary name so no reader ever sees a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return digest
+
+
+def offload(text, digest):
+    """Decide where a test case field lives; returns the new (text, digest).
+
+    Text above the threshold moves to the store. Smaller text stays in the
+    database and replaces any stored file. Empty text keeps the stored
+    file, since forms show file-backed fields empty.
+    """
+    threshold = file_threshold()
+    if not text:
+        return text, digest
+    if threshold is not None and len(text.encode('utf-8')) > threshold:
+        return '', store(text)
+    return text, ''
+
+
+def _open(digest):
+    try:
+        return open(path(digest), 'rb')
+    except FileNotFoundError:
+        raise MissingTestData(digest) from None
+
+
+def open_mapped(digest):
+    """Read-only mmap of a stored file (b'' when empty); unmapped once no longer referenced"""
+    with _open(digest) as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_text(digest):
+    with _open(digest) as f:
+        return f.read().decode('utf-8', errors='replace')
+
+
+def preview(digest):
+    """The start of a stored file, for display (MISSING_PREVIEW when it is missing)"""
+    try:
+        f = _open(digest)
+    except MissingTestData:
+        return MISSING_PREVIEW
+    with f:
+        total = os.fstat(f.fileno()).st_size
+        head = f.read(PREVIEW_CHARS).decode('utf-8', errors='ignore')
+    if total <= PREVIEW_CHARS:
+        return head
+    return f'{head}\n... ({total} bytes in total)'
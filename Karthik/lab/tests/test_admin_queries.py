@@ -0,0 +1,65 @@
+"""
+The admin changelists run the same number of queries whatever the page
+size: related objects and counts shown in a column come with the page's
+rows instead of from a query per row.
+"""
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from lab.models import (
+    GhostCredential, JudgeJob, Problem, Rejudge, SolvedProblem, Submission, TestCase as ProblemTestCase, Topic,
+    UserProfile, VerdictCacheEntry,
+)
+
+from .test_query_budgets import QueryBudgetTestCase
+
+
+PAGE_SIZES = (5, 25)
+
+
+class AdminChangelistQueryTests(QueryBudgetTestCase):
+    models = [User, UserProfile, Problem, ProblemTestCase, Submission, SolvedProblem, JudgeJob, Rejudge,
+              VerdictCacheEntry, GhostCredential, Topic]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.filter(pk=cls.admin.pk).update(is_staff=True, is_superuser=True)
+        for i in range(max(PAGE_SIZES)):
+            user = User.objects.create(username=f'student{i}', email=f'student{i}@example.com')
+            problem = cls.problems[i % len(cls.problems)]
+            submission = Submission.objects.create(user=user, problem=problem, language='c', code='int main(){}',
+                                                   status='accepted')
+            SolvedProblem.objects.create(user=user, problem=problem, submission=submission, points=10)
+            JudgeJob.objects.create(submission=submission)
+            Rejudge.objects.create(problem=problem, requested_by=cls.admin, submission_ids=[submission.id], total=1)
+            VerdictCacheEntry.objects.create(problem=problem, language='c', code_hash=f'{i:064x}', test_revision=0,
+                                             status='accepted')
+            GhostCredential.objects.get_or_create(user=user, defaults={'username': user.username})
+            Topic.objects.create(name=f'Extra topic {i}')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model, page_size):
+        with mock.patch.object(admin.site._registry[model], 'list_per_page', page_size):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), page_size)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_changelist_queries_do_not_grow_with_page_size(self):
+        for model in self.models:
+            with self.subTest(model=model._meta.label):
+                small, large = (self.changelist_queries(model, size) for size in PAGE_SIZES)
+                self.assertEqual(
+                    len(small), len(large),
+                    f'{len(small)} queries for {PAGE_SIZES[0]} rows, {len(large)} for {PAGE_SIZES[1]}:\n'
+                    + '\n'.join(large),
+                )
@@ -0,0 +1,135 @@
+"""
+Output checkers give the same verdict however the output and the expected
+output are split into chunks: CRLF, whitespace and tokens may straddle a
+chunk boundary on either side.
+"""
+import mmap
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from lab import checkers
+from lab.checkers import ExactChecker, FloatChecker, LineChecker, TokenChecker
+
+
+CHUNK_SIZES = (1, 2, 3, 5, 64 * 1024)
+BLOCK_SIZES = (1, 2, 3, 7, 64 * 1024)
+
+
+def check(checker_class, expected, actual, chunk_size, **kwargs):
+    checker = checker_class(expected, **kwargs)
+    for offset in range(0, len(actual), chunk_size):
+        checker.feed(actual[offset:offset + chunk_size])
+    return checker.finish()
+
+
+class CheckerTestCase(SimpleTestCase):
+    checker_class = None
+
+    def assertVerdict(self, expected, actual, accepted, **kwargs):
+        """Same verdict for every way of splitting both sides into chunks"""
+        for block_size in BLOCK_SIZES:
+            with mock.patch.object(checkers, 'BLOCK_BYTES', block_size):
+                for chunk_size in CHUNK_SIZES:
+                    with self.subTest(expected=expected, actual=actual, chunk=chunk_size, block=block_size):
+                        self.assertEqual(check(self.checker_class, expected, actual, chunk_size, **kwargs),
+                                         accepted)
+
+
+class ExactCheckerTests(CheckerTestCase):
+    checker_class = ExactChecker
+
+    def test_crlf_split_across_chunks(self):
+        self.assertVerdict('1\n2\n3', b'1\r\n2\r\n3\r\n', True)
+        self.assertVerdict('1\r\n2', b'1\n2', True)
+        self.assertVerdict('1\n\n2', b'1\r\r\n2', True)
+        self.assertVerdict('1\n2', b'1\r\r\n2', False)
+
+    def test_surrounding_whitespace_is_ignored(self):
+        self.assertVerdict('  hello world\n', b'\n\nhello world \n\n', True)
+        self.assertVerdict('hello world', b'hello  world', False)
+
+    def test_trailing_blank_lines(self):
+        self.assertVerdict('1\n2\n\n\n', b'1\n2', True)
+        self.assertVerdict('1\n2', b'1\n2\n\n \n', True)
+
+    def test_missing_or_extra_output(self):
+        self.assertVerdict('1 2 3', b'1 2', False)
+        self.assertVerdict('1 2', b'1 2 3', False)
+        self.assertVerdict('', b'  \n', True)
+        self.assertVerdict('', b'0', False)
+
+
+class LineCheckerTests(CheckerTestCase):
+    checker_class = LineChecker
+
+    def test_crlf_split_across_chunks(self):
+        self.assertVerdict('a b\nc', b'a b\r\nc\r\n', True)
+        self.assertVerdict('a\n\nb', b'a\r\n\r\nb', True)
+
+    def test_whitespace_at_line_ends_split_across_chunks(self):
+        self.assertVerdict('a b\nc d', b'a b   \t\nc d  ', True)
+        self.assertVerdict('a b  \n c', b'a b\n c', True)
+        self.assertVerdict('a b\nc', b'a  b\nc', False)
+        self.assertVerdict('a\nb', b'a\n b', False)
+
+    def test_blank_lines(self):
+        self.assertVerdict('a\nb\n\n\n', b'a\nb', True)
+        self.assertVerdict('a\nb', b'a\nb\n \n\n', True)
+        self.assertVerdict('a\nb', b'\na\nb', False)
+        self.assertVerdict('a\n\nb', b'a\nb', False)
+
+    def test_tokens_split_across_chunks(self):
+        self.assertVerdict('12345 678', b'12345 678\n', True)
+        self.assertVerdict('12345 678', b'1234 5678\n', False)
+
+
+class TokenCheckerTests(CheckerTestCase):
+    checker_class = TokenChecker
+
+    def test_crlf_split_across_chunks(self):
+        self.assertVerdict('1 2\n3', b'1\r\n2\r\n3\r\n', True)
+
+    def test_whitespace_split_across_chunks(self):
+        self.assertVerdict('1 2 3', b' \t1   2\n\n3 \n', True)
+        self.assertVerdict('1 2 3', b'1 23', False)
+
+    def test_tokens_split_across_chunks(self):
+        self.assertVerdict('123456 789', b'123456\n789', True)
+        self.assertVerdict('123456 789', b'12345 6789', False)
+        self.assertVerdict('12 34', b'1234', False)
+
+    def test_trailing_blank_lines(self):
+        self.assertVerdict('1\n2\n\n\n', b'1 2', True)
+        self.assertVerdict('1 2', b'1 2\n\n\n', True)
+
+    def test_missing_or_extra_tokens(self):
+        self.assertVerdict('1 2 3', b'1 2', False)
+        self.assertVerdict('1 2', b'1 2 3', False)
+
+    def test_expected_output_from_a_mapped_file(self):
+        expected = b''.join(b'%d %d\r\n' % (i, i * i) for i in range(20000))
+        with tempfile.TemporaryFile() as f:
+            f.write(expected)
+            f.flush()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                actual = expected.replace(b'\r\n', b'\n ')
+                self.assertTrue(check(TokenChecker, mapped, actual, 4096))
+                self.assertFalse(check(TokenChecker, mapped, actual[:-3], 4096))
+            finally:
+                mapped.close()
+
+
+class FloatCheckerTests(CheckerTestCase):
+    checker_class = FloatChecker
+
+    def test_numbers_within_tolerance(self):
+        self.assertVerdict('0.333333 1000000', b'0.3333331\n1000000.5\n', True, tolerance=1e-6)
+        self.assertVerdict('0.333333', b'0.3334', False, tolerance=1e-6)
+
+    def test_tokens_split_across_chunks(self):
+        self.assertVerdict('1.5 2.25 abc', b'1.5\r\n2.25 abc\n\n', True)
+        self.assertVerdict('1.5 2.25', b'1.52.25', False)
+        self.assertVerdict('1.5 2.25', b'1.5 2.25 3', False)
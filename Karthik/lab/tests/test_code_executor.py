@@ -0,0 +1,301 @@
+"""
+Running programs: how a run ends up as a result, whatever goes wrong on
+the way, how the Python fork server runs a program just as a fresh
+interpreter would, what a run reports about the resources it used and
+how its processes are limited, and how output judged as it streams in
+stops a wrong program early.
+"""
+import os
+import shutil
+import socket
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, override_settings
+
+from lab import code_executor
+from lab.checkers import ExactChecker
+from lab.code_executor import OUTPUT_PREVIEW_BYTES, CodeExecutor, _run_result
+from lab.judge import resource_summary, run_test_cases
+from lab.models import TestCase as ProblemTestCase
+from lab.forkserver import ForkServerProcess
+
+
+class FailingForkServer:
+    def __init__(self, error):
+        self.error = error
+
+    def spawn(self, *args, **kwargs):
+        raise self.error
+
+
+class ExecutorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.executor = CodeExecutor()
+
+    def compile(self, language, code):
+        program = self.executor.compile(language, code)
+        self.addCleanup(program.cleanup)
+        self.assertTrue(program.success, program.error)
+        return program
+
+
+class ForkServerErrorTests(ExecutorTestCase):
+    def run_with_server(self, server):
+        program = self.compile('python', 'print(input())')
+        with mock.patch.object(code_executor, 'get_forkserver', return_value=server):
+            return self.executor.run(program, 'hello')
+
+    def test_unavailable_server_falls_back_to_a_fresh_interpreter(self):
+        result = self.run_with_server(FailingForkServer(ConnectionRefusedError('No server')))
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['output'], 'hello\n')
+
+    def test_other_server_errors_become_an_error_result(self):
+        for error in (ValueError('Malformed reply'), RuntimeError('Broken server')):
+            with self.subTest(error=error):
+                result = self.run_with_server(FailingForkServer(error))
+                self.assertFalse(result['success'])
+                self.assertEqual(result['error'], f'Execution error: {error}')
+
+    def test_malformed_exit_report_raises_value_error(self):
+        conn, server = socket.socketpair()
+        self.addCleanup(server.close)
+        server.sendall(b'{"returncode": 0}\n')
+        proc = ForkServerProcess(conn, 1234, None, None, None)
+        with self.assertRaisesMessage(ValueError, 'Malformed exit report'):
+            proc.wait()
+
+
+PARITY_PROGRAMS = {
+    'non-daemon thread': 'import threading, time\n'
+                         'def work():\n'
+                         '    time.sleep(0.2)\n'
+                         '    print("thread")\n'
+                         'threading.Thread(target=work).start()\n'
+                         'print("main")',
+    'atexit handler': 'import atexit\natexit.register(print, "bye")\nprint("hi")',
+    'loaded modules': 'import sys\nprint(sorted(sys.modules))\nimport json\nprint(json.dumps([1]), "json" in sys.modules)',
+    'stream buffering': 'import sys\nprint(type(sys.stdin.buffer).__name__, sys.stdout.line_buffering)',
+    'reading stdin': 'import sys\nprint(sum(int(line) for line in iter(sys.stdin.buffer.readline, b"")))',
+    'exit message': 'import sys\nprint("x")\nsys.exit("boom")',
+    'main module': 'import sys\nprint(__name__, __spec__, __file__ == sys.argv[0])',
+    'uncaught error': 'import atexit\natexit.register(print, "bye")\nraise ValueError("bad")',
+}
+
+
+class ForkServerParityTests(ExecutorTestCase):
+    """A program run by the fork server behaves as it does in a fresh interpreter"""
+
+    def run_both(self, code, input_data=''):
+        program = self.compile('python', code)
+        with override_settings(PYTHON_FORKSERVER_ENABLED=True):
+            forked = self.executor.run(program, input_data)
+        with override_settings(PYTHON_FORKSERVER_ENABLED=False):
+            fresh = self.executor.run(program, input_data)
+        return forked, fresh
+
+    def test_same_output_as_a_fresh_interpreter(self):
+        input_data = ''.join(f'{i}\n' for i in range(1000))
+        for name, code in PARITY_PROGRAMS.items():
+            with self.subTest(name):
+                forked, fresh = self.run_both(code, input_data)
+                self.assertEqual(forked['output'], fresh['output'])
+                self.assertEqual(forked['status'], fresh['status'])
+                self.assertEqual(forked.get('error', '').splitlines()[-1:], fresh.get('error', '').splitlines()[-1:])
+
+    def test_finishes_like_the_interpreter(self):
+        forked, _ = self.run_both(PARITY_PROGRAMS['non-daemon thread'])
+        self.assertEqual(forked['output'], 'main\nthread\n')
+        forked, _ = self.run_both(PARITY_PROGRAMS['uncaught error'])
+        self.assertEqual(forked['output'], 'bye\n')
+
+    def test_stdin_is_buffered(self):
+        forked, _ = self.run_both(PARITY_PROGRAMS['stream buffering'])
+        self.assertEqual(forked['output'], 'BufferedReader False\n')
+
+
+ALLOCATE_C = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+int main(void) {
+    char *p = malloc(256 << 20);
+    memset(p, 1, 256 << 20);
+    printf("%d\n", p[12345]);
+    return 0;
+}
+"""
+
+
+@override_settings(EXECUTION_LIMITS={'default': {'memory_mb': 64, 'address_space_mb': 1024}})
+class MemoryLimitTests(ExecutorTestCase):
+    """Memory Limit Exceeded comes from the memory a program used or failed to get, not from what it prints"""
+
+    def execute(self, language, code):
+        return self.executor.run(self.compile(language, code))
+
+    @skipUnless(shutil.which('gcc'), 'Needs gcc')
+    def test_c_allocation_over_the_limit(self):
+        result = self.execute('c', ALLOCATE_C)
+        self.assertEqual(result['status'], 'memory_limit')
+
+    @skipUnless(shutil.which('gcc'), 'Needs gcc')
+    def test_c_printing_out_of_memory_errors_is_a_runtime_error(self):
+        result = self.execute('c', '#include <stdio.h>\nint main(void) {'
+                                   ' fputs("MemoryError std::bad_alloc", stderr); return 1; }')
+        self.assertEqual(result['status'], 'runtime_error')
+
+    def test_python_allocation_over_the_limit(self):
+        result = self.execute('python', 'data = bytearray(256 << 20)\nprint(len(data))')
+        self.assertEqual(result['status'], 'memory_limit')
+
+    def test_python_printing_memory_error_is_a_runtime_error(self):
+        result = self.execute('python', 'import sys\nprint("MemoryError", file=sys.stderr)\nsys.exit(1)')
+        self.assertEqual(result['status'], 'runtime_error')
+
+    def test_python_within_the_limit(self):
+        result = self.execute('python', 'data = bytearray(8 << 20)\nprint(len(data))')
+        self.assertEqual(result['status'], 'ok')
+
+    def test_python_single_allocation_over_the_address_space(self):
+        result = self.execute('python', 'data = [0] * (400 << 20)\nprint(len(data))')
+        self.assertEqual(result['status'], 'memory_limit')
+
+    @skipUnless(shutil.which('g++'), 'Needs g++')
+    def test_cpp_single_allocation_over_the_address_space(self):
+        result = self.execute('cpp', '#include <iostream>\nint main() {'
+                                     ' char *p = new char[3ULL << 30]; std::cout << (p != nullptr); }')
+        self.assertEqual(result['status'], 'memory_limit')
+
+    def test_java_out_of_memory_error_before_the_heap_fills(self):
+        usage = {'cpu_time': 0.1, 'memory_kb': 40 * 1024}
+        stderr = b'Exception in thread "main" java.lang.OutOfMemoryError: Java heap space'
+        result = _run_result(1, b'', stderr, usage, {}, memory_limit_kb=64 * 1024)
+        self.assertEqual(result['status'], 'memory_limit')
+
+
+FORK_PYTHON = """
+import os, time
+children = []
+for _ in range({count}):
+    pid = os.fork()
+    if pid == 0:
+        time.sleep(2)
+        os._exit(0)
+    children.append(pid)
+for pid in children:
+    os.waitpid(pid, 0)
+print(len(children))
+"""
+
+
+@skipUnless(os.path.isdir('/proc') and hasattr(os, 'fork'), 'Needs /proc and fork')
+@override_settings(EXECUTION_LIMITS={'default': {'processes': 4}})
+class ProcessLimitTests(ExecutorTestCase):
+    """The process limit counts a run's own processes, not every process of the judge's account"""
+
+    def run_both(self, count):
+        program = self.compile('python', FORK_PYTHON.format(count=count))
+        with override_settings(PYTHON_FORKSERVER_ENABLED=True):
+            forked = self.executor.run(program)
+        with override_settings(PYTHON_FORKSERVER_ENABLED=False):
+            launched = self.executor.run(program)
+        return forked, launched
+
+    def test_within_the_limit(self):
+        for result in self.run_both(2):
+            self.assertEqual(result['status'], 'ok', result)
+            self.assertEqual(result['output'], '2\n')
+
+    @skipUnless(shutil.which('gcc'), 'Needs gcc for the launcher')
+    def test_too_many_processes_are_killed(self):
+        for result in self.run_both(10):
+            self.assertEqual(result['status'], 'runtime_error', result)
+            self.assertLess(result['wall_time'], 1.5)
+
+
+BUSY_C = r"""
+#include <stdio.h>
+int main(void) {
+    volatile unsigned long x = 0;
+    for (unsigned long i = 0; i < 400000000UL; i++) x += i;
+    printf("%lu\n", x > 0);
+    return 0;
+}
+"""
+
+
+class ResourceAccountingTests(ExecutorTestCase):
+    """Each run reports the CPU time, wall time and peak memory it used"""
+
+    def execute(self, language, code):
+        result = self.executor.run(self.compile(language, code))
+        self.assertEqual(result['status'], 'ok', result)
+        return result
+
+    def test_cpu_time_of_a_busy_program(self):
+        result = self.execute('python', 'n = 0\nfor i in range(3000000):\n    n += i\nprint(n)')
+        self.assertGreater(result['cpu_time'], 0.05)
+        self.assertGreaterEqual(result['wall_time'], result['cpu_time'] * 0.5)
+
+    def test_sleeping_program_uses_wall_time_not_cpu_time(self):
+        result = self.execute('python', 'import time\ntime.sleep(0.3)')
+        self.assertGreaterEqual(result['wall_time'], 0.3)
+        self.assertLess(result['cpu_time'], 0.2)
+
+    def test_peak_memory(self):
+        small = self.execute('python', 'print(1)')
+        large = self.execute('python', 'data = bytearray(64 << 20)\nprint(len(data))')
+        self.assertGreaterEqual(large['memory_kb'], 64 * 1024)
+        self.assertLess(small['memory_kb'], 64 * 1024)
+
+    @skipUnless(shutil.which('gcc'), 'Needs gcc')
+    def test_c_program(self):
+        result = self.execute('c', BUSY_C)
+        self.assertGreater(result['cpu_time'], 0.05)
+        self.assertIsNotNone(result['memory_kb'])
+
+    def test_summary_is_the_slowest_and_largest_run(self):
+        results = [
+            {'cpu_time': 0.2, 'memory_kb': 3000},
+            {'cpu_time': 0.5, 'memory_kb': 1000},
+            {'cpu_time': None, 'memory_kb': None},  # Skipped
+        ]
+        self.assertEqual(resource_summary(results), {'execution_time': 0.5, 'peak_memory_kb': 3000})
+        self.assertEqual(resource_summary([]), {'execution_time': None, 'peak_memory_kb': None})
+
+
+@override_settings(JUDGE_TEST_WORKERS=1)
+class StreamingCheckTests(ExecutorTestCase):
+    """With a checker, output is judged as it streams in"""
+
+    def run_checked(self, code, expected):
+        return self.executor.run(self.compile('python', code), checker=ExactChecker(expected))
+
+    def test_endless_wrong_output_is_stopped_at_the_first_wrong_byte(self):
+        result = self.run_checked('while True:\n    print(0)', '1')
+        self.assertEqual(result['status'], 'wrong_answer')
+        self.assertFalse(result['matched'])
+        self.assertLess(result['wall_time'], 2)
+
+    def test_long_correct_output_matches_and_keeps_a_preview(self):
+        expected = ''.join(f'{i}\n' for i in range(100000))
+        result = self.run_checked('for i in range(100000):\n    print(i)', expected)
+        self.assertEqual(result['status'], 'ok')
+        self.assertTrue(result['matched'])
+        self.assertTrue(result['output_truncated'])
+        self.assertEqual(len(result['output'].encode()), OUTPUT_PREVIEW_BYTES)
+        self.assertTrue(expected.startswith(result['output']))
+
+    def test_extra_or_missing_output_does_not_match(self):
+        self.assertFalse(self.run_checked('print(1)\nprint(2)', '1')['matched'])
+        self.assertFalse(self.run_checked('print(1)', '1\n2')['matched'])
+        self.assertTrue(self.run_checked('print(1)', '1')['matched'])
+
+    def test_judged_test_case_shows_the_truncated_output(self):
+        test_case = ProblemTestCase(input_data='', expected_output='\n'.join(['0'] * 100000))
+        outcome = run_test_cases(self.executor, 'python', 'for i in range(100000):\n    print(0 if i < 99999 else 1)',
+                                 [test_case])
+        result = outcome['results'][0]
+        self.assertEqual(result['verdict'], 'failed')
+        self.assertTrue(result['actual'].endswith('... (output truncated)'))
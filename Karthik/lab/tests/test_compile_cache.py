@@ -0,0 +1,78 @@
+"""
+The compile cache hands out copies of its artifacts: a program that
+rewrites its own files in the directory it runs in must not change the
+cached build that later identical submissions get.
+"""
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from lab.compile_cache import CompileCache
+
+
+KEY = 'ab' * 32
+
+
+class CompileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.cache = CompileCache(root=os.path.join(self.root, 'cache'), max_bytes=1024 * 1024)
+
+    def make_dir(self, name):
+        path = os.path.join(self.root, name)
+        os.mkdir(path)
+        return path
+
+    def write(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_fetch_misses_then_hits(self):
+        self.assertFalse(self.cache.fetch(KEY, self.make_dir('run1')))
+        build_dir = self.make_dir('build')
+        self.write(os.path.join(build_dir, 'Main.class'), b'original')
+        self.write(os.path.join(build_dir, 'Main.java'), b'source')
+        self.cache.store(KEY, build_dir, exclude=('Main.java',))
+
+        run_dir = self.make_dir('run2')
+        self.assertTrue(self.cache.fetch(KEY, run_dir))
+        self.assertEqual(os.listdir(run_dir), ['Main.class'])
+        self.assertEqual(self.read(os.path.join(run_dir, 'Main.class')), b'original')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_program_rewriting_its_build_does_not_change_the_cache(self):
+        build_dir = self.make_dir('build')
+        self.write(os.path.join(build_dir, 'Main.class'), b'original')
+        self.cache.store(KEY, build_dir)
+        # The first run happens in the build directory itself
+        self.write(os.path.join(build_dir, 'Main.class'), b'tampered')
+
+        run_dir = self.make_dir('run1')
+        self.assertTrue(self.cache.fetch(KEY, run_dir))
+        self.assertEqual(self.read(os.path.join(run_dir, 'Main.class')), b'original')
+        self.write(os.path.join(run_dir, 'Main.class'), b'tampered again')
+
+        run_dir = self.make_dir('run2')
+        self.assertTrue(self.cache.fetch(KEY, run_dir))
+        self.assertEqual(self.read(os.path.join(run_dir, 'Main.class')), b'original')
+
+    def test_cached_files_are_read_only_and_fetched_files_keep_their_mode(self):
+        build_dir = self.make_dir('build')
+        program = os.path.join(build_dir, 'program')
+        self.write(program, b'\x7fELF')
+        os.chmod(program, 0o755)
+        self.cache.store(KEY, build_dir)
+
+        entry = os.path.join(self.cache.root, KEY[:2], KEY, 'program')
+        self.assertEqual(os.stat(entry).st_mode & 0o777, 0o555)
+        run_dir = self.make_dir('run')
+        self.cache.fetch(KEY, run_dir)
+        self.assertEqual(os.stat(os.path.join(run_dir, 'program')).st_mode & 0o777, 0o755)
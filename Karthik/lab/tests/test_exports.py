@@ -0,0 +1,167 @@
+"""
+Exports stream every matching row, in order, as CSV or JSON lines: the
+filters pick the students, problems and dates exported, grades count only
+the solves within them, and spreadsheet formulas in CSV cells are defused.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from lab import exports
+from lab.models import Problem, SolvedProblem, Submission, UserProfile
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime(2024, 3, day, hour))
+
+
+class LinesTests(SimpleTestCase):
+    columns = [('name', 'name'), ('when', 'when'), ('points', 'points')]
+
+    def rows(self, count):
+        return ({'name': f'user{i}', 'when': at(1), 'points': i} for i in range(count))
+
+    def test_csv_header_and_rows(self):
+        text = ''.join(exports.lines(self.rows(2), self.columns, 'csv'))
+        self.assertEqual(list(csv.reader(io.StringIO(text))), [
+            ['name', 'when', 'points'],
+            ['user0', '2024-03-01T12:00:00+00:00', '0'],
+            ['user1', '2024-03-01T12:00:00+00:00', '1'],
+        ])
+
+    def test_jsonl_rows(self):
+        text = ''.join(exports.lines(self.rows(2), self.columns, 'jsonl'))
+        self.assertEqual([json.loads(line) for line in text.splitlines()], [
+            {'name': 'user0', 'when': '2024-03-01T12:00:00+00:00', 'points': 0},
+            {'name': 'user1', 'when': '2024-03-01T12:00:00+00:00', 'points': 1},
+        ])
+
+    def test_lines_are_sent_in_chunks(self):
+        with mock.patch.object(exports, 'LINES_PER_CHUNK', 3):
+            chunks = list(exports.lines(self.rows(7), self.columns, 'csv'))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [3, 3, 2])
+        with mock.patch.object(exports, 'LINES_PER_CHUNK', 3):
+            self.assertEqual([chunk.count('\n') for chunk in exports.lines(self.rows(0), self.columns, 'jsonl')], [])
+
+    def test_rows_are_read_lazily(self):
+        consumed = []
+
+        def rows():
+            for i in range(10):
+                consumed.append(i)
+                yield {'name': f'user{i}', 'when': None, 'points': i}
+
+        with mock.patch.object(exports, 'LINES_PER_CHUNK', 2):
+            chunks = exports.lines(rows(), self.columns, 'jsonl')
+            next(chunks)
+        self.assertEqual(consumed, [0, 1])
+
+    def test_csv_formulas_are_defused(self):
+        rows = [{'name': name, 'when': None, 'points': -1} for name in ('=1+1', '+cmd', '-2', '@sum', 'safe')]
+        text = ''.join(exports.lines(rows, self.columns, 'csv'))
+        names = [row[0] for row in list(csv.reader(io.StringIO(text)))[1:]]
+        self.assertEqual(names, ["'=1+1", "'+cmd", "'-2", "'@sum", 'safe'])
+        # Numbers are left alone
+        self.assertTrue(text.splitlines()[1].endswith(',-1'))
+
+
+class ExportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('teacher', password='x')
+        UserProfile.objects.filter(user=cls.admin).update(role='admin')
+        cls.alice = User.objects.create_user('alice', password='x', first_name='Alice')
+        cls.bob = User.objects.create_user('bob', password='x', first_name='=HYPERLINK("x")')
+        UserProfile.objects.filter(user=cls.alice).update(branch='CSE', year=2, score=30)
+        UserProfile.objects.filter(user=cls.bob).update(branch='ECE', year=3, score=10)
+        cls.add = Problem.objects.create(title='Add', description='Add two numbers', points=20)
+        cls.echo = Problem.objects.create(title='Echo', description='Print the input', points=10)
+        cls.submissions = []
+        for user, problem, day in ((cls.alice, cls.add, 1), (cls.bob, cls.echo, 2), (cls.alice, cls.echo, 3)):
+            submission = Submission.objects.create(user=user, problem=problem, language='python', code='print(1)',
+                                                   status='accepted')
+            Submission.objects.filter(pk=submission.pk).update(submitted_at=at(day))
+            SolvedProblem.objects.create(user=user, problem=problem, submission=submission, points=problem.points,
+                                         solved_at=at(day))
+            cls.submissions.append(submission)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, name, file_format='csv', **params):
+        response = self.client.get(reverse(f'lab:export_{name}', args=[file_format]), data=params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        text = b''.join(response.streaming_content).decode('utf-8')
+        if file_format == 'csv':
+            return list(csv.DictReader(io.StringIO(text)))
+        return [json.loads(line) for line in text.splitlines()]
+
+    def test_submissions_oldest_first(self):
+        rows = self.export('submissions')
+        self.assertEqual([int(row['id']) for row in rows], [submission.id for submission in self.submissions])
+        self.assertEqual(rows[0]['username'], 'alice')
+        self.assertEqual(rows[0]['problem'], 'Add')
+        self.assertEqual(rows[0]['submitted_at'], at(1).isoformat())
+        self.assertEqual(set(rows[0]), {name for name, _ in exports.SUBMISSION_COLUMNS})
+
+    def test_submission_filters(self):
+        def usernames_and_problems(**params):
+            return [(row['username'], row['problem']) for row in self.export('submissions', 'jsonl', **params)]
+
+        self.assertEqual(usernames_and_problems(branch='CSE'), [('alice', 'Add'), ('alice', 'Echo')])
+        self.assertEqual(usernames_and_problems(year=3), [('bob', 'Echo')])
+        self.assertEqual(usernames_and_problems(problem=self.echo.id), [('bob', 'Echo'), ('alice', 'Echo')])
+        # Both days are included
+        self.assertEqual(usernames_and_problems(since='2024-03-02', until='2024-03-03'),
+                         [('bob', 'Echo'), ('alice', 'Echo')])
+        self.assertEqual(usernames_and_problems(until='2024-03-01'), [('alice', 'Add')])
+
+    def test_grades(self):
+        rows = {row['username']: row for row in self.export('grades')}
+        self.assertEqual(set(rows), {'alice', 'bob'})
+        self.assertEqual((rows['alice']['score'], rows['alice']['solved'], rows['alice']['points']), ('30', '2', '30'))
+        self.assertEqual(rows['bob']['first_name'], '\'=HYPERLINK("x")')
+
+    def test_grades_within_the_filters(self):
+        rows = {row['username']: row for row in self.export('grades', 'jsonl', problem=self.add.id)}
+        self.assertEqual((rows['alice']['solved'], rows['alice']['points']), (1, 20))
+        self.assertEqual((rows['bob']['solved'], rows['bob']['points']), (0, 0))
+        rows = {row['username']: row for row in self.export('grades', 'jsonl', since='2024-03-02')}
+        self.assertEqual((rows['alice']['solved'], rows['alice']['points']), (1, 10))
+        rows = self.export('grades', 'jsonl', branch='ECE')
+        self.assertEqual([row['username'] for row in rows], ['bob'])
+
+    def test_download_headers(self):
+        response = self.client.get(reverse('lab:export_grades', args=['jsonl']))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="grades.jsonl"')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('lab:export_grades', args=['xlsx'])).status_code, 404)
+        for params in ({'branch': 'XYZ'}, {'year': 'two'}, {'since': '01/03/2024'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('lab:export_submissions', args=['csv']), data=params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_admin_actions_export_the_selected_students(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        selections = (('admin:auth_user_changelist', self.alice.pk),
+                      ('admin:lab_userprofile_changelist', self.alice.userprofile.pk))
+        for url, pk in selections:
+            with self.subTest(url=url):
+                response = self.client.post(reverse(url), {'action': 'export_grades_jsonl', '_selected_action': [pk]})
+                rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+                self.assertEqual([(row['username'], row['solved']) for row in rows], [('alice', 2)])
+
+    def test_students_cannot_export(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('lab:export_submissions', args=['csv'])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('lab:export_grades', args=['csv'])).status_code, 403)
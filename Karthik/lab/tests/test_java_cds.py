@@ -0,0 +1,64 @@
+"""
+Java class-data-sharing archives are built once per JDK, by one process,
+and used by every later javac and java launch. A JDK that can't build
+them leaves a marker and Java runs without them.
+"""
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, override_settings
+
+from lab import java_cds
+
+
+def fake_build(archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    for name in ('javac.jsa', 'java.jsa'):
+        open(os.path.join(archive_dir, name), 'w').close()
+    return True
+
+
+class JavaCdsTests(SimpleTestCase):
+    def setUp(self):
+        execution_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, execution_dir, ignore_errors=True)
+        settings = override_settings(EXECUTION_DIR=execution_dir, JAVA_CDS_ENABLED=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        archives = mock.patch.dict(java_cds._archives, clear=True)
+        archives.start()
+        self.addCleanup(archives.stop)
+
+    def test_archives_are_built_once_and_used(self):
+        with mock.patch.object(java_cds, '_build_archives', side_effect=fake_build) as build:
+            javac_archive, java_archive = java_cds.get_archives()
+            self.assertEqual(java_cds.get_archives(), (javac_archive, java_archive))
+            java_cds._archives.clear()  # Another process finds them on disk
+            self.assertEqual(java_cds.get_archives(), (javac_archive, java_archive))
+        self.assertEqual(build.call_count, 1)
+        self.assertIn(f'-XX:SharedArchiveFile={java_archive}', java_cds.java_launcher_args())
+        self.assertIn(f'-J-XX:SharedArchiveFile={javac_archive}', java_cds.javac_launcher_args())
+
+    def test_failed_build_leaves_a_marker_and_plain_launches(self):
+        with mock.patch.object(java_cds, '_build_archives', return_value=False) as build:
+            self.assertEqual(java_cds.get_archives(), (None, None))
+            java_cds._archives.clear()
+            self.assertEqual(java_cds.get_archives(), (None, None))
+        self.assertEqual(build.call_count, 1)
+        self.assertTrue(os.path.exists(java_cds._archive_dir() + '.failed'))
+        self.assertEqual(java_cds.java_launcher_args(), java_cds.JAVA_JVM_FLAGS)
+        self.assertEqual(java_cds.javac_launcher_args(), ['-J' + flag for flag in java_cds.JAVAC_JVM_FLAGS])
+
+    @override_settings(JAVA_CDS_ENABLED=False)
+    def test_disabled(self):
+        with mock.patch.object(java_cds, '_build_archives') as build:
+            self.assertEqual(java_cds.get_archives(), (None, None))
+        build.assert_not_called()
+
+    @skipUnless(shutil.which('javac') and shutil.which('java'), 'Needs a JDK')
+    def test_archives_from_the_installed_jdk(self):
+        javac_archive, java_archive = java_cds.get_archives()
+        self.assertTrue(os.path.isfile(javac_archive))
+        self.assertTrue(os.path.isfile(java_archive))
@@ -0,0 +1,174 @@
+"""
+Submissions are judged through the JudgeJob queue: the API queues them
+and answers at once, a worker claims each job exactly once and writes the
+verdict back, and jobs abandoned by a crashed worker are requeued or
+failed by the workers still running.
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from lab.judge import claim_next_job, enqueue_submission, process_job, requeue_stale_jobs
+from lab.models import JudgeJob, Problem, Submission, TestCase as ProblemTestCase
+
+
+CORRECT = 'print(sum(map(int, input().split())))'
+
+
+@override_settings(JUDGE_TEST_WORKERS=1)
+class JudgeQueueTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='x')
+        self.problem = Problem.objects.create(title='Add', description='Add two numbers')
+        ProblemTestCase.objects.create(problem=self.problem, input_data='1 2', expected_output='3', is_sample=True)
+        ProblemTestCase.objects.create(problem=self.problem, input_data='5 5', expected_output='10')
+
+    def queued(self, code=CORRECT):
+        submission = Submission.objects.create(user=self.user, problem_id=self.problem.id, language='python',
+                                               code=code, status='pending')
+        return submission, enqueue_submission(submission)
+
+
+class SubmitTests(JudgeQueueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def submit(self, code=CORRECT):
+        return self.client.post(reverse('lab:execute_code'), {
+            'language': 'python', 'code': code, 'problem_id': self.problem.id, 'mode': 'submit',
+        }, content_type='application/json')
+
+    def test_submit_queues_the_submission_and_answers_at_once(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        job = JudgeJob.objects.get()
+        self.assertEqual((job.status, job.submission_id), ('queued', response.json()['submission_id']))
+
+    def test_status_after_the_worker_judged_it(self):
+        submission_id = self.submit().json()['submission_id']
+        url = reverse('lab:submission_status', args=[submission_id])
+        self.assertEqual(self.client.get(url).json()['status'], 'pending')
+
+        process_job(claim_next_job('worker'))
+        data = self.client.get(url).json()
+        self.assertEqual((data['status'], data['test_cases_passed'], data['total_test_cases']), ('accepted', 2, 2))
+        self.assertEqual([result['verdict'] for result in data['test_results']], ['passed', 'passed'])
+
+    def test_status_of_another_users_submission_is_forbidden(self):
+        submission_id = self.submit().json()['submission_id']
+        self.client.force_login(User.objects.create_user('other', password='x'))
+        response = self.client.get(reverse('lab:submission_status', args=[submission_id]))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(JUDGE_ASYNC=False)
+    def test_synchronous_judging(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'accepted')
+        self.assertFalse(JudgeJob.objects.exists())
+
+    def test_cached_verdict_needs_no_job(self):
+        process_job(self.queued()[1])
+        response = self.submit()
+        self.assertEqual((response.status_code, response.json()['status']), (200, 'accepted'))
+        self.assertEqual(JudgeJob.objects.count(), 1)
+
+
+class WorkerTests(JudgeQueueTestCase):
+    def test_jobs_are_claimed_oldest_first_and_once(self):
+        first, first_job = self.queued()
+        second, second_job = self.queued()
+        claimed = claim_next_job('worker-1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker, claimed.attempts),
+                         (first_job.pk, 'running', 'worker-1', 1))
+        self.assertEqual(claim_next_job('worker-2').pk, second_job.pk)
+        self.assertIsNone(claim_next_job('worker-3'))
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'running')
+
+    def test_processed_job_records_the_verdict(self):
+        submission, job = self.queued('print(3)')
+        job = process_job(claim_next_job('worker'))
+        self.assertEqual((job.status, job.error), ('done', ''))
+        self.assertIsNotNone(job.finished_at)
+        submission.refresh_from_db()
+        self.assertEqual((submission.status, submission.test_cases_passed), ('partial', 1))
+
+    def test_judge_crash_fails_the_job(self):
+        submission, job = self.queued()
+        with mock.patch('lab.judge.judge_submission', side_effect=RuntimeError('Judge crashed')):
+            job = process_job(claim_next_job('worker'))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('RuntimeError: Judge crashed', job.error)
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'error')
+
+    def test_stale_jobs_are_requeued_until_they_run_out_of_attempts(self):
+        submission, job = self.queued()
+        retried, retried_job = self.queued()
+        long_ago = timezone.now() - timedelta(hours=1)
+        JudgeJob.objects.filter(pk=job.pk).update(status='running', started_at=long_ago, attempts=1)
+        JudgeJob.objects.filter(pk=retried_job.pk).update(status='running', started_at=long_ago, attempts=3)
+        Submission.objects.filter(pk__in=[submission.pk, retried.pk]).update(status='running')
+
+        self.assertEqual(requeue_stale_jobs(600, max_attempts=3), 1)
+        job.refresh_from_db()
+        submission.refresh_from_db()
+        self.assertEqual((job.status, job.worker, submission.status), ('queued', '', 'pending'))
+        retried_job.refresh_from_db()
+        retried.refresh_from_db()
+        self.assertEqual((retried_job.status, retried_job.error, retried.status),
+                         ('failed', 'Abandoned by worker', 'error'))
+
+    def test_running_jobs_within_the_timeout_are_left_alone(self):
+        submission, job = self.queued()
+        claim_next_job('worker')
+        self.assertEqual(requeue_stale_jobs(600), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_worker_command_empties_the_queue(self):
+        submissions = [self.queued()[0] for _ in range(2)]
+        out = StringIO()
+        call_command('judge_worker', '--once', '--no-rejudge', '--no-import', '--name', 'test-worker', stdout=out)
+        for submission in submissions:
+            submission.refresh_from_db()
+            self.assertEqual(submission.status, 'accepted')
+        self.assertEqual(set(JudgeJob.objects.values_list('status', 'worker')), {('done', 'test-worker')})
+        self.assertIn(f'Submission {submissions[0].id}: done', out.getvalue())
+
+    @override_settings(JUDGE_STALE_JOB_TIMEOUT=600, JUDGE_STALE_CHECK_INTERVAL=60)
+    def test_worker_requeues_jobs_abandoned_while_it_runs(self):
+        clock = [0]
+        abandoned = []
+
+        def sleep(seconds):
+            if not abandoned:
+                # Another worker claims a job and dies
+                submission, job = self.queued()
+                JudgeJob.objects.filter(pk=job.pk).update(status='running', worker='dead-worker', attempts=1,
+                                                          started_at=timezone.now() - timedelta(hours=1))
+                Submission.objects.filter(pk=submission.pk).update(status='running')
+                abandoned.append(submission)
+            clock[0] += seconds
+            if clock[0] > 600 or JudgeJob.objects.filter(status='done').exists():
+                raise KeyboardInterrupt
+
+        fake_time = mock.Mock(monotonic=lambda: clock[0], sleep=sleep)
+        out = StringIO()
+        with mock.patch('lab.management.commands.judge_worker.time', fake_time):
+            call_command('judge_worker', '--poll-interval', '30', '--no-rejudge', '--no-import',
+                         '--name', 'test-worker', stdout=out)
+        self.assertIn('Requeued 1 stale job(s)', out.getvalue())
+        self.assertEqual(JudgeJob.objects.get().worker, 'test-worker')
+        abandoned[0].refresh_from_db()
+        self.assertEqual(abandoned[0].status, 'accepted')
+        self.assertLessEqual(clock[0], 90)
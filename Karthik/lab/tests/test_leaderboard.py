@@ -0,0 +1,123 @@
+"""
+The leaderboard ranks active students by score, ties sharing a rank, and
+pages through them with a cursor that neither skips nor repeats anyone.
+Cached pages are dropped as soon as a score or a profile changes.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from lab import leaderboard
+from lab.models import Problem, Submission, UserProfile
+from lab.scoring import record_solve
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # (username, branch, year, score)
+        students = [
+            ('asha', 'CSE', 2, 30),
+            ('bala', 'ECE', 2, 50),
+            ('chen', 'CSE', 3, 30),
+            ('devi', 'CSE', 2, 10),
+            ('eshan', 'ECE', 3, 30),
+            ('farah', 'CSE', 2, 0),
+        ]
+        for username, branch, year, score in students:
+            user = User.objects.create_user(username, password='x', first_name=username.title())
+            UserProfile.objects.filter(user=user).update(branch=branch, year=year, score=score)
+        teacher = User.objects.create_user('teacher', password='x')
+        UserProfile.objects.filter(user=teacher).update(role='admin', score=100)
+        gone = User.objects.create_user('gone', password='x', is_active=False)
+        UserProfile.objects.filter(user=gone).update(score=100)
+        cls.student = User.objects.get(username='asha')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def get(self, **params):
+        response = self.client.get(reverse('lab:leaderboard'), data=params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ranking(self, page):
+        return [(row['username'], row['rank']) for row in page['results']]
+
+    def test_students_ranked_by_score_with_shared_ranks(self):
+        page = self.get()
+        # Tied students keep signup order; admins and inactive users aren't ranked
+        self.assertEqual(self.ranking(page), [
+            ('bala', 1), ('asha', 2), ('chen', 2), ('eshan', 2), ('devi', 5), ('farah', 6),
+        ])
+        self.assertIsNone(page['next_cursor'])
+        self.assertEqual(page['results'][0]['name'], 'Bala')
+
+    def test_filters(self):
+        self.assertEqual(self.ranking(self.get(branch='CSE')), [('asha', 1), ('chen', 1), ('devi', 3), ('farah', 4)])
+        self.assertEqual(self.ranking(self.get(branch='CSE', year=2)), [('asha', 1), ('devi', 2), ('farah', 3)])
+        self.assertEqual(self.ranking(self.get(year=3)), [('chen', 1), ('eshan', 1)])
+        self.assertEqual(self.get(branch='ECE', year=3)['filters'], {'branch': 'ECE', 'year': 3, 'semester': None})
+
+    def test_invalid_parameters(self):
+        for params in ({'branch': 'XYZ'}, {'year': 'two'}, {'limit': 'all'}, {'cursor': 'not-a-cursor'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('lab:leaderboard'), data=params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_pages_continue_the_ranking(self):
+        rows = []
+        cursor = None
+        while True:
+            page = self.get(limit=2, **({'cursor': cursor} if cursor else {}))
+            self.assertLessEqual(len(page['results']), 2)
+            rows.extend(page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        # Ranks across a page boundary count the tied students on earlier pages
+        self.assertEqual([(row['username'], row['rank']) for row in rows], self.ranking(self.get()))
+
+    def test_solved_problem_counts(self):
+        problem = Problem.objects.create(title='Add', description='Add two numbers', points=5)
+        user = User.objects.get(username='devi')
+        record_solve(Submission.objects.create(user=user, problem=problem, language='python',
+                                               code='print(3)', status='accepted'))
+        rows = {row['username']: row for row in self.get()['results']}
+        self.assertEqual((rows['devi']['solved'], rows['devi']['score']), (1, 15))
+        self.assertEqual(rows['asha']['solved'], 0)
+
+    def test_pages_are_cached_until_invalidated(self):
+        self.get()
+        # A bulk update doesn't send signals, so the cached page is still served
+        UserProfile.objects.filter(user__username='farah').update(score=99)
+        self.assertEqual(self.get()['results'][0]['username'], 'bala')
+        leaderboard.invalidate()
+        self.assertEqual(self.get()['results'][0]['username'], 'farah')
+
+    def test_score_and_profile_changes_invalidate_the_cache(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            problem = Problem.objects.create(title='Add', description='Add two numbers', points=100)
+            user = User.objects.get(username='farah')
+            record_solve(Submission.objects.create(user=user, problem=problem, language='python',
+                                                   code='print(3)', status='accepted'))
+        self.assertEqual(self.get()['results'][0]['username'], 'farah')
+
+        profile = UserProfile.objects.get(user__username='farah')
+        profile.branch = 'ECE'
+        profile.save()
+        self.assertEqual(self.ranking(self.get(branch='ECE'))[0], ('farah', 1))
+
+        profile.user.is_active = False
+        profile.user.save()
+        self.assertNotIn('farah', [row['username'] for row in self.get()['results']])
+
+    def test_lost_version_does_not_bring_back_old_pages(self):
+        self.get()
+        cache.delete(leaderboard.VERSION_KEY)
+        UserProfile.objects.filter(user__username='farah').update(score=99)
+        self.assertEqual(self.get()['results'][0]['username'], 'farah')
@@ -0,0 +1,110 @@
+"""
+A submission is compiled once and its test cases run on a pool of
+JUDGE_TEST_WORKERS threads: never more at once than that, all of them
+when there are enough cases, with results in test case order whichever
+run finishes first.
+"""
+import os
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from lab.code_executor import CodeExecutor
+from lab.judge import parallel_test_workers, run_test_cases
+from lab.models import TestCase as ProblemTestCase
+
+
+class FakeProgram:
+    success = True
+    error = ''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeExecutor:
+    """Answers each input with answer(input), taking delay(input) seconds, and records the runs"""
+
+    def __init__(self, answer=lambda input_data: input_data, delay=lambda input_data: 0):
+        self.answer = answer
+        self.delay = delay
+        self.compiles = 0
+        self.ran = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def compile(self, language, code, owner=None):
+        self.compiles += 1
+        return FakeProgram()
+
+    def run(self, program, input_data='', checker=None, input_file=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay(input_data))
+            output = self.answer(input_data)
+            checker.feed(output.encode())
+            with self.lock:
+                self.ran.append(input_data)
+            return {'success': True, 'status': 'ok', 'output': output, 'matched': checker.finish(),
+                    'cpu_time': 0.01, 'wall_time': 0.01, 'memory_kb': 1024}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def make_test_cases(count, samples=0, expected=lambda i: str(i)):
+    return [ProblemTestCase(input_data=str(i), expected_output=expected(i), is_sample=i < samples, order=i)
+            for i in range(count)]
+
+
+class ParallelRunTests(SimpleTestCase):
+    @override_settings(JUDGE_TEST_WORKERS=4)
+    def test_results_come_back_in_test_case_order(self):
+        # Later cases finish first
+        executor = FakeExecutor(delay=lambda input_data: (8 - int(input_data)) * 0.005)
+        test_cases = make_test_cases(8)
+        outcome = run_test_cases(executor, 'python', '', test_cases)
+        self.assertEqual([result['test_case'] for result in outcome['results']], test_cases)
+        self.assertEqual((outcome['passed'], outcome['total']), (8, 8))
+        self.assertEqual(executor.compiles, 1)
+
+    @override_settings(JUDGE_TEST_WORKERS=3)
+    def test_runs_use_every_worker_and_no_more(self):
+        executor = FakeExecutor(delay=lambda input_data: 0.05)
+        run_test_cases(executor, 'python', '', make_test_cases(9))
+        self.assertEqual(executor.peak, 3)
+        self.assertEqual(sorted(executor.ran, key=int), [str(i) for i in range(9)])
+
+    @override_settings(JUDGE_TEST_WORKERS=1)
+    def test_one_worker_runs_in_order(self):
+        executor = FakeExecutor()
+        run_test_cases(executor, 'python', '', make_test_cases(5))
+        self.assertEqual(executor.ran, ['0', '1', '2', '3', '4'])
+        self.assertEqual(executor.peak, 1)
+
+    @override_settings(JUDGE_TEST_WORKERS=None)
+    def test_workers_default_to_the_cpu_count(self):
+        self.assertEqual(parallel_test_workers(), os.cpu_count() or 1)
+
+    def test_compile_error_is_reported_once(self):
+        executor = CodeExecutor()
+        outcome = run_test_cases(executor, 'cobol', '', make_test_cases(3))
+        self.assertEqual(outcome['compile_error'], 'Unsupported language: cobol')
+        self.assertEqual((outcome['results'], outcome['passed'], outcome['total']), ([], 0, 3))
+
+
+@override_settings(JUDGE_TEST_WORKERS=4)
+class ParallelProgramTests(SimpleTestCase):
+    def test_real_program_on_parallel_test_cases(self):
+        test_cases = [ProblemTestCase(input_data=f'{i} {i}', expected_output=str(2 * i), order=i) for i in range(8)]
+        test_cases[5].expected_output = '0'
+        outcome = run_test_cases(CodeExecutor(), 'python', 'print(sum(map(int, input().split())))', test_cases)
+        self.assertEqual([result['passed'] for result in outcome['results']], [True] * 5 + [False] + [True] * 2)
+        self.assertEqual(outcome['results'][5]['actual'], '10')
@@ -0,0 +1,180 @@
+"""
+Problem imports from a CSV or a zip of a CSV and test data files: rows
+sharing a key make one problem, and a bad row (missing fields, bytes that
+are not UTF-8, a malformed record) or a chunk the database refuses is
+reported without stopping the rest of the import.
+"""
+import csv
+import io
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from lab import test_data
+from lab.models import Problem, TestCase as ProblemTestCase, Topic
+from lab.problem_import import ProblemImporter, import_csv, import_zip, open_text
+
+
+HEADER = 'key,title,description,difficulty,points,topic,test_input,test_output,is_sample\n'
+
+
+def csv_file(*rows, header=HEADER):
+    return io.BytesIO((header + ''.join(row + '\n' for row in rows)).encode('utf-8'))
+
+
+def zip_file(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    data.seek(0)
+    return data
+
+
+def test_cases(key):
+    problem = Problem.objects.get(title=key)
+    return [(test_case.input_data, test_case.expected_output, test_case.is_sample)
+            for test_case in problem.test_cases.order_by('order')]
+
+
+class CsvImportTests(TestCase):
+    def test_rows_with_one_key_make_one_problem(self):
+        importer = import_csv(csv_file(
+            'add,add,Add two numbers,medium,20,Basics,1 2,3,true',
+            'add,,,,,,5 5,10,false',
+            ',sub,Subtract,hard,x,Basics,3 1,2,',
+        ))
+        self.assertEqual((importer.problem_count, importer.test_case_count, importer.errors), (2, 3, []))
+        add = Problem.objects.get(title='add')
+        self.assertEqual((add.difficulty, add.points, add.topic.name), ('medium', 20, 'Basics'))
+        self.assertEqual(Problem.objects.get(title='sub').points, 10)
+        self.assertEqual(Topic.objects.count(), 1)
+        self.assertEqual(test_cases('add'), [('1 2', '3', True), ('5 5', '10', False)])
+
+    def test_rows_of_a_problem_without_a_description_are_reported(self):
+        importer = import_csv(csv_file(
+            'a,a,,easy,10,,1,1,',
+            'a,,,,,,2,2,',
+            'b,b,Fine,easy,10,,1,1,',
+        ))
+        self.assertEqual(importer.errors, ['Row 2: Missing title or description', "Row 3: Problem 'a' was not imported"])
+        self.assertEqual(list(Problem.objects.values_list('title', flat=True)), ['b'])
+
+    def test_rows_that_are_not_utf8_are_reported(self):
+        upload = io.BytesIO(HEADER.encode() + b'a,a,Caf\xe9,easy,10,,1,1,\n' + 'b,b,Café,easy,10,,1,1,\n'.encode())
+        importer = import_csv(upload)
+        self.assertEqual(importer.errors, ['Row 2: Not UTF-8 text'])
+        self.assertEqual(Problem.objects.get().description, 'Café')
+
+    def test_header_that_is_not_utf8(self):
+        importer = import_csv(io.BytesIO(b'titl\xe9,description\na,b\n'))
+        self.assertEqual(importer.errors, ['Row 1: the header is not UTF-8 text'])
+        self.assertFalse(Problem.objects.exists())
+
+    def test_malformed_records_are_reported(self):
+        limit = csv.field_size_limit()
+        self.addCleanup(csv.field_size_limit, limit)
+        csv.field_size_limit(100)
+        importer = import_csv(csv_file(
+            'a,a,' + 'x' * 200 + ',easy,10,,1,1,',
+            'b,b,Fine,easy,10,,1,1,',
+        ))
+        self.assertEqual(len(importer.errors), 1)
+        self.assertTrue(importer.errors[0].startswith('Row 2: field larger than field limit'))
+        self.assertEqual(list(Problem.objects.values_list('title', flat=True)), ['b'])
+
+    def test_chunk_refused_by_the_database_is_reported(self):
+        bulk_create = ProblemTestCase.objects.bulk_create
+        calls = []
+
+        def refuse_second_chunk(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise IntegrityError('NOT NULL constraint failed')
+            return bulk_create(objs, *args, **kwargs)
+
+        importer = ProblemImporter(chunk_size=2)
+        rows = [f'p{i},p{i},Problem {i},easy,10,,{i},{i},' for i in range(6)] + ['p2,,,,,,x,y,']
+        with mock.patch.object(ProblemTestCase.objects, 'bulk_create', side_effect=refuse_second_chunk):
+            importer.read_csv(open_text(csv_file(*rows)))
+            importer.finish()
+
+        self.assertEqual(importer.errors, [
+            # Row 3's test case went in the same chunk as problem p2
+            'Rows 3-4 not imported, the database refused them: NOT NULL constraint failed',
+            "Row 8: Problem 'p2' was not imported",
+        ])
+        self.assertEqual((importer.problem_count, importer.test_case_count), (5, 4))
+        self.assertEqual(sorted(Problem.objects.values_list('title', flat=True)), ['p0', 'p1', 'p3', 'p4', 'p5'])
+        self.assertEqual(ProblemTestCase.objects.filter(problem__title='p1').count(), 0)
+
+    def test_large_test_data_goes_to_the_store(self):
+        store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store, ignore_errors=True)
+        with override_settings(TEST_DATA_DIR=store, TEST_DATA_FILE_THRESHOLD=16):
+            import_csv(csv_file('a,a,Big,easy,10,,' + '7' * 100 + ',1,'))
+            test_case = ProblemTestCase.objects.get()
+            self.assertEqual(test_case.input_data, '')
+            self.assertEqual(test_data.read_text(test_case.input_file), '7' * 100)
+
+
+class ZipImportTests(TestCase):
+    def test_test_files_follow_the_csv_samples_first(self):
+        importer = import_zip(zip_file({
+            'problems.csv': HEADER + 'add,add,Add,easy,10,,0 0,0,true\n',
+            'add/02.in': '3 4\n', 'add/02.out': '7\n',
+            'add/01.in': '1 2\n', 'add/01.out': '3\n',
+            'add/samples/01.in': '5 5\n', 'add/samples/01.out': '10\n',
+        }))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(test_cases('add'), [
+            ('0 0', '0', True), ('5 5\n', '10\n', True), ('1 2\n', '3\n', False), ('3 4\n', '7\n', False),
+        ])
+
+    def test_bad_test_files_are_reported(self):
+        importer = import_zip(zip_file({
+            'problems.csv': HEADER + 'add,add,Add,easy,10,,,,\n',
+            'add/01.in': '1 2\n',
+            'add/02.in': b'\xff\n', 'add/02.out': '1\n',
+            'add/03.in': '1 1\n', 'add/03.out': '2\n',
+            'other/01.in': '1\n', 'other/01.out': '1\n',
+        }))
+        self.assertEqual(importer.errors, [
+            'add/01.in: no matching .out file',
+            'add/02.in: test data is not UTF-8 text',
+            "other/01.in: no problem with key 'other'",
+        ])
+        self.assertEqual(test_cases('add'), [('1 1\n', '2\n', False)])
+
+    def test_bad_rows_in_the_zipped_csv_are_reported(self):
+        importer = import_zip(zip_file({
+            'problems.csv': HEADER.encode() + b'a,a,\xff,easy,10,,,,\nb,b,Fine,easy,10,,,,\n',
+        }))
+        self.assertEqual(importer.errors, ['Row 2: Not UTF-8 text'])
+        self.assertEqual(importer.problem_count, 1)
+
+    def test_zip_needs_one_csv(self):
+        with self.assertRaisesMessage(ValueError, 'exactly one .csv file'):
+            import_zip(zip_file({'a/01.in': '1'}))
+
+
+class ImportViewTests(TestCase):
+    def test_bad_rows_are_shown_after_the_import(self):
+        admin = User.objects.create_superuser('teacher', password='x')
+        self.client.force_login(admin)
+        upload = csv_file('a,a,Fine,easy,10,,1,1,', 'b,b,,easy,10,,1,1,')
+        upload.name = 'problems.csv'
+        response = self.client.post(reverse('admin:lab_problem_import_csv'), {'csv_file': upload})
+        self.assertRedirects(response, reverse('admin:lab_problem_changelist'))
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)], [
+            'Successfully imported 1 problem(s) with 1 test case(s).',
+            'Row 3: Missing title or description',
+        ])
+        self.assertEqual(Problem.objects.get().created_by, admin)
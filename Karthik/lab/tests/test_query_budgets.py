@@ -0,0 +1,167 @@
+"""
+Query budgets for the hot views.
+
+Each view must stay within a fixed number of queries whatever the amount
+of data, and on SQLite every query it runs against the big tables must be
+served by an index (checked with EXPLAIN QUERY PLAN), so a dropped index
+or a new per-row query fails the build.
+"""
+import re
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from lab.models import Problem, Submission, TestCase as ProblemTestCase, Topic, UserProfile
+
+
+# Tables that grow with the number of students and submissions
+LARGE_TABLES = ('lab_submission', 'lab_testcase', 'lab_userprofile', 'lab_solvedproblem', 'lab_verdictcacheentry')
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+class QueryBudgetTestCase(TestCase):
+    problem_count = 30
+    submissions_per_problem = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.other = User.objects.create_user('other', password='x')
+        cls.admin = User.objects.create_user('teacher', password='x')
+        UserProfile.objects.filter(user=cls.admin).update(role='admin')
+        topics = [Topic.objects.create(name=f'Topic {i}') for i in range(3)]
+        cls.problems = []
+        for i in range(cls.problem_count):
+            problem = Problem.objects.create(title=f'Problem {i}', description='Add two numbers',
+                                             topic=topics[i % len(topics)])
+            for order in range(5):
+                ProblemTestCase.objects.create(problem=problem, input_data='1 2', expected_output='3',
+                                               is_sample=order < 2, order=order)
+            for user in (cls.student, cls.other):
+                for _ in range(cls.submissions_per_problem):
+                    Submission.objects.create(user=user, problem=problem, language='python',
+                                              code='print(sum(map(int, input().split())))', status='accepted')
+            cls.problems.append(problem)
+        cls.problem = cls.problems[0]
+        cls.submission = Submission.objects.filter(user=cls.student).first()
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def request(self, max_queries, method, url, **kwargs):
+        """Make a request within a query budget; returns the response and the queries it ran"""
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{url} ran {len(queries)} queries, budget is {max_queries}:\n' + '\n'.join(queries),
+        )
+        return response, queries
+
+    def assertIndexed(self, queries):
+        """Fail if a query scans a large table or sorts its rows instead of reading them in index order"""
+        if connection.vendor != 'sqlite':
+            return
+        for sql in queries:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            tables = [table for table in LARGE_TABLES if re.search(rf'\b{table}\b', sql)]
+            if not tables:
+                continue
+            for line in plan:
+                match = FULL_SCAN.match(line)
+                self.assertFalse(match and match.group(1) in LARGE_TABLES,
+                                 f'Full table scan:\n{sql}\n' + '\n'.join(plan))
+            if 'ORDER BY' in sql and tables == ['lab_submission']:
+                self.assertFalse(any('TEMP B-TREE FOR ORDER BY' in line for line in plan),
+                                 f'Sorted instead of read in index order:\n{sql}\n' + '\n'.join(plan))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks are written for SQLite')
+class HotViewQueryTests(QueryBudgetTestCase):
+
+    def test_problems_list(self):
+        response, queries = self.request(5, 'get', reverse('lab:problems_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Problem 29')
+        self.assertIndexed(queries)
+
+    def test_problem_detail(self):
+        response, queries = self.request(6, 'get', reverse('lab:problem_detail', args=[self.problem.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['sample_test_cases']), 2)
+        self.assertIndexed(queries)
+
+    @override_settings(JUDGE_ASYNC=True)
+    def test_execute_code_submit(self):
+        response, queries = self.request(7, 'post', reverse('lab:execute_code'), data={
+            'language': 'python', 'code': 'print(3)', 'problem_id': self.problem.id, 'mode': 'submit',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['total_test_cases'], 5)
+        self.assertIndexed(queries)
+
+    def test_get_submissions(self):
+        response, queries = self.request(4, 'get', reverse('lab:submissions'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 50)
+        self.assertIsNotNone(response.json()['next_cursor'])
+        self.assertIndexed(queries)
+
+    def test_get_submissions_admin(self):
+        self.client.force_login(self.admin)
+        response, queries = self.request(4, 'get', reverse('lab:submissions'), data={'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 100)
+        self.assertIndexed(queries)
+
+    def test_get_submissions_filtered(self):
+        self.client.force_login(self.admin)
+        for data in ({'problem': self.problem.id}, {'user': 'other'}, {'status': 'accepted', 'language': 'python'}):
+            response, queries = self.request(4, 'get', reverse('lab:submissions'), data=data)
+            self.assertEqual(response.status_code, 200)
+            self.assertIndexed(queries)
+        response = self.client.get(reverse('lab:submissions'), data={'problem': self.problem.id, 'user': 'other'})
+        self.assertEqual(len(response.json()['results']), self.submissions_per_problem)
+
+    def test_get_submissions_pages(self):
+        seen = []
+        cursor = None
+        while True:
+            data = {'limit': 20, 'cursor': cursor} if cursor else {'limit': 20}
+            response, queries = self.request(4, 'get', reverse('lab:submissions'), data=data)
+            self.assertIndexed(queries)
+            page = response.json()
+            seen.extend(row['id'] for row in page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        expected = Submission.objects.filter(user=self.student).order_by('-submitted_at', 'id')
+        self.assertEqual(seen, list(expected.values_list('id', flat=True)))
+
+    def test_get_submissions_students_see_their_own(self):
+        response = self.client.get(reverse('lab:submissions'), data={'user': 'other', 'limit': 200})
+        self.assertEqual({row['user'] for row in response.json()['results']}, {'student'})
+        response = self.client.get(reverse('lab:submissions'), data={'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_submission_detail(self):
+        response, queries = self.request(5, 'get', reverse('lab:submission_detail', args=[self.submission.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.submission.id)
+        self.assertIndexed(queries)
+
+    def test_verify_email(self):
+        UserProfile.objects.filter(user=self.other).update(verification_token='token-123')
+        self.client.logout()
+        response, queries = self.request(11, 'get', reverse('lab:verify_email', args=['token-123']))
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexed(queries)
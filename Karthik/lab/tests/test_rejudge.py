@@ -0,0 +1,202 @@
+"""
+Rejudges judge existing submissions again without awarding points as
+verdicts are stored, then settle the solves of every (user, problem) pair
+involved: a pair that gained its first accepted submission is solved, one
+that lost all of them loses its solve and the points. With JUDGE_ASYNC
+off, rejudges started from the admin run at once instead of waiting for a
+worker.
+"""
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from lab import rejudge as rejudge_module
+from lab.judge import judge_submission
+from lab.models import Problem, Rejudge, SolvedProblem, Submission, TestCase as ProblemTestCase, UserProfile
+from lab.rejudge import (
+    claim_next_rejudge, queue_rejudge, run_rejudge, select_submissions, settle_scores, start_rejudge,
+)
+
+
+CORRECT = 'print(sum(map(int, input().split())))'
+OFF_BY_ONE = 'print(sum(map(int, input().split())) + 1)'
+
+
+def score(user):
+    return UserProfile.objects.get(user=user).score
+
+
+class RejudgeFixtureMixin:
+    def create_fixture(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.problem = Problem.objects.create(title='Add', description='Add two numbers', points=10)
+        self.test_case = ProblemTestCase.objects.create(problem=self.problem, input_data='1 2', expected_output='3')
+
+    def submit(self, user, code, status='pending'):
+        return Submission.objects.create(user=user, problem=self.problem, language='python', code=code,
+                                         status=status)
+
+    def judged(self, user, code):
+        submission = self.submit(user, code)
+        judge_submission(submission)
+        return submission
+
+
+class SettleScoresTests(RejudgeFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixture()
+
+    def test_pair_that_gained_an_accepted_submission_is_solved_by_the_earliest(self):
+        first = self.submit(self.alice, CORRECT, status='accepted')
+        self.submit(self.alice, CORRECT, status='accepted')
+        self.assertEqual(settle_scores({(self.alice.id, self.problem.id)}), 1)
+        self.assertEqual(SolvedProblem.objects.get(user=self.alice).submission, first)
+        self.assertEqual(score(self.alice), 10)
+
+    def test_pair_that_lost_every_accepted_submission_loses_the_solve(self):
+        submission = self.judged(self.alice, CORRECT)
+        Submission.objects.filter(pk=submission.pk).update(status='failed')
+        self.assertEqual(settle_scores({(self.alice.id, self.problem.id)}), 1)
+        self.assertFalse(SolvedProblem.objects.exists())
+        self.assertEqual(score(self.alice), 0)
+
+    def test_pairs_already_in_line_are_left_alone(self):
+        self.judged(self.alice, CORRECT)
+        self.judged(self.bob, OFF_BY_ONE)
+        pairs = {(self.alice.id, self.problem.id), (self.bob.id, self.problem.id)}
+        self.assertEqual(settle_scores(pairs), 0)
+        self.assertEqual((score(self.alice), score(self.bob)), (10, 0))
+
+    def test_other_pairs_of_the_same_users_are_not_touched(self):
+        other = Problem.objects.create(title='Other', description='Other', points=5)
+        Submission.objects.create(user=self.alice, problem=other, language='python', code=CORRECT,
+                                  status='accepted')
+        self.submit(self.alice, CORRECT, status='accepted')
+        settle_scores({(self.alice.id, self.problem.id)})
+        self.assertEqual(list(SolvedProblem.objects.values_list('problem_id', flat=True)), [self.problem.id])
+
+
+class QueueTests(RejudgeFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixture()
+
+    def test_select_skips_submissions_still_queued_and_practice_runs(self):
+        judged = self.submit(self.alice, CORRECT, status='accepted')
+        self.submit(self.alice, CORRECT, status='pending')
+        self.submit(self.bob, CORRECT, status='running')
+        Submission.objects.create(user=self.bob, language='python', code=CORRECT, status='success')
+        self.assertEqual(select_submissions(problem=self.problem), [judged.id])
+
+    def test_a_queued_rejudge_is_claimed_once(self):
+        rejudge = queue_rejudge([1, 2], problem=self.problem)
+        self.assertEqual(rejudge.total, 2)
+        claimed = claim_next_rejudge('worker-1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker), (rejudge.pk, 'running', 'worker-1'))
+        self.assertIsNone(claim_next_rejudge('worker-2'))
+
+
+@override_settings(JUDGE_TEST_WORKERS=1)
+class RunRejudgeTests(RejudgeFixtureMixin, TransactionTestCase):
+    """Rejudges run on a thread pool, whose connections only see committed data"""
+
+    def setUp(self):
+        self.create_fixture()
+        self.alice_submission = self.judged(self.alice, CORRECT)
+        self.bob_submission = self.judged(self.bob, OFF_BY_ONE)
+        self.assertEqual((score(self.alice), score(self.bob)), (10, 0))
+
+    def fix_test_case(self, expected_output):
+        self.test_case.expected_output = expected_output
+        self.test_case.save()
+
+    def rejudge(self, **kwargs):
+        ids = select_submissions(problem=self.problem)
+        return run_rejudge(queue_rejudge(ids, problem=self.problem), workers=2, **kwargs)
+
+    def test_verdicts_and_scores_follow_the_fixed_test_case(self):
+        self.fix_test_case('4')
+        rejudge = self.rejudge()
+        self.assertEqual((rejudge.status, rejudge.processed, rejudge.changed, rejudge.errors), ('done', 2, 2, 0))
+        self.assertEqual(rejudge.score_changes, 2)
+        self.alice_submission.refresh_from_db()
+        self.bob_submission.refresh_from_db()
+        self.assertEqual((self.alice_submission.status, self.bob_submission.status), ('failed', 'accepted'))
+        self.assertEqual((score(self.alice), score(self.bob)), (0, 10))
+
+    def test_points_are_only_settled_once_every_submission_is_rejudged(self):
+        self.fix_test_case('4')
+        scores_before_settling = []
+
+        def settle(pairs):
+            scores_before_settling.append((score(self.alice), score(self.bob)))
+            return settle_scores(pairs)
+
+        with mock.patch.object(rejudge_module, 'settle_scores', side_effect=settle):
+            self.rejudge()
+        self.assertEqual(scores_before_settling, [(10, 0)])
+        self.assertEqual((score(self.alice), score(self.bob)), (0, 10))
+
+    def test_unchanged_verdicts_change_no_scores(self):
+        rejudge = self.rejudge()
+        self.assertEqual((rejudge.status, rejudge.changed, rejudge.score_changes), ('done', 0, 0))
+        self.assertEqual((score(self.alice), score(self.bob)), (10, 0))
+
+    def test_stopped_rejudge_settles_what_it_did(self):
+        self.fix_test_case('4')
+        stop = threading.Event()
+        stop.set()
+        rejudge = self.rejudge(stop=stop)
+        self.assertEqual((rejudge.status, rejudge.processed), ('failed', 0))
+        self.assertEqual(rejudge.error, 'Stopped after 0 of 2 submissions')
+        self.assertEqual((score(self.alice), score(self.bob)), (10, 0))
+
+    def test_failed_submission_is_counted(self):
+        with mock.patch.object(rejudge_module, 'judge_submission', side_effect=RuntimeError('Broken')):
+            rejudge = self.rejudge()
+        self.assertEqual((rejudge.status, rejudge.processed, rejudge.errors), ('done', 2, 2))
+        self.assertEqual(Rejudge.objects.get(pk=rejudge.pk).errors, 2)
+
+
+class StartRejudgeTests(RejudgeFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        self.create_fixture()
+        self.submission = self.judged(self.alice, CORRECT)
+        self.test_case.expected_output = '4'
+        self.test_case.save()
+
+    @override_settings(JUDGE_ASYNC=True)
+    def test_queued_for_a_worker_with_async_judging(self):
+        rejudge = start_rejudge([self.submission.id], problem=self.problem)
+        self.assertEqual(rejudge.status, 'queued')
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'accepted')
+
+    @override_settings(JUDGE_ASYNC=False)
+    def test_runs_at_once_without_async_judging(self):
+        rejudge = start_rejudge([self.submission.id], problem=self.problem)
+        self.assertEqual((rejudge.status, rejudge.processed, rejudge.score_changes), ('done', 1, 1))
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'failed')
+        self.assertEqual(score(self.alice), 0)
+
+    @override_settings(JUDGE_ASYNC=False)
+    def test_failure_is_recorded_without_async_judging(self):
+        with mock.patch.object(rejudge_module, 'settle_scores', side_effect=RuntimeError('Scores broken')):
+            rejudge = start_rejudge([self.submission.id], problem=self.problem)
+        self.assertEqual(rejudge.status, 'failed')
+        self.assertIn('Scores broken', rejudge.error)
+
+    @override_settings(JUDGE_ASYNC=False)
+    def test_admin_action_rejudges_at_once(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:lab_problem_changelist'), {
+            'action': 'rejudge_submissions', '_selected_action': [self.problem.pk],
+        }, follow=True)
+        self.assertContains(response, 'Rejudged 1 submission(s) of &quot;Add&quot;: 1 changed status')
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'failed')
@@ -0,0 +1,188 @@
+"""
+The execution scheduler is work-conserving: one owner can fill every slot
+when nobody else is waiting, and under contention a free slot goes to the
+waiting owner with the fewest executions running, in this process and
+across processes sharing a slot directory.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+from lab import scheduler as scheduler_module
+from lab.scheduler import ExecutionScheduler
+
+
+TIMEOUT = 5
+
+
+class Holder:
+    """Holds a slot of a scheduler in a thread until released"""
+
+    def __init__(self, scheduler, owner, started=None):
+        self.owner = owner
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.started = started
+        self.thread = threading.Thread(target=self._run, args=(scheduler,), daemon=True)
+        self.thread.start()
+
+    def _run(self, scheduler):
+        with scheduler.slot(self.owner):
+            if self.started is not None:
+                self.started.append(self.owner)
+            self.entered.set()
+            self.release.wait(TIMEOUT)
+
+    def finish(self):
+        self.release.set()
+        self.thread.join(TIMEOUT)
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.005)
+
+
+class InProcessSchedulingTests(SimpleTestCase):
+    def test_one_owner_can_use_every_slot(self):
+        scheduler = ExecutionScheduler(max_concurrent=4)
+        holders = [Holder(scheduler, 'alice') for _ in range(4)]
+        try:
+            for holder in holders:
+                self.assertTrue(holder.entered.wait(TIMEOUT))
+            self.assertEqual(scheduler.queue_depth()['running'], 4)
+        finally:
+            for holder in holders:
+                holder.finish()
+
+    def test_free_slot_goes_to_owner_running_fewest(self):
+        scheduler = ExecutionScheduler(max_concurrent=2)
+        started = []
+        running = [Holder(scheduler, 'alice', started) for _ in range(2)]
+        for holder in running:
+            self.assertTrue(holder.entered.wait(TIMEOUT))
+        # alice queued first, but bob has nothing running
+        alice = Holder(scheduler, 'alice', started)
+        wait_until(lambda: scheduler.queue_depth()['waiting'] == 1)
+        bob = Holder(scheduler, 'bob', started)
+        wait_until(lambda: scheduler.queue_depth()['waiting'] == 2)
+        try:
+            running[0].finish()
+            self.assertTrue(bob.entered.wait(TIMEOUT))
+            self.assertFalse(alice.entered.is_set())
+            running[1].finish()
+            self.assertTrue(alice.entered.wait(TIMEOUT))
+            self.assertEqual(started[2:], ['bob', 'alice'])
+        finally:
+            for holder in running + [alice, bob]:
+                holder.finish()
+
+    def test_owners_running_as_many_take_turns(self):
+        scheduler = ExecutionScheduler(max_concurrent=1)
+        started = []
+        first = Holder(scheduler, 'carol', started)
+        self.assertTrue(first.entered.wait(TIMEOUT))
+        waiting = []
+        for owner in ('alice', 'alice', 'bob', 'bob'):
+            waiting.append(Holder(scheduler, owner, started))
+            wait_until(lambda: scheduler.queue_depth()['waiting'] == len(waiting))
+        first.finish()
+        for count in range(2, len(waiting) + 2):
+            # One slot: finish whoever got it to let the next one in
+            wait_until(lambda: len(started) == count)
+            for holder in waiting:
+                if holder.entered.is_set():
+                    holder.release.set()
+        for holder in waiting:
+            holder.finish()
+        self.assertEqual(started, ['carol', 'alice', 'bob', 'alice', 'bob'])
+
+
+@skipIf(scheduler_module.fcntl is None, 'Slot files need fcntl')
+class CrossProcessSchedulingTests(SimpleTestCase):
+    """Two schedulers on one slot directory stand in for two worker processes"""
+
+    def setUp(self):
+        self.slot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.slot_dir, ignore_errors=True)
+
+    def workers(self, max_concurrent):
+        return [ExecutionScheduler(max_concurrent=max_concurrent, slot_dir=self.slot_dir) for _ in range(2)]
+
+    def test_one_owner_can_use_every_slot(self):
+        first, second = self.workers(4)
+        holders = [Holder(worker, 'alice') for worker in (first, first, second, second)]
+        try:
+            for holder in holders:
+                self.assertTrue(holder.entered.wait(TIMEOUT))
+            self.assertEqual(first.queue_depth()['running_all_workers'], 4)
+        finally:
+            for holder in holders:
+                holder.finish()
+
+    def test_owner_running_more_gives_up_free_slot(self):
+        first, second = self.workers(2)
+        running = [Holder(first, 'alice') for _ in range(2)]
+        for holder in running:
+            self.assertTrue(holder.entered.wait(TIMEOUT))
+        bob = Holder(second, 'bob')
+        waiting_dir = os.path.join(self.slot_dir, 'waiting')
+        wait_until(lambda: any(ExecutionScheduler._is_held(os.path.join(waiting_dir, name))
+                               for name in os.listdir(waiting_dir)))
+        alice = Holder(first, 'alice')
+        try:
+            running[0].finish()
+            self.assertTrue(bob.entered.wait(TIMEOUT))
+            self.assertFalse(alice.entered.is_set())
+            bob.finish()
+            self.assertTrue(alice.entered.wait(TIMEOUT))
+        finally:
+            for holder in running + [alice, bob]:
+                holder.finish()
+
+    def owner_files(self):
+        return sorted(os.listdir(os.path.join(self.slot_dir, 'users'))
+                      + os.listdir(os.path.join(self.slot_dir, 'waiting')))
+
+    def test_owner_files_are_removed_when_released(self):
+        first, second = self.workers(2)
+        for i in range(20):
+            with first.slot(f'user-{i}'):
+                with second.slot(f'user-{i}'):
+                    self.assertEqual(len(os.listdir(os.path.join(self.slot_dir, 'users'))), 2)
+        self.assertEqual(self.owner_files(), [])
+        self.assertEqual(len(os.listdir(self.slot_dir)), 4)  # users, waiting and the two slot files
+
+    def test_owner_files_are_removed_after_contention(self):
+        first, second = self.workers(1)
+        holder = Holder(first, 'alice')
+        self.assertTrue(holder.entered.wait(TIMEOUT))
+        bob = Holder(second, 'bob')
+        wait_until(lambda: os.listdir(os.path.join(self.slot_dir, 'waiting')))
+        holder.finish()
+        self.assertTrue(bob.entered.wait(TIMEOUT))
+        bob.finish()
+        self.assertEqual(self.owner_files(), [])
+
+    def test_files_left_by_a_dead_process_are_removed(self):
+        first, second = self.workers(1)
+        alice_hash = hashlib.sha1(b'alice').hexdigest()[:16]
+        for directory, name in (('waiting', 'deadbeef'), ('users', f'{alice_hash}-0')):
+            open(os.path.join(self.slot_dir, directory, name), 'w').close()
+        holder = Holder(first, 'alice')
+        self.assertTrue(holder.entered.wait(TIMEOUT))
+        # bob waits for the slot, looking through the waiting owners
+        bob = Holder(second, 'bob')
+        wait_until(lambda: 'deadbeef' not in os.listdir(os.path.join(self.slot_dir, 'waiting')))
+        holder.finish()
+        bob.finish()
+        self.assertEqual(self.owner_files(), [])
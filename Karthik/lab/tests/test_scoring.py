@@ -0,0 +1,154 @@
+"""
+A problem's points are awarded once per user, by the first accepted
+submission, however many are accepted and however they interleave, and a
+revoked solve takes back exactly the points it awarded.
+"""
+import threading
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from lab.judge import judge_submission
+from lab.models import Problem, SolvedProblem, Submission, TestCase as ProblemTestCase, UserProfile
+from lab.rejudge import queue_rejudge, run_rejudge, select_submissions
+from lab.scoring import record_solve, revoke_solve
+
+
+CORRECT = 'print(sum(map(int, input().split())))'
+
+
+class ScoringFixtureMixin:
+    def create_fixture(self):
+        self.user = User.objects.create_user('student', password='x')
+        self.problem = Problem.objects.create(title='Add', description='Add two numbers', points=10)
+
+    def accepted(self, problem=None):
+        return Submission.objects.create(user=self.user, problem=problem or self.problem, language='python',
+                                         code=CORRECT, status='accepted')
+
+    def score(self):
+        return UserProfile.objects.get(user=self.user).score
+
+
+class RecordSolveTests(ScoringFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_fixture()
+
+    def test_first_accepted_submission_awards_the_points(self):
+        first = self.accepted()
+        self.assertTrue(record_solve(first))
+        self.assertFalse(record_solve(self.accepted()))
+        self.assertFalse(record_solve(first))
+        self.assertEqual(self.score(), 10)
+        solved = SolvedProblem.objects.get()
+        self.assertEqual((solved.submission, solved.points), (first, 10))
+
+    def test_each_problem_counts_once(self):
+        other = Problem.objects.create(title='Other', description='Other', points=5)
+        for problem in (self.problem, other, self.problem, other):
+            record_solve(self.accepted(problem))
+        self.assertEqual(self.score(), 15)
+
+    def test_revoke_takes_back_the_points_awarded(self):
+        record_solve(self.accepted())
+        # Points changed after the solve: the solve keeps what it awarded
+        Problem.objects.filter(pk=self.problem.pk).update(points=50)
+        self.assertTrue(revoke_solve(self.user.id, self.problem.id))
+        self.assertEqual(self.score(), 0)
+        self.assertFalse(revoke_solve(self.user.id, self.problem.id))
+        self.assertEqual(self.score(), 0)
+
+    def test_losing_the_race_to_a_concurrent_solve_awards_nothing(self):
+        first, second = self.accepted(), self.accepted()
+        # Another worker solved it, after our lookup found nothing
+        record_solve(first)
+        lookups = []
+        real_get = QuerySet.get
+
+        def stale_get(queryset, *args, **kwargs):
+            lookups.append(queryset.model)
+            if len(lookups) == 1:
+                raise queryset.model.DoesNotExist()
+            return real_get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', autospec=True, side_effect=stale_get):
+            self.assertFalse(record_solve(second))
+        self.assertEqual(lookups, [SolvedProblem, SolvedProblem])
+        self.assertEqual(SolvedProblem.objects.get().submission, first)
+        self.assertEqual(self.score(), 10)
+
+    def test_score_edited_by_hand_is_kept(self):
+        UserProfile.objects.filter(user=self.user).update(score=7)
+        record_solve(self.accepted())
+        self.assertEqual(self.score(), 17)
+        revoke_solve(self.user.id, self.problem.id)
+        self.assertEqual(self.score(), 7)
+
+
+@override_settings(JUDGE_TEST_WORKERS=1)
+class JudgedSolveTests(ScoringFixtureMixin, TransactionTestCase):
+    """Judging and rejudging commit on their own, so these run outside a test transaction"""
+
+    def setUp(self):
+        self.create_fixture()
+        self.test_case = ProblemTestCase.objects.create(problem=self.problem, input_data='1 2', expected_output='3')
+
+    def submit(self):
+        submission = Submission.objects.create(user=self.user, problem=self.problem, language='python',
+                                               code=CORRECT, status='pending')
+        judge_submission(submission)
+        return submission
+
+    def test_duplicate_accepted_submissions_award_the_points_once(self):
+        first = self.submit()
+        second = self.submit()  # Gets the first one's cached verdict
+        self.assertEqual((first.status, second.status), ('accepted', 'accepted'))
+        self.assertEqual(self.score(), 10)
+        self.assertEqual(SolvedProblem.objects.get().submission, first)
+
+    @skipIf(connection.vendor == 'sqlite', 'SQLite test databases lock whole tables between threads')
+    def test_concurrent_accepted_submissions_award_the_points_once(self):
+        submissions = [self.accepted() for _ in range(8)]
+        barrier = threading.Barrier(len(submissions))
+        created = []
+        errors = []
+
+        def solve(submission):
+            try:
+                barrier.wait()
+                created.append(record_solve(submission))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=solve, args=(submission,)) for submission in submissions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(created), [False] * 7 + [True])
+        self.assertEqual(SolvedProblem.objects.count(), 1)
+        self.assertEqual(self.score(), 10)
+
+    def test_rejudge_revokes_and_restores_the_score(self):
+        submission = self.submit()
+        test_case = self.test_case
+        self.assertEqual(self.score(), 10)
+
+        def rejudge():
+            run_rejudge(queue_rejudge(select_submissions(problem=self.problem)), workers=1)
+
+        test_case.expected_output = '4'  # A wrong test case...
+        test_case.save()
+        rejudge()
+        self.assertEqual(self.score(), 0)
+        test_case.expected_output = '3'  # ...fixed again
+        test_case.save()
+        rejudge()
+        self.assertEqual(self.score(), 10)
+        self.assertEqual(SolvedProblem.objects.get().submission_id, submission.id)
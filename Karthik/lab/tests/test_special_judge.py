@@ -0,0 +1,164 @@
+"""
+Special judges: a problem's checker program is built once when the problem
+is saved and run for every test case the submission passes on its own, as
+`checker INPUT OUTPUT ANSWER`. Exit status 0 accepts, 1 or 2 reject, and
+anything else is a checker failure; what the checker prints is shown with
+the verdict.
+"""
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from lab import special_judge
+from lab.code_executor import CodeExecutor
+from lab.judge import judge_submission
+from lab.models import Problem, Submission, TestCase as ProblemTestCase
+
+
+# Accepts the numbers of the answer in any order, and checks it got the input
+SORTED_CHECKER = '''
+import sys
+input_data, output, answer = (open(path).read() for path in sys.argv[1:4])
+assert input_data.split()[0] == 'numbers', 'Wrong input file'
+if sorted(output.split()) == sorted(answer.split()):
+    sys.exit(0)
+print('Expected the numbers', ' '.join(sorted(answer.split())))
+sys.exit(1)
+'''
+
+SORTED_CHECKER_CPP = r'''
+#include <algorithm>
+#include <fstream>
+#include <iterator>
+#include <string>
+#include <vector>
+std::vector<std::string> words(const char *path) {
+    std::ifstream in(path);
+    std::vector<std::string> result{std::istream_iterator<std::string>(in), std::istream_iterator<std::string>()};
+    std::sort(result.begin(), result.end());
+    return result;
+}
+int main(int argc, char **argv) {
+    return words(argv[2]) == words(argv[3]) ? 0 : 1;
+}
+'''
+
+REVERSE = "import sys\nprint(' '.join(reversed(sys.stdin.read().split()[1:])))"
+WRONG = "print('1 2 3 4')"
+
+
+@override_settings(JUDGE_TEST_WORKERS=1)
+class SpecialJudgeTestCase(TestCase):
+    def setUp(self):
+        # Checker builds go to a temporary directory instead of EXECUTION_DIR
+        checkers_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, checkers_dir, ignore_errors=True)
+
+        def problem_checker_dir(problem_id):
+            return os.path.join(checkers_dir, str(problem_id))
+
+        for module in ('lab.special_judge', 'lab.signals'):
+            patcher = mock.patch(f'{module}.problem_checker_dir', problem_checker_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('student', password='x')
+
+    def create_problem(self, code=SORTED_CHECKER, language='python'):
+        problem = Problem.objects.create(title='Any order', description='Print the numbers in any order',
+                                         checker='custom', checker_language=language, checker_code=code)
+        ProblemTestCase.objects.create(problem=problem, input_data='numbers 1 2 3', expected_output='1 2 3')
+        return problem
+
+    def judge(self, problem, code):
+        submission = Submission.objects.create(user=self.user, problem_id=problem.id, language='python', code=code,
+                                               status='pending')
+        judge_submission(submission)
+        return submission, submission.test_results.get()
+
+
+class CheckerVerdictTests(SpecialJudgeTestCase):
+    def test_checker_accepts_any_correct_output(self):
+        submission, result = self.judge(self.create_problem(), REVERSE)
+        self.assertEqual((submission.status, result.verdict), ('accepted', 'passed'))
+
+    def test_rejected_output_shows_the_checker_message(self):
+        submission, result = self.judge(self.create_problem(), WRONG)
+        self.assertEqual((submission.status, result.verdict), ('failed', 'failed'))
+        self.assertIn('Checker: Expected the numbers 1 2 3', result.output)
+
+    def test_checker_crash_is_a_checker_failure(self):
+        problem = self.create_problem('import sys\nsys.exit(3)')
+        submission, result = self.judge(problem, REVERSE)
+        self.assertEqual(submission.status, 'failed')
+        self.assertIn('Checker failed (runtime_error): exit status 3', result.output)
+
+    def test_checker_is_not_run_on_a_crashed_submission(self):
+        problem = self.create_problem()
+        with mock.patch.object(special_judge.SpecialJudge, 'check') as check:
+            submission, result = self.judge(problem, 'raise SystemExit(1)')
+        check.assert_not_called()
+        self.assertEqual(result.verdict, 'runtime_error')
+
+    def test_checker_reads_file_backed_input(self):
+        store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store, ignore_errors=True)
+        with override_settings(TEST_DATA_DIR=store, TEST_DATA_FILE_THRESHOLD=16):
+            problem = self.create_problem()
+            numbers = ' '.join(str(i) for i in range(50))
+            ProblemTestCase.objects.filter(problem=problem).delete()
+            test_case = ProblemTestCase.objects.create(problem=problem, input_data=f'numbers {numbers}',
+                                                       expected_output=numbers)
+            self.assertTrue(test_case.input_file)
+            submission, result = self.judge(problem, REVERSE)
+        self.assertEqual(submission.status, 'accepted')
+
+    @skipUnless(shutil.which('g++'), 'Needs g++')
+    def test_cpp_checker(self):
+        problem = self.create_problem(SORTED_CHECKER_CPP, 'cpp')
+        self.assertIsNone(Problem.objects.get(pk=problem.pk).checker_compile_error)
+        self.assertEqual(self.judge(problem, REVERSE)[0].status, 'accepted')
+        self.assertEqual(self.judge(problem, WRONG)[0].status, 'failed')
+
+
+class CheckerBuildTests(SpecialJudgeTestCase):
+    def test_checker_is_built_once_on_save(self):
+        problem = self.create_problem()
+        build_dir = special_judge.checker_build_dir(problem)
+        self.assertTrue(os.path.isfile(os.path.join(build_dir, special_judge.COMMAND_FILE)))
+        with mock.patch.object(CodeExecutor, 'compile') as compile_program:
+            program = special_judge.load_checker(problem)
+        compile_program.assert_not_called()
+        self.assertTrue(program.success)
+        self.assertEqual(program.work_dir, build_dir)
+
+    def test_new_checker_code_replaces_the_old_build(self):
+        problem = self.create_problem()
+        old_build = special_judge.checker_build_dir(problem)
+        problem.checker_code = SORTED_CHECKER + '\n# v2\n'
+        problem.save()
+        new_build = special_judge.checker_build_dir(problem)
+        self.assertNotEqual(new_build, old_build)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(new_build))), ['.lock', os.path.basename(new_build)])
+
+    def test_missing_build_is_compiled_on_first_use(self):
+        problem = self.create_problem()
+        shutil.rmtree(special_judge.problem_checker_dir(problem.pk))
+        self.assertEqual(self.judge(problem, REVERSE)[0].status, 'accepted')
+
+    def test_syntax_error_is_recorded_on_save(self):
+        problem = self.create_problem('def broken(:\n    pass')
+        problem.refresh_from_db()
+        self.assertIn('SyntaxError', problem.checker_compile_error)
+        submission, result = self.judge(problem, REVERSE)
+        self.assertEqual(submission.status, 'failed')
+        self.assertIn('Checker failed to compile', result.output)
+
+    def test_deleting_the_problem_removes_its_builds(self):
+        problem = self.create_problem()
+        checker_dir = special_judge.problem_checker_dir(problem.pk)
+        problem.delete()
+        self.assertFalse(os.path.exists(checker_dir))
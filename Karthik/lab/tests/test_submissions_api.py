@@ -0,0 +1,138 @@
+"""
+The submissions API lists submissions newest first, a page at a time: the
+cursor picks up right after the last row shown, so submissions made at the
+same instant or while paging are neither skipped nor repeated. Filters
+narrow the list, and students only ever see their own submissions.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from lab.models import Problem, Submission, UserProfile
+from lab.pagination import InvalidCursor, decode_cursor, encode_cursor
+from lab.views import CODE_PREVIEW_LENGTH, MAX_SUBMISSION_PAGE_SIZE
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor('2024-01-02T03:04:05+00:00', 42)
+        self.assertEqual(decode_cursor(cursor, str, int), ('2024-01-02T03:04:05+00:00', 42))
+
+    def test_invalid_cursors(self):
+        for cursor in ('not-a-cursor', '', '!!!', encode_cursor(1), encode_cursor('x', 2), encode_cursor(1, 2, 3)):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(cursor, int, int)
+
+
+class SubmissionListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='x')
+        cls.other = User.objects.create_user('other', password='x')
+        cls.admin = User.objects.create_user('teacher', password='x')
+        UserProfile.objects.filter(user=cls.admin).update(role='admin')
+        cls.add = Problem.objects.create(title='Add', description='Add two numbers')
+        cls.echo = Problem.objects.create(title='Echo', description='Print the input')
+        cls.now = timezone.now()
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def submit(self, user=None, problem=None, minutes_ago=0, **fields):
+        submission = Submission.objects.create(user=user or self.student, problem=problem or self.add,
+                                               language=fields.pop('language', 'python'),
+                                               code=fields.pop('code', 'print(3)'), **fields)
+        # submitted_at is auto_now_add: set it afterwards
+        submitted_at = self.now - timedelta(minutes=minutes_ago)
+        Submission.objects.filter(pk=submission.pk).update(submitted_at=submitted_at)
+        return submission
+
+    def get(self, **params):
+        response = self.client.get(reverse('lab:submissions'), data=params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, **params):
+        return [row['id'] for row in self.get(**params)['results']]
+
+    def all_pages(self, **params):
+        ids = []
+        cursor = None
+        while True:
+            page = self.get(**params, **({'cursor': cursor} if cursor else {}))
+            ids.extend(row['id'] for row in page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_newest_first(self):
+        old = self.submit(minutes_ago=10)
+        new = self.submit(minutes_ago=1)
+        middle = self.submit(minutes_ago=5)
+        self.assertEqual(self.ids(), [new.id, middle.id, old.id])
+
+    def test_pages_with_submissions_made_at_the_same_instant(self):
+        expected = []
+        for minutes_ago in (0, 1, 2):
+            expected.extend(self.submit(minutes_ago=minutes_ago).id for _ in range(3))
+        self.assertEqual(self.all_pages(limit=2), expected)
+
+    def test_new_submissions_do_not_shift_the_next_page(self):
+        older = [self.submit(minutes_ago=minutes_ago) for minutes_ago in range(1, 6)]
+        page = self.get(limit=2)
+        self.submit(minutes_ago=0)
+        following = self.get(limit=2, cursor=page['next_cursor'])
+        self.assertEqual([row['id'] for row in following['results']], [older[2].id, older[3].id])
+
+    def test_last_page_has_no_cursor(self):
+        for minutes_ago in range(4):
+            self.submit(minutes_ago=minutes_ago)
+        self.assertIsNotNone(self.get(limit=3)['next_cursor'])
+        self.assertIsNone(self.get(limit=4)['next_cursor'])
+
+    def test_limit_is_clamped(self):
+        self.submit()
+        self.submit()
+        self.assertEqual(len(self.ids(limit=0)), 1)
+        self.assertEqual(len(self.ids(limit=MAX_SUBMISSION_PAGE_SIZE * 10)), 2)
+
+    def test_code_preview(self):
+        self.submit(code='x' * (CODE_PREVIEW_LENGTH + 50), minutes_ago=1)
+        self.submit(code='x' * CODE_PREVIEW_LENGTH)
+        short, long = self.get()['results']
+        self.assertEqual(short['code_preview'], 'x' * CODE_PREVIEW_LENGTH)
+        self.assertEqual(long['code_preview'], 'x' * CODE_PREVIEW_LENGTH + '...')
+        self.assertNotIn('code', long)
+
+    def test_filters(self):
+        accepted = self.submit(status='accepted')
+        echo = self.submit(problem=self.echo, language='cpp', status='wrong_answer')
+        self.assertEqual(self.ids(problem=self.echo.id), [echo.id])
+        self.assertEqual(self.ids(status='accepted'), [accepted.id])
+        self.assertEqual(self.ids(language='cpp'), [echo.id])
+        self.assertEqual(self.ids(language='python', problem=self.echo.id), [])
+
+    def test_invalid_parameters(self):
+        for params in ({'language': 'cobol'}, {'problem': 'add'}, {'limit': 'ten'}, {'cursor': 'not-a-cursor'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('lab:submissions'), data=params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_students_see_only_their_own(self):
+        own = self.submit()
+        self.submit(user=self.other)
+        self.assertEqual(self.ids(), [own.id])
+        self.assertEqual(self.ids(user='other'), [own.id])
+
+    def test_admins_see_everyone_and_filter_by_user(self):
+        own = self.submit(minutes_ago=1)
+        other = self.submit(user=self.other)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.ids(), [other.id, own.id])
+        self.assertEqual(self.ids(user='student'), [own.id])
+        self.assertEqual(self.get(user='student')['results'][0]['user'], 'student')
@@ -0,0 +1,106 @@
+"""
+Test data above TEST_DATA_FILE_THRESHOLD is kept as content-addressed files
+and judged in place. A stored file that has gone missing shows up as
+missing in the admin and in previews, and judging against it fails with an
+error that is not cached as a verdict.
+"""
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from lab import test_data
+from lab.judge import enqueue_submission, judge_submission, process_job
+from lab.models import Problem, Submission, TestCase as ProblemTestCase, VerdictCacheEntry
+
+
+ECHO = 'import sys\nsys.stdout.write(sys.stdin.read())'
+BIG_INPUT = 'x' * 100 + '\n'
+
+
+class TestDataTestCase(TestCase):
+    def setUp(self):
+        store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store, ignore_errors=True)
+        settings = override_settings(TEST_DATA_DIR=store, TEST_DATA_FILE_THRESHOLD=16, JUDGE_TEST_WORKERS=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user('student', password='x')
+        self.problem = Problem.objects.create(title='Echo', description='Print the input')
+        self.test_case = ProblemTestCase.objects.create(problem=self.problem, input_data=BIG_INPUT,
+                                                        expected_output=BIG_INPUT, is_sample=True)
+
+    def submit(self, code=ECHO):
+        return Submission.objects.create(user=self.user, problem=self.problem, language='python', code=code,
+                                         status='pending')
+
+
+class StoredTestDataTests(TestDataTestCase):
+    def test_large_data_is_stored_once_as_a_file(self):
+        self.test_case.refresh_from_db()
+        self.assertEqual((self.test_case.input_data, self.test_case.expected_output), ('', ''))
+        self.assertEqual(self.test_case.input_file, self.test_case.expected_output_file)
+        self.assertTrue(os.path.isfile(test_data.path(self.test_case.input_file)))
+        self.assertEqual(test_data.read_text(self.test_case.input_file), BIG_INPUT)
+
+    def test_small_data_stays_in_the_database(self):
+        test_case = ProblemTestCase.objects.create(problem=self.problem, input_data='1', expected_output='1')
+        self.assertEqual((test_case.input_file, test_case.expected_output_file), ('', ''))
+        self.assertEqual(test_case.input_data, '1')
+
+    def test_judged_from_the_files(self):
+        submission = self.submit()
+        judge_submission(submission)
+        self.assertEqual(submission.status, 'accepted')
+
+    def test_preview_shows_the_start_and_the_size(self):
+        test_case = ProblemTestCase.objects.create(problem=self.problem, input_data='y' * 3000,
+                                                   expected_output='1')
+        preview = test_case.input_preview()
+        self.assertTrue(preview.startswith('y' * test_data.PREVIEW_CHARS))
+        self.assertTrue(preview.endswith('(3000 bytes in total)'))
+
+
+class MissingTestDataTests(TestDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_case.refresh_from_db()
+        os.remove(test_data.path(self.test_case.input_file))
+
+    def test_previews_show_the_file_as_missing(self):
+        self.assertEqual(self.test_case.input_preview(), test_data.MISSING_PREVIEW)
+        self.assertEqual(self.test_case.expected_output_preview(), test_data.MISSING_PREVIEW)
+
+    def test_admin_change_page_marks_the_file_missing(self):
+        admin = User.objects.create_superuser('teacher', password='x')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:lab_problem_change', args=[self.problem.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Input: missing file')
+        self.assertContains(response, 'Output: missing file')
+
+    def test_judging_raises_a_clear_error(self):
+        with self.assertRaisesMessage(test_data.MissingTestData,
+                                      f'Test data file {self.test_case.input_file} is missing'):
+            judge_submission(self.submit())
+
+    def test_judge_job_fails_without_caching_a_verdict(self):
+        submission = self.submit()
+        job = process_job(enqueue_submission(submission))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('MissingTestData', job.error)
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'error')
+        self.assertFalse(VerdictCacheEntry.objects.exists())
+
+    def test_input_file_alone_missing(self):
+        # Only the input is gone: the expected output opens, the program's stdin does not
+        self.test_case.expected_output = 'different output ' * 4
+        self.test_case.save()
+        with self.assertRaises(test_data.MissingTestData):
+            judge_submission(self.submit())
+        self.assertFalse(VerdictCacheEntry.objects.exists())
@@ -0,0 +1,223 @@
+"""
+Importing users from CSV: bad, duplicate and already-taken rows are
+skipped with a reason, every other row becomes a user with a profile and
+ghost credential whose password works. Passwords are hashed before the
+file is stored, the file is dropped once the import has run, however it
+ends, and with JUDGE_ASYNC off the import runs without a worker.
+"""
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from lab.models import GhostCredential, UserImport, UserProfile
+from lab.user_import import (
+    UserImportRunner, check_rows, claim_next_import, create_users, hashed_passwords, queue_import, run_import,
+    start_import,
+)
+
+
+HEADER = 'username,email,password,branch,year,semester,gender,role\n'
+
+
+def csv_data(*rows):
+    return HEADER + ''.join(row + '\n' for row in rows)
+
+
+def student_rows(count, start=0):
+    return [f'student{i},student{i}@example.com,pass{i},CSE,2,3,F,' for i in range(start, start + count)]
+
+
+class CheckRowsTests(TestCase):
+    def test_rows_missing_fields(self):
+        rows, errors = check_rows(csv_data('alice,alice@example.com,secret', 'bob,,secret', ',carol@example.com,x',
+                                           'dave,dave@example.com,'), size=10)
+        self.assertEqual([fields['username'] for _, fields in rows], ['alice'])
+        self.assertEqual(errors, [f'Row {n}: Missing username, email or password' for n in (3, 4, 5)])
+
+    def test_duplicates_within_the_file_and_already_taken(self):
+        User.objects.create_user('taken', email='taken@example.com', password='x')
+        rows, errors = check_rows(csv_data(
+            'alice,alice@example.com,a',
+            'alice,other@example.com,b',
+            'bob,alice@example.com,c',
+            'taken,new@example.com,d',
+            'newname,taken@example.com,e',
+        ), size=2)
+        self.assertEqual([row_num for row_num, _ in rows], [2])
+        self.assertEqual(errors, [
+            "Row 3: Username 'alice' already exists",
+            "Row 4: Email 'alice@example.com' already registered",
+            "Row 5: Username 'taken' already exists",
+            "Row 6: Email 'taken@example.com' already registered",
+        ])
+
+    def test_defaults(self):
+        (_, fields), = check_rows(csv_data('alice,alice@example.com,a,,x,,,superuser'), size=10)[0]
+        self.assertEqual((fields['branch'], fields['year'], fields['semester'], fields['gender'], fields['role']),
+                         (None, 1, 1, 'M', 'student'))
+
+
+class RunImportTests(TestCase):
+    def run_csv(self, data, **kwargs):
+        user_import = queue_import(data, file_name='intake.csv', processes=1)
+        return run_import(user_import, processes=1, **kwargs)
+
+    def test_users_profiles_and_credentials(self):
+        user_import = self.run_csv(csv_data(
+            'alice,alice@example.com,secret1,ECE,3,5,Female,admin',
+            'bob,bob@example.com,secret2,,,,m,',
+        ))
+        self.assertEqual((user_import.status, user_import.imported, user_import.skipped), ('done', 2, 0))
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('secret1'))
+        self.assertEqual(alice.email, 'alice@example.com')
+        profile = alice.userprofile
+        self.assertEqual((profile.role, profile.branch, profile.year, profile.semester, profile.gender),
+                         ('admin', 'ECE', 3, 5, 'F'))
+        self.assertTrue(profile.email_verified)
+        self.assertEqual(UserProfile.objects.get(user__username='bob').role, 'student')
+        self.assertEqual(set(GhostCredential.objects.values_list('username', flat=True)), {'alice', 'bob'})
+        self.assertEqual(user_import.csv_data, '')
+
+    def test_progress_of_each_chunk(self):
+        calls = []
+        user_import = self.run_csv(csv_data('bad,,x', *student_rows(5)), size=2,
+                                   progress=lambda processed, total: calls.append((processed, total)))
+        self.assertEqual(calls, [(3, 6), (5, 6), (6, 6)])
+        self.assertEqual((user_import.total, user_import.processed, user_import.imported, user_import.skipped),
+                         (6, 6, 5, 1))
+        self.assertEqual(user_import.errors, ['Row 2: Missing username, email or password'])
+        self.assertEqual(User.objects.filter(username__startswith='student').count(), 5)
+
+    def test_stopped_import_keeps_the_users_created(self):
+        stop = threading.Event()
+        user_import = self.run_csv(csv_data(*student_rows(5)), size=2, stop=stop,
+                                   progress=lambda processed, total: stop.set())
+        self.assertEqual((user_import.status, user_import.imported), ('failed', 2))
+        self.assertEqual(user_import.error, 'Stopped after 2 of 5 rows')
+        self.assertEqual(user_import.csv_data, '')
+        self.assertEqual(User.objects.filter(username__startswith='student').count(), 2)
+
+    def test_username_taken_after_the_check(self):
+        rows, _ = check_rows(csv_data(*student_rows(3)), size=10)
+        User.objects.create_user('student1', password='x')
+        errors = create_users(rows, [f'hash{i}' for i in range(3)])
+        self.assertEqual(errors, ["Row 3: Username 'student1' already exists"])
+        for username in ('student0', 'student2'):
+            profile = UserProfile.objects.get(user__username=username)
+            self.assertEqual((profile.branch, profile.semester), ('CSE', 3))
+            self.assertTrue(GhostCredential.objects.filter(username=username).exists())
+
+    def test_queued_file_holds_no_passwords(self):
+        user_import = queue_import(csv_data('alice,alice@example.com,secret1', 'bob,bob@example.com,'), processes=1)
+        self.assertNotIn('secret1', user_import.csv_data)
+        self.assertNotIn('password,', user_import.csv_data.splitlines()[0])
+        self.assertEqual(user_import.total, 2)
+        user_import = run_import(user_import, processes=1)
+        self.assertEqual(user_import.errors, ['Row 3: Missing username, email or password'])
+        self.assertTrue(User.objects.get(username='alice').check_password('secret1'))
+
+    def test_failed_import_drops_the_file(self):
+        user_import = queue_import(csv_data(*student_rows(2)), processes=1)
+        with mock.patch('lab.user_import.create_users', side_effect=RuntimeError('Database gone')):
+            with self.assertRaises(RuntimeError):
+                run_import(user_import, processes=1)
+        user_import.refresh_from_db()
+        self.assertEqual((user_import.status, user_import.csv_data), ('failed', ''))
+        self.assertIn('Database gone', user_import.error)
+
+    def test_start_import_runs_now_without_async_judging(self):
+        with override_settings(JUDGE_ASYNC=True):
+            self.assertEqual(start_import(csv_data(*student_rows(1))).status, 'queued')
+        with override_settings(JUDGE_ASYNC=False):
+            user_import = start_import(csv_data(*student_rows(2, start=1)))
+        self.assertEqual((user_import.status, user_import.imported, user_import.csv_data), ('done', 2, ''))
+        self.assertEqual(User.objects.filter(username__startswith='student').count(), 2)
+
+    def test_claim_next_import(self):
+        first = queue_import(csv_data(*student_rows(1)))
+        second = queue_import(csv_data(*student_rows(1, start=1)))
+        self.assertEqual(first.total, 1)
+        self.assertEqual(claim_next_import('worker-1'), first)
+        claimed = claim_next_import('worker-2')
+        self.assertEqual((claimed, claimed.status, claimed.worker), (second, 'running', 'worker-2'))
+        self.assertIsNone(claim_next_import('worker-1'))
+
+
+class HashedPasswordsTests(TestCase):
+    def test_pooled_hashes_are_in_order(self):
+        passwords = [f'pass{i}' for i in range(6)]
+        hashes = list(hashed_passwords(passwords, processes=2))
+        self.assertEqual(len(hashes), 6)
+        for password, password_hash in zip(passwords, hashes):
+            self.assertTrue(User(password=password_hash).check_password(password))
+
+
+class ImportUsersCommandTests(TestCase):
+    def test_import_a_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8-sig') as f:
+            f.write(csv_data(*student_rows(3), 'student0,again@example.com,x'))
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_users', f.name, processes=1, chunk_size=2, stdout=out)
+        self.assertIn('Imported 3 user(s)', out.getvalue())
+        self.assertIn("Row 5: Username 'student0' already exists", out.getvalue())
+        self.assertEqual(UserImport.objects.get().status, 'done')
+
+    def test_run_queued_imports(self):
+        queue_import(csv_data(*student_rows(2)))
+        queue_import(csv_data(*student_rows(2, start=2)))
+        call_command('import_users', queued=True, processes=1, stdout=StringIO())
+        self.assertEqual(list(UserImport.objects.values_list('status', flat=True)), ['done', 'done'])
+        self.assertEqual(User.objects.filter(username__startswith='student').count(), 4)
+
+
+class ImportAdminTests(TestCase):
+    @override_settings(JUDGE_ASYNC=True)
+    def test_upload_queues_an_import(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('intake.csv', csv_data(*student_rows(2)).encode('utf-8-sig'))
+        response = self.client.post(reverse('admin:lab_user_import_csv'), {'csv_file': upload})
+        user_import = UserImport.objects.get()
+        self.assertRedirects(response, reverse('admin:lab_user_import_status', args=[user_import.pk]))
+        self.assertEqual((user_import.status, user_import.total, user_import.requested_by),
+                         ('queued', 2, admin))
+        self.assertFalse(User.objects.filter(username__startswith='student').exists())
+
+    @override_settings(JUDGE_ASYNC=False)
+    def test_upload_is_imported_at_once_without_async_judging(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        upload = SimpleUploadedFile('intake.csv', csv_data(*student_rows(2)).encode('utf-8-sig'))
+        response = self.client.post(reverse('admin:lab_user_import_csv'), {'csv_file': upload}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserImport.objects.get().status, 'done')
+        self.assertTrue(User.objects.get(username='student1').check_password('pass1'))
+
+    def test_upload_that_is_not_utf8(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        upload = SimpleUploadedFile('intake.csv', b'username\n\xff\xfe\n')
+        response = self.client.post(reverse('admin:lab_user_import_csv'), {'csv_file': upload}, follow=True)
+        self.assertContains(response, 'the file is not UTF-8 text')
+        self.assertFalse(UserImport.objects.exists())
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite test databases lock tables between threads')
+class UserImportRunnerTests(TransactionTestCase):
+    def test_runs_queued_imports_in_the_background(self):
+        user_import = queue_import(csv_data(*student_rows(3)))
+        runner = UserImportRunner('worker-1')
+        self.assertEqual(runner.poll(), user_import)
+        runner.thread.join(30)
+        user_import.refresh_from_db()
+        self.assertEqual((user_import.status, user_import.imported, user_import.worker), ('done', 3, 'worker-1'))
+        self.assertIsNone(runner.poll())
@@ -0,0 +1,153 @@
+"""
+Identical code judged against unchanged test cases gets the cached
+verdict. Outcomes that depend on the judge (time limits, compile timeouts,
+executor failures) are never cached, and any change to the test cases,
+the admin's inline formsets included, makes older entries miss.
+"""
+import shutil
+import subprocess
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from lab.code_executor import CodeExecutor
+from lab.judge import judge_submission
+from lab.models import Problem, Submission, TestCase as ProblemTestCase, VerdictCacheEntry
+
+
+ADD = 'print(sum(map(int, input().split())))'
+
+
+@override_settings(JUDGE_TEST_WORKERS=1)
+class VerdictCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='x')
+        self.problem = Problem.objects.create(title='Add', description='Add two numbers')
+        ProblemTestCase.objects.create(problem=self.problem, input_data='1 2', expected_output='3', is_sample=True)
+        ProblemTestCase.objects.create(problem=self.problem, input_data='5 5', expected_output='10')
+
+    def judge(self, code=ADD, language='python', **kwargs):
+        """Judge a new submission; returns it and whether the verdict came from the cache"""
+        self.problem.refresh_from_db()
+        submission = Submission.objects.create(user=self.user, problem=self.problem, language=language, code=code,
+                                               status='pending', verdict_policy=self.problem.verdict_policy)
+        cached = judge_submission(submission, **kwargs) is None
+        return submission, cached
+
+
+class CacheHitTests(VerdictCacheTestCase):
+    def test_identical_code_gets_the_cached_verdict(self):
+        first, cached = self.judge()
+        self.assertFalse(cached)
+        second, cached = self.judge(ADD.replace('\n', '\r\n') + '\n\n')
+        self.assertTrue(cached)
+        self.assertEqual((second.status, second.test_cases_passed), (first.status, first.test_cases_passed))
+        self.assertEqual([result.verdict for result in second.test_results.all()], ['passed', 'passed'])
+        self.assertEqual(VerdictCacheEntry.objects.get().hits, 1)
+
+    def test_different_code_or_policy_misses(self):
+        self.judge()
+        self.assertFalse(self.judge('print(3)')[1])
+        Problem.objects.filter(pk=self.problem.pk).update(verdict_policy='first_failure')
+        self.problem.refresh_from_db()
+        self.assertFalse(self.judge()[1])
+
+    def test_use_cache_false_judges_again(self):
+        self.judge()
+        self.assertFalse(self.judge(use_cache=False)[1])
+
+    @override_settings(VERDICT_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.judge()
+        self.assertFalse(VerdictCacheEntry.objects.exists())
+
+
+class UncachedOutcomeTests(VerdictCacheTestCase):
+    def assertNotCached(self, submission):
+        self.assertFalse(VerdictCacheEntry.objects.exists())
+        # The next identical submission is judged again, and then cached
+        self.assertFalse(self.judge(submission.code, submission.language)[1])
+        self.assertTrue(VerdictCacheEntry.objects.exists())
+
+    def test_time_limit(self):
+        with mock.patch.object(CodeExecutor, 'run', return_value={
+                'success': False, 'status': 'time_limit', 'error': 'Time limit exceeded'}):
+            submission, _ = self.judge()
+        self.assertEqual(submission.status, 'failed')
+        self.assertNotCached(submission)
+
+    def test_compile_timeout(self):
+        timeout = subprocess.TimeoutExpired('python3', 10)
+        with mock.patch.object(CodeExecutor, '_compile_python', side_effect=timeout):
+            submission, _ = self.judge()
+        self.assertEqual(submission.status, 'compile_error')
+        self.assertEqual(submission.error_message, 'Compilation timed out')
+        self.assertNotCached(submission)
+
+    def test_executor_error(self):
+        with mock.patch.object(CodeExecutor, 'run', return_value={
+                'success': False, 'error': 'Execution error: [Errno 24] Too many open files'}):
+            submission, _ = self.judge()
+        self.assertEqual(submission.status, 'failed')
+        self.assertNotCached(submission)
+
+    @skipUnless(shutil.which('gcc'), 'Needs gcc')
+    def test_wrong_answer_and_compile_errors_are_cached(self):
+        self.judge('print(4)')
+        self.judge('int main( {', 'c')
+        self.assertEqual(sorted(VerdictCacheEntry.objects.values_list('status', flat=True)),
+                         ['compile_error', 'failed'])
+
+
+class InvalidationTests(VerdictCacheTestCase):
+    def change_form_data(self, response):
+        """POST data for an admin change form as it was rendered"""
+        data = {}
+        forms = [response.context['adminform'].form]
+        for inline in response.context['inline_admin_formsets']:
+            forms.append(inline.formset.management_form)
+            forms.extend(inline.formset.forms)
+        for form in forms:
+            for field in form:
+                value = field.value()
+                if field.field.disabled or value is None or value is False:
+                    continue
+                data[field.html_name] = value
+        return data
+
+    def test_editing_a_test_case_in_the_admin_inline_formset(self):
+        self.judge()
+        revision = Problem.objects.get(pk=self.problem.pk).test_revision
+        admin = User.objects.create_superuser('teacher', password='x')
+        Problem.objects.filter(pk=self.problem.pk).update(created_by=admin)
+        self.client.force_login(admin)
+        url = reverse('admin:lab_problem_change', args=[self.problem.pk])
+        data = self.change_form_data(self.client.get(url))
+        expected_field = next(name for name, value in data.items()
+                              if name.endswith('-expected_output') and value == '10')
+        data[expected_field] = '11'
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(ProblemTestCase.objects.filter(problem=self.problem, expected_output='11').exists())
+        self.problem.refresh_from_db()
+        self.assertGreater(self.problem.test_revision, revision)
+        self.assertFalse(VerdictCacheEntry.objects.exists())
+
+        submission, cached = self.judge()
+        self.assertFalse(cached)
+        self.assertEqual(submission.status, 'partial')
+
+    def test_saving_the_problem_unchanged_keeps_the_cache(self):
+        self.judge()
+        self.problem.description = 'Add two integers'
+        self.problem.save()
+        self.assertTrue(self.judge()[1])
+
+    def test_changing_the_checker(self):
+        self.judge()
+        self.problem.checker = 'tokens'
+        self.problem.save()
+        self.assertFalse(self.judge()[1])
@@ -0,0 +1,111 @@
+"""
+Verdict policies decide which test cases run: 'all' runs every case,
+'first_failure' stops at the first failing case in order (cases after it
+are skipped even if a parallel run already finished them), and
+'samples_first' skips the hidden cases when a sample fails.
+"""
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from lab.judge import outcome_status, run_test_cases
+from lab.models import Problem, Submission, TestCase as ProblemTestCase
+
+from .test_parallel_judging import FakeExecutor, make_test_cases
+
+
+def verdicts(outcome):
+    return [result['verdict'] for result in outcome['results']]
+
+
+def failing_on(*inputs):
+    """Expected outputs that make the cases with these inputs fail"""
+    return lambda i: 'wrong' if str(i) in inputs else str(i)
+
+
+class PolicyTests(SimpleTestCase):
+    def judge(self, policy, test_cases, executor=None):
+        executor = executor or FakeExecutor()
+        return executor, run_test_cases(executor, 'python', '', test_cases, policy=policy)
+
+    def test_all_runs_every_case(self):
+        executor, outcome = self.judge('all', make_test_cases(5, expected=failing_on('1', '3')))
+        self.assertEqual(verdicts(outcome), ['passed', 'failed', 'passed', 'failed', 'passed'])
+        self.assertEqual(len(executor.ran), 5)
+
+    @override_settings(JUDGE_TEST_WORKERS=1)
+    def test_first_failure_stops_at_the_first_failing_case(self):
+        executor, outcome = self.judge('first_failure', make_test_cases(5, expected=failing_on('1', '3')))
+        self.assertEqual(verdicts(outcome), ['passed', 'failed', 'skipped', 'skipped', 'skipped'])
+        self.assertEqual(executor.ran, ['0', '1'])
+        self.assertEqual(outcome['passed'], 1)
+
+    @override_settings(JUDGE_TEST_WORKERS=4)
+    def test_first_failure_skips_later_cases_that_already_ran_in_parallel(self):
+        # Case 2 fails last, after the later cases have finished
+        executor = FakeExecutor(delay=lambda input_data: 0.05 if input_data == '2' else 0)
+        executor, outcome = self.judge('first_failure', make_test_cases(6, expected=failing_on('2')), executor)
+        self.assertEqual(verdicts(outcome), ['passed', 'passed', 'failed', 'skipped', 'skipped', 'skipped'])
+
+    @override_settings(JUDGE_TEST_WORKERS=4)
+    def test_first_failure_reports_the_earliest_failure(self):
+        executor = FakeExecutor(delay=lambda input_data: 0.05 if input_data == '1' else 0)
+        executor, outcome = self.judge('first_failure', make_test_cases(4, expected=failing_on('1', '3')), executor)
+        self.assertEqual(verdicts(outcome), ['passed', 'failed', 'skipped', 'skipped'])
+
+    def test_samples_first_skips_hidden_cases_after_a_failing_sample(self):
+        test_cases = make_test_cases(5, samples=2, expected=failing_on('1'))
+        executor, outcome = self.judge('samples_first', test_cases)
+        self.assertEqual(verdicts(outcome), ['passed', 'failed', 'skipped', 'skipped', 'skipped'])
+        self.assertEqual(sorted(executor.ran), ['0', '1'])
+
+    def test_samples_first_runs_hidden_cases_after_passing_samples(self):
+        test_cases = make_test_cases(5, samples=2, expected=failing_on('3'))
+        executor, outcome = self.judge('samples_first', test_cases)
+        self.assertEqual(verdicts(outcome), ['passed', 'passed', 'passed', 'failed', 'passed'])
+
+    def test_samples_first_keeps_test_case_order(self):
+        test_cases = make_test_cases(4)
+        test_cases[0].is_sample = False
+        test_cases[3].is_sample = True
+        executor, outcome = self.judge('samples_first', test_cases)
+        self.assertEqual([result['test_case'] for result in outcome['results']], test_cases)
+
+    def test_outcome_status(self):
+        for policy, expected, status in (('all', failing_on(), 'accepted'), ('all', failing_on('0'), 'partial'),
+                                         ('all', failing_on('0', '1'), 'failed')):
+            with self.subTest(status=status):
+                self.assertEqual(outcome_status(self.judge(policy, make_test_cases(2, expected=expected))[1]), status)
+
+
+@override_settings(JUDGE_ASYNC=False, JUDGE_TEST_WORKERS=1)
+class PolicyRequestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='x')
+        self.client.force_login(self.user)
+        self.problem = Problem.objects.create(title='Add', description='Add', verdict_policy='first_failure')
+        for order, (input_data, output) in enumerate((('1 2', '3'), ('2 2', '5'), ('3 3', '6'))):
+            ProblemTestCase.objects.create(problem=self.problem, input_data=input_data, expected_output=output,
+                                           order=order)
+
+    def submit(self, **data):
+        return self.client.post(reverse('lab:execute_code'), {
+            'language': 'python', 'code': 'print(sum(map(int, input().split())))', 'problem_id': self.problem.id,
+            **data,
+        }, content_type='application/json')
+
+    def test_problem_policy_is_used_and_recorded(self):
+        data = self.submit().json()
+        self.assertEqual(data['verdict_policy'], 'first_failure')
+        self.assertEqual([result['verdict'] for result in data['test_results']], ['passed', 'failed', 'skipped'])
+        self.assertEqual(Submission.objects.get().verdict_policy, 'first_failure')
+
+    def test_request_overrides_the_policy(self):
+        data = self.submit(verdict_policy='all').json()
+        self.assertEqual([result['verdict'] for result in data['test_results']], ['passed', 'failed', 'passed'])
+        self.assertEqual(Submission.objects.get().verdict_policy, 'all')
+
+    def test_unknown_policy_is_rejected(self):
+        response = self.submit(verdict_policy='best_of_three')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Submission.objects.exists())
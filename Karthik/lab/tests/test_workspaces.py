@@ -0,0 +1,82 @@
+"""
+Workspaces are handed out empty and reused once released, up to the
+pool's idle limit. A pool sweeps away the directories of pools whose
+process is gone, never those of a live one.
+"""
+import os
+import shutil
+import tempfile
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+from lab import workspaces
+from lab.workspaces import LOCK_FILE, WorkspacePool
+
+
+class WorkspacePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def pool(self, max_idle=8):
+        pool = WorkspacePool(self.root, max_idle=max_idle)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_released_workspace_is_emptied_and_reused(self):
+        pool = self.pool()
+        path = pool.acquire()
+        self.assertEqual(os.listdir(path), [])
+        os.makedirs(os.path.join(path, 'build', 'classes'))
+        with open(os.path.join(path, 'program'), 'w') as f:
+            f.write('binary')
+        pool.release(path)
+
+        self.assertEqual(pool.acquire(), path)
+        self.assertEqual(os.listdir(path), [])
+        stats = pool.stats()
+        self.assertEqual((stats['acquired'], stats['created'], stats['reused']), (2, 1, 1))
+        self.assertEqual(stats['reuse_ratio'], 0.5)
+
+    def test_workspaces_in_use_are_distinct(self):
+        pool = self.pool()
+        paths = [pool.acquire() for _ in range(3)]
+        self.assertEqual(len(set(paths)), 3)
+
+    def test_idle_workspaces_beyond_the_limit_are_removed(self):
+        pool = self.pool(max_idle=1)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        self.assertTrue(os.path.isdir(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertEqual((pool.stats()['idle'], pool.stats()['discarded']), (1, 1))
+
+    def test_workspace_moved_away_is_released_quietly(self):
+        pool = self.pool()
+        path = pool.acquire()
+        shutil.move(path, os.path.join(self.root, 'moved'))
+        pool.release(path)
+        self.assertEqual(pool.stats()['idle'], 0)
+        self.assertNotEqual(pool.acquire(), path)
+
+    def test_close_removes_the_pools_directory(self):
+        pool = WorkspacePool(self.root)
+        pool.acquire()
+        pool.close()
+        self.assertFalse(os.path.exists(pool.dir))
+
+    @skipIf(workspaces.fcntl is None, 'Sweeping needs fcntl')
+    def test_sweep_removes_only_directories_of_dead_pools(self):
+        live = self.pool()
+        live.acquire()
+        dead = os.path.join(self.root, '1234-deadbeef')
+        os.makedirs(os.path.join(dead, '1'))
+        open(os.path.join(dead, LOCK_FILE), 'w').close()  # Its process never unlocks it again
+
+        new = self.pool()
+        self.assertEqual(new.stats()['swept'], 1)
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.isdir(live.dir))
+        self.assertTrue(os.path.isdir(new.dir))
@@ -46,5 +46,10 @@ urlpatterns = [
     path('execute/', views.execute_code, name='execute_code'),
     path('submissions/', views.get_submissions, name='submissions'),
     path('submissions/<int:submission_id>/', views.get_submission_detail, name='submission_detail'),
+    path('submissions/<int:submission_id>/status/', views.get_submission_status, name='submission_status'),
+    path('judge/status/', views.judge_status, name='judge_status'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('exports/submissions.<str:file_format>', views.export_submissions, name='export_submissions'),
+    path('exports/grades.<str:file_format>', views.export_grades, name='export_grades'),
 ]
 
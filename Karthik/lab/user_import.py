@@ -0,0 +1,350 @@
+"""
+Bulk import of users from a CSV file, e.g. a new intake of students.
+
+The admin's "Import CSV" page queues a UserImport holding the file and
+shows its progress; a judge worker runs it in a background thread (or
+`python manage.py import_users` runs it in the foreground), so a large
+file doesn't hold up the request. With JUDGE_ASYNC off no worker runs,
+and the import runs inside the request instead.
+
+Passwords are never stored: before the file is saved on the UserImport,
+each password is hashed, on a pool of USER_IMPORT_HASH_PROCESSES
+processes since hashing is nearly all of the work, and the file keeps
+only the hashes (a password_hash column). Running the import then goes
+through the file in two steps:
+- every row is checked first, against the other rows and against the
+  usernames and emails already taken, which are fetched in a few IN
+  queries instead of two per row;
+- users, profiles and ghost credentials are written with bulk_create,
+  USER_IMPORT_CHUNK_SIZE users per transaction.
+
+bulk_create sends no post_save signals, so the rows signals.py would
+create for a new user are created here. The file is deleted from the
+UserImport once the import has run, however it ended.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import leaderboard
+from .judge import default_worker_name
+from .models import GhostCredential, UserImport, UserProfile
+
+logger = logging.getLogger(__name__)
+
+GENDERS = {'m': 'M', 'male': 'M', 'f': 'F', 'female': 'F', 'o': 'O', 'other': 'O'}
+ROLES = ('admin', 'student')
+
+
+def hash_processes():
+    return getattr(settings, 'USER_IMPORT_HASH_PROCESSES', None) or os.cpu_count() or 1
+
+
+def chunk_size():
+    return getattr(settings, 'USER_IMPORT_CHUNK_SIZE', None) or 500
+
+
+def queue_import(csv_data, file_name='', requested_by=None, processes=None):
+    """Queue a UserImport for a judge worker to run; the file is stored with its passwords hashed"""
+    csv_data = hash_passwords(csv_data, processes or hash_processes())
+    return UserImport.objects.create(csv_data=csv_data, file_name=file_name, requested_by=requested_by,
+                                     total=count_rows(csv_data))
+
+
+def start_import(csv_data, file_name='', requested_by=None):
+    """Queue a UserImport, or with JUDGE_ASYNC off, when no worker would run it, run it now"""
+    user_import = queue_import(csv_data, file_name=file_name, requested_by=requested_by)
+    if getattr(settings, 'JUDGE_ASYNC', True):
+        return user_import
+    claim_import(user_import, default_worker_name())
+    try:
+        return run_import(user_import)
+    except Exception:
+        logger.error('User import %s failed\n%s', user_import.pk, traceback.format_exc())
+        user_import.refresh_from_db()
+        return user_import
+
+
+def count_rows(csv_data):
+    return sum(1 for _ in csv.DictReader(io.StringIO(csv_data)))
+
+
+def hash_passwords(csv_data, processes):
+    """The CSV with its password column replaced by a password_hash column"""
+    reader = csv.DictReader(io.StringIO(csv_data))
+    rows = list(reader)
+    if not reader.fieldnames:
+        return csv_data
+    fieldnames = [name for name in reader.fieldnames if name != 'password']
+    if 'password_hash' not in fieldnames:
+        fieldnames.append('password_hash')
+    passwords = [(row.get('password') or '').strip() for row in rows]
+    hashes = hashed_passwords([password for password in passwords if password], processes)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    try:
+        for row, password in zip(rows, passwords):
+            # A row without a password keeps whatever hash it came with, usually none
+            row['password_hash'] = next(hashes) if password else (row.get('password_hash') or '')
+            writer.writerow(row)
+    finally:
+        hashes.close()  # Stops the hashing processes
+    return output.getvalue()
+
+
+def claim_import(user_import, worker_name):
+    """Mark a queued UserImport as running on worker_name, e.g. to run it in the foreground"""
+    UserImport.objects.filter(pk=user_import.pk).update(status='running', worker=worker_name,
+                                                        started_at=timezone.now())
+    user_import.refresh_from_db()
+
+
+def claim_next_import(worker_name):
+    """Atomically claim the oldest queued UserImport, or return None"""
+    while True:
+        user_import = UserImport.objects.filter(status='queued').order_by('created_at', 'id').first()
+        if user_import is None:
+            return None
+        claimed = UserImport.objects.filter(id=user_import.id, status='queued').update(
+            status='running', worker=worker_name, started_at=timezone.now(),
+        )
+        if claimed:
+            user_import.refresh_from_db()
+            return user_import
+
+
+def parse_row(row):
+    """The user and profile fields of a CSV row, or raise ValueError.
+
+    The row has either a password or, once queued, its password_hash.
+    """
+    username = (row.get('username') or '').strip()
+    email = (row.get('email') or '').strip()
+    password = (row.get('password') or '').strip()
+    password_hash = (row.get('password_hash') or '').strip()
+    if not username or not email or not (password or password_hash):
+        raise ValueError('Missing username, email or password')
+    year = (row.get('year') or '1').strip()
+    semester = (row.get('semester') or '1').strip()
+    role = (row.get('role') or 'student').strip().lower()
+    return {
+        'username': username,
+        'email': email,
+        'password': password,
+        'password_hash': password_hash,
+        'branch': (row.get('branch') or '').strip() or None,
+        'year': int(year) if year.isdigit() else 1,
+        'semester': int(semester) if semester.isdigit() else 1,
+        'gender': GENDERS.get((row.get('gender') or 'Male').strip().lower()),
+        'role': role if role in ROLES else 'student',
+    }
+
+
+def _taken(field, values, size):
+    """The values of a User field, out of the given ones, that are already in use"""
+    values = list(values)
+    taken = set()
+    for start in range(0, len(values), size):
+        taken.update(User.objects.filter(**{f'{field}__in': values[start:start + size]}).values_list(field, flat=True))
+    return taken
+
+
+def check_rows(csv_data, size):
+    """(rows to import, error messages): each row to import is (row number, parsed fields)"""
+    rows = []
+    errors = []
+    for row_num, row in enumerate(csv.DictReader(io.StringIO(csv_data)), start=2):
+        try:
+            rows.append((row_num, parse_row(row)))
+        except ValueError as e:
+            errors.append(f'Row {row_num}: {e}')
+
+    taken_usernames = _taken('username', {fields['username'] for _, fields in rows}, size)
+    taken_emails = _taken('email', {fields['email'] for _, fields in rows}, size)
+    valid = []
+    for row_num, fields in rows:
+        if fields['username'] in taken_usernames:
+            errors.append(f"Row {row_num}: Username '{fields['username']}' already exists")
+        elif fields['email'] in taken_emails:
+            errors.append(f"Row {row_num}: Email '{fields['email']}' already registered")
+        else:
+            # Later rows with the same username or email are duplicates of this one
+            taken_usernames.add(fields['username'])
+            taken_emails.add(fields['email'])
+            valid.append((row_num, fields))
+    return valid, errors
+
+
+def hashed_passwords(passwords, processes):
+    """Hashes of the passwords, in order, computed ahead on a process pool while the caller consumes them"""
+    if processes <= 1 or len(passwords) < 2:
+        yield from map(make_password, passwords)
+        return
+    # Spawned rather than forked, since the worker runs threads and holds database
+    # connections; a spawned process sets Django up before hashing
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=django.setup)
+    try:
+        yield from pool.map(make_password, passwords, chunksize=max(1, min(50, len(passwords) // (processes * 4))))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def create_users(rows, hashes):
+    """Create users from (row number, fields) rows and their password hashes in one transaction.
+
+    Returns the error messages of rows that could not be created.
+    """
+    now = timezone.now()
+    users = [
+        User(username=fields['username'], email=fields['email'], password=password_hash, date_joined=now)
+        for (_, fields), password_hash in zip(rows, hashes)
+    ]
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            _create_user_rows(rows, users)
+        return []
+    except IntegrityError:
+        pass
+    # Someone took one of the usernames since the rows were checked: create them one at a time
+    errors = []
+    for (row_num, fields), user in zip(rows, users):
+        user.pk = None
+        user._state.adding = True
+        try:
+            with transaction.atomic():
+                user.save()  # post_save creates the profile and ghost credential
+                UserProfile.objects.filter(user=user).update(**_profile_fields(fields))
+        except IntegrityError:
+            errors.append(f"Row {row_num}: Username '{fields['username']}' already exists")
+    return errors
+
+
+def _profile_fields(fields):
+    return {
+        'role': fields['role'],
+        'gender': fields['gender'],
+        'branch': fields['branch'],
+        'year': fields['year'],
+        'semester': fields['semester'],
+        'email_verified': True,  # Imported users don't verify their email
+    }
+
+
+def _create_user_rows(rows, users):
+    if any(user.pk is None for user in users):
+        # The database doesn't return ids from bulk inserts
+        ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+        for user in users:
+            user.pk = ids[user.username]
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, **_profile_fields(fields)) for (_, fields), user in zip(rows, users)
+    ])
+    GhostCredential.objects.bulk_create([GhostCredential(user=user, username=user.username) for user in users])
+
+
+def run_import(user_import, processes=None, size=None, progress=None, stop=None):
+    """Run a claimed UserImport, recording progress on it.
+
+    progress, if given, is called with (processed, total) after each chunk.
+    Setting the stop event ends the import after the current chunk; the
+    users already created stay, and the UserImport is marked failed.
+    """
+    processes = processes or hash_processes()
+    size = size or chunk_size()
+    UserImport.objects.filter(pk=user_import.pk).update(
+        status='running', started_at=user_import.started_at or timezone.now())
+    counts = {'total': 0, 'processed': 0, 'imported': 0, 'skipped': 0}
+    errors = []
+    try:
+        rows, errors = check_rows(user_import.csv_data, size)
+        counts.update(total=len(rows) + len(errors), processed=len(errors), skipped=len(errors))
+        UserImport.objects.filter(pk=user_import.pk).update(errors=errors, **counts)
+
+        # Queued files hold hashes already; only rows with a plain password are hashed here
+        hashes = hashed_passwords([fields['password'] for _, fields in rows if not fields['password_hash']],
+                                  processes)
+        try:
+            for start in range(0, len(rows), size):
+                if stop is not None and stop.is_set():
+                    break
+                chunk = rows[start:start + size]
+                chunk_hashes = [fields['password_hash'] or next(hashes) for _, fields in chunk]
+                chunk_errors = create_users(chunk, chunk_hashes)
+                errors.extend(chunk_errors)
+                counts['processed'] += len(chunk)
+                counts['imported'] += len(chunk) - len(chunk_errors)
+                counts['skipped'] += len(chunk_errors)
+                UserImport.objects.filter(pk=user_import.pk).update(errors=errors, **counts)
+                if progress:
+                    progress(counts['processed'], counts['total'])
+        finally:
+            hashes.close()  # Stops the hashing processes
+    except Exception:
+        UserImport.objects.filter(pk=user_import.pk).update(
+            status='failed', error=traceback.format_exc(), csv_data='', errors=errors,
+            finished_at=timezone.now(), **counts)
+        raise
+    finally:
+        if counts['imported']:
+            leaderboard.invalidate()
+    stopped = counts['processed'] < counts['total']
+    UserImport.objects.filter(pk=user_import.pk).update(
+        status='failed' if stopped else 'done',
+        error=f"Stopped after {counts['processed']} of {counts['total']} rows" if stopped else '',
+        csv_data='', finished_at=timezone.now(), **counts)
+    user_import.refresh_from_db()
+    return user_import
+
+
+class UserImportRunner:
+    """Runs queued user imports one at a time in a background thread of a judge worker"""
+
+    def __init__(self, worker_name):
+        self.worker_name = worker_name
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def poll(self):
+        """Start the next queued import unless one is running. Returns the UserImport started, if any"""
+        if self.busy:
+            return None
+        user_import = claim_next_import(self.worker_name)
+        if user_import is None:
+            return None
+        self.thread = threading.Thread(target=self._run, args=(user_import,), name=f'user-import-{user_import.pk}',
+                                       daemon=True)
+        self.thread.start()
+        return user_import
+
+    def _run(self, user_import):
+        try:
+            run_import(user_import, stop=self.stop_event)
+        except Exception:
+            logger.error('User import %s failed\n%s', user_import.pk, traceback.format_exc())
+        finally:
+            connection.close()
+
+    def stop(self):
+        """Stop the running import after its current chunk, and wait for it"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
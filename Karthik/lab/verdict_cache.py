@@ -0,0 +1,113 @@
+"""
+Verdict cache for resubmitted code.
+
+Students resubmit byte-identical code, and whole classes submit the same
+template. Every judged submission's verdict is stored as a
+VerdictCacheEntry keyed by
+
+    (problem, language, hash of the normalized code, problem.test_revision, verdict policy)
+
+and a later submission with the same key is given a copy of it, per-test
+results included, without compiling or running anything.
+
+Problem.test_revision goes up whenever one of the problem's test cases is
+added, edited or deleted, or its checker changes (see signals.py). That
+leaves the older entries unreachable, and they are deleted at the same
+time. Outcomes that depend on the judge rather than on the code are not
+stored (see cacheable): time limits and compile timeouts, which depend on
+how busy the judge was, and runs the executor failed to carry out.
+
+Changing EXECUTION_LIMITS does not invalidate entries; delete them in the
+admin afterwards.
+"""
+import hashlib
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Problem, VerdictCacheEntry
+
+
+UNCACHED_VERDICTS = ('time_limit',)
+# Compile errors from CodeExecutor.compile itself rather than from the compiler
+UNCACHED_COMPILE_ERRORS = ('Compilation timed out', 'Execution error:')
+
+
+def enabled():
+    return getattr(settings, 'VERDICT_CACHE_ENABLED', True)
+
+
+def normalize_code(code):
+    """Code as the cache sees it: \\n line endings, no byte order mark or trailing whitespace at the end"""
+    return code.lstrip('\ufeff').replace('\r\n', '\n').replace('\r', '\n').rstrip()
+
+
+def code_hash(code):
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+
+def _key(submission, test_revision):
+    return {
+        'problem_id': submission.problem_id,
+        'language': submission.language,
+        'code_hash': code_hash(submission.code),
+        'test_revision': test_revision,
+        'verdict_policy': submission.verdict_policy,
+    }
+
+
+def lookup(submission):
+    """The cached verdict for the submission's code, or None. Counts the hit"""
+    if not enabled() or submission.problem is None:
+        return None
+    entry = VerdictCacheEntry.objects.filter(**_key(submission, submission.problem.test_revision)).first()
+    if entry is not None:
+        VerdictCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+    return entry
+
+
+def cacheable(outcome):
+    """Whether a judge.run_test_cases outcome depends only on the code and the tests"""
+    if outcome['compile_error'].startswith(UNCACHED_COMPILE_ERRORS):
+        return False
+    for result in outcome['results']:
+        # A run without a status never ran the program: the executor failed
+        if result['run_status'] is None or result['verdict'] in UNCACHED_VERDICTS:
+            return False
+    return True
+
+
+def store(submission, test_revision, verdict, results):
+    """Cache a verdict, judged against the problem's tests at test_revision.
+
+    verdict holds the Submission fields and results the TestCaseResult
+    fields, one dict per test case, as written by judge.record_verdict.
+    Only call it for outcomes that are cacheable().
+    """
+    if not enabled() or submission.problem is None:
+        return None
+    try:
+        # Savepoint, so losing a race to an identical submission doesn't break an outer transaction
+        with transaction.atomic():
+            return VerdictCacheEntry.objects.create(**_key(submission, test_revision), results=results, **verdict)
+    except IntegrityError:
+        return None
+
+
+def verdict_fields(entry):
+    """The Submission fields stored in an entry"""
+    return {
+        'status': entry.status,
+        'error_message': entry.error_message,
+        'execution_time': entry.execution_time,
+        'peak_memory_kb': entry.peak_memory_kb,
+        'test_cases_passed': entry.test_cases_passed,
+        'total_test_cases': entry.total_test_cases,
+    }
+
+
+def invalidate(problem_id):
+    """Move a problem to a new test revision and drop its cached verdicts"""
+    Problem.objects.filter(pk=problem_id).update(test_revision=F('test_revision') + 1)
+    VerdictCacheEntry.objects.filter(problem_id=problem_id).delete()
@@ -10,17 +10,32 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from datetime import datetime, time as day_start, timedelta
 import json
-import time
 import secrets
 
-from .models import Submission, UserProfile, Problem, TestCase, Topic, GhostCredential
+from .models import Submission, UserProfile, Problem, TestCase, Topic, GhostCredential, JudgeJob
 
+from . import exports
+from .checkers import checker_for
 from .code_executor import CodeExecutor
+from .leaderboard import leaderboard_page
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .scheduler import get_scheduler
+from .workspaces import get_workspace_pool
+from .judge import (
+    run_test_cases, outcome_status, serialize_results, resource_summary,
+    judge_submission, enqueue_submission, submission_result, apply_cached_verdict,
+)
+
+CODE_PREVIEW_LENGTH = 100
+MAX_SUBMISSION_PAGE_SIZE = 200
 
 def index(request):
     """Landing page with information and animations"""
@@ -134,7 +149,9 @@ def problems_list(request):
     if not request.user.is_authenticated:
         return redirect('lab:login')
     
-    problems = Problem.objects.filter(is_active=True)
+    # Topic and submission count are fetched with the problems, not per row in the template
+    problems = Problem.objects.filter(is_active=True).select_related('topic').annotate(
+        submission_count=Count('submissions'))
     difficulty_filter = request.GET.get('difficulty')
     topic_filter = request.GET.get('topic')
     
@@ -255,6 +272,7 @@ def execute_code(request):
         input_data = data.get('input', '')
         problem_id = data.get('problem_id')
         mode = data.get('mode', 'submit')  # 'run' or 'submit'
+        verdict_policy = data.get('verdict_policy')  # overrides the problem's policy
         
         print(f"DEBUG: execute_code: lang={language}, mode={mode}, prob={problem_id}")
         
@@ -273,128 +291,73 @@ def execute_code(request):
             except Problem.DoesNotExist:
                 pass
         
+        if verdict_policy and verdict_policy not in dict(Problem.VERDICT_POLICY_CHOICES):
+            return Response({'error': f'Unknown verdict policy: {verdict_policy}'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        if problem and not verdict_policy:
+            verdict_policy = problem.verdict_policy
+        
         # Execute code
         executor = CodeExecutor()
-        start_time = time.time()
-        
-        # If in run mode with no specific input, run against sample cases primarily
-        # If input is provided, just run that (custom run)
-        
-        test_cases_passed = 0
-        total_test_cases = 0
-        test_results = []
-        
-        # For 'submit', we run all cases. For 'run', we usually run sample cases.
-        # If checking generic input execution (no problem_id), just run once.
         
-        if problem:
-            if mode == 'run':
-                test_cases = problem.test_cases.filter(is_sample=True)
-            else:
-                test_cases = problem.test_cases.all()
-                
-            total_test_cases = test_cases.count()
-            
-            for test_case in test_cases:
-                test_result = executor.execute(language, code, test_case.input_data)
-                actual_output = test_result.get('output', '').strip()
-                error_msg = test_result.get('error', '').strip()
-                expected_output = test_case.expected_output.strip()
-                
-                passed = (test_result.get('success', False) and 
-                         actual_output == expected_output)
-                
-                if passed:
-                    test_cases_passed += 1
-                
-                # If there was an error, append it to actual output so user sees it
-                if error_msg:
-                    if actual_output:
-                        actual_output += f"\nError: {error_msg}"
-                    else:
-                        actual_output = error_msg
-
-                test_results.append({
-                    'passed': passed,
-                    'input': test_case.input_data,
-                    'expected': expected_output,
-                    'actual': actual_output,
-                    'is_sample': test_case.is_sample
-                })
-                
-                # Optimization: If compilation failed (C/C++/Java), it usually fails for all. 
-                # We can detect this if passed is False and error_msg is present, 
-                # but for simplicity we'll just run all 
-                # (or maybe for 'run' mode we could stop on first error to save resources?)
-                
-            # For result object (execution time etc)
-            result = {'success': True, 'output': '', 'error': ''} # Dummy for structure
-        else:
+        if not problem:
             # Simple execution (no problem context)
-            result = executor.execute(language, code, input_data)
-            execution_time = time.time() - start_time
+            result = executor.execute(language, code, input_data, owner=request.user.id)
+            cpu_time = result.get('cpu_time')
             return Response({
                 'success': result.get('success', False),
                 'output': result.get('output', ''),
                 'error': result.get('error', ''),
-                'execution_time': round(execution_time, 3),
+                'execution_time': round(cpu_time, 3) if cpu_time is not None else None,
+                'wall_time': round(result['wall_time'], 3) if result.get('wall_time') is not None else None,
+                'memory_kb': result.get('memory_kb'),
             })
-
-        execution_time = time.time() - start_time
         
-        # Determine status
-        if total_test_cases > 0:
-            if test_cases_passed == total_test_cases:
-                submission_status = 'accepted'
-            elif test_cases_passed > 0:
-                submission_status = 'partial'
-            else:
-                submission_status = 'failed'
-        else:
-            submission_status = 'success'
+        if mode == 'run':
+            # 'run' checks the sample cases only and is not saved
+            test_cases = list(problem.test_cases.filter(is_sample=True))
+            outcome = run_test_cases(executor, language, code, test_cases,
+                                     owner=request.user.id, policy=verdict_policy,
+                                     make_checker=checker_for(problem))
+            summary = resource_summary(outcome['results'])
+            return Response({
+                'success': True,
+                'status': outcome_status(outcome),
+                'execution_time': round(summary['execution_time'], 3) if summary['execution_time'] is not None else None,
+                'peak_memory_kb': summary['peak_memory_kb'],
+                'submission_id': None,
+                'test_cases_passed': outcome['passed'],
+                'total_test_cases': outcome['total'],
+                'verdict_policy': verdict_policy,
+                'compile_error': outcome['compile_error'],
+                'test_results': serialize_results(outcome['results']),
+            })
         
-        submission_id = None
-        # Only save submission if mode is NOT 'run'
-        if mode != 'run':
-            submission = Submission.objects.create(
-                user=request.user,
-                problem=problem,
-                language=language,
-                code=code,
-                input_data=input_data,
-                output='', # We have multiple outputs now
-                error_message='',
-                execution_time=execution_time,
-                status=submission_status,
-                test_cases_passed=test_cases_passed,
-                total_test_cases=total_test_cases
-            )
-            submission_id = submission.id
-            
-            # Dynamic Score Update
-            if submission_status == 'accepted' and problem:
-                # Check if already solved
-                already_solved = Submission.objects.filter(
-                    user=request.user, 
-                    problem=problem, 
-                    status='accepted'
-                ).exclude(id=submission_id).exists()
-                
-                if not already_solved:
-                    profile = request.user.userprofile
-                    profile.score += problem.points # Use dynamic points from problem
-                    profile.save()
+        # 'submit' is judged against every test case by the judge worker;
+        # the client polls submissions/<id>/status/ for the verdict
+        submission = Submission.objects.create(
+            user=request.user,
+            problem=problem,
+            language=language,
+            code=code,
+            input_data=input_data,
+            output='', # We have multiple outputs now
+            error_message='',
+            status='pending',
+            total_test_cases=problem.test_cases.count(),
+            verdict_policy=verdict_policy
+        )
         
-        response_data = {
-            'success': True, 
-            'execution_time': round(execution_time, 3),
-            'submission_id': submission_id,
-            'test_cases_passed': test_cases_passed,
-            'total_test_cases': total_test_cases,
-            'test_results': test_results
-        }
+        # Code already judged against these test cases needs no worker
+        if apply_cached_verdict(submission):
+            return Response(submission_result(submission))
+        
+        if getattr(settings, 'JUDGE_ASYNC', True):
+            enqueue_submission(submission)
+            return Response(submission_result(submission), status=status.HTTP_202_ACCEPTED)
         
-        return Response(response_data)
+        judge_submission(submission, executor=executor)
+        return Response(submission_result(submission))
     
     except Exception as e:
         print(f"ERROR in execute_code: {str(e)}")
@@ -406,25 +369,79 @@ def execute_code(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_submissions(request):
-    """Get user's submission history"""
+    """Get submission history, newest first: the user's own, or everyone's for admins.
+
+    Filters: problem, status, language and, for admins, user (a username).
+    Pass next_cursor as cursor for the next page.
+    """
     user = request.user
     profile, _ = UserProfile.objects.get_or_create(user=user, defaults={'role': 'student'})
+    params = request.query_params
     
-    if profile.role == 'admin':
-        submissions = Submission.objects.all()[:100]
-    else:
-        submissions = Submission.objects.filter(user=user)[:50]
+    submissions = Submission.objects.all()
+    if profile.role != 'admin':
+        submissions = submissions.filter(user=user)
+    elif params.get('user'):
+        submissions = submissions.filter(user__username=params['user'])
+    if params.get('language'):
+        if params['language'] not in dict(Submission.LANGUAGE_CHOICES):
+            return Response({'error': f"Unknown language: {params['language']}"}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        submissions = submissions.filter(language=params['language'])
+    if params.get('status'):
+        submissions = submissions.filter(status=params['status'])
+    try:
+        if params.get('problem'):
+            submissions = submissions.filter(problem_id=int(params['problem']))
+        limit = int(params['limit']) if params.get('limit') else settings.SUBMISSION_PAGE_SIZE
+        after = decode_cursor(params['cursor'], datetime.fromisoformat, int) if params.get('cursor') else None
+    except ValueError as e:
+        message = str(e) if isinstance(e, InvalidCursor) else 'problem and limit must be numbers'
+        return Response({'error': message}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, MAX_SUBMISSION_PAGE_SIZE))
+    
+    # Keyset pagination on (submitted_at, id), the order of the submission
+    # indexes, so a page is an index range scan however deep it is. The
+    # submitted_at__lte bound is what lets the database seek to the cursor.
+    if after is not None:
+        submitted_at, submission_id = after
+        submissions = submissions.filter(
+            Q(submitted_at__lte=submitted_at),
+            Q(submitted_at__lt=submitted_at) | Q(id__gt=submission_id),
+        )
+    # Only the listed columns are read; the code never leaves the database
+    # beyond its first characters. One extra row tells whether there is a next page.
+    rows = list(
+        submissions.order_by('-submitted_at', 'id')
+        .values('id', 'user__username', 'problem_id', 'problem__title', 'language', 'status',
+                'execution_time', 'peak_memory_kb', 'test_cases_passed', 'total_test_cases', 'submitted_at',
+                code_preview=Substr('code', 1, CODE_PREVIEW_LENGTH + 1))[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
     data = [{
-        'id': s.id,
-        'language': s.language,
-        'status': s.status,
-        'execution_time': s.execution_time,
-        'submitted_at': s.submitted_at.isoformat(),
-        'code_preview': s.code[:100] + '...' if len(s.code) > 100 else s.code
-    } for s in submissions]
+        'id': row['id'],
+        'user': row['user__username'],
+        'problem_id': row['problem_id'],
+        'problem': row['problem__title'],
+        'language': row['language'],
+        'status': row['status'],
+        'execution_time': row['execution_time'],
+        'peak_memory_kb': row['peak_memory_kb'],
+        'test_cases_passed': row['test_cases_passed'],
+        'total_test_cases': row['total_test_cases'],
+        'submitted_at': row['submitted_at'].isoformat(),
+        'code_preview': (row['code_preview'][:CODE_PREVIEW_LENGTH] + '...'
+                         if len(row['code_preview']) > CODE_PREVIEW_LENGTH else row['code_preview']),
+    } for row in rows]
     
-    return Response(data)
+    last = rows[-1] if rows else None
+    return Response({
+        'results': data,
+        'next_cursor': encode_cursor(last['submitted_at'].isoformat(), last['id']) if has_more else None,
+    })
 
 
 @api_view(['GET'])
@@ -450,6 +467,7 @@ def get_submission_detail(request, submission_id):
             'output': submission.output,
             'error_message': submission.error_message,
             'execution_time': submission.execution_time,
+            'peak_memory_kb': submission.peak_memory_kb,
             'status': submission.status,
             'submitted_at': submission.submitted_at.isoformat()
         })
@@ -457,3 +475,118 @@ def get_submission_detail(request, submission_id):
         return Response({'error': 'Submission not found'}, 
                       status=status.HTTP_404_NOT_FOUND)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_submission_status(request, submission_id):
+    """Poll the judging status and results of a submission"""
+    try:
+        submission = Submission.objects.get(id=submission_id)
+    except Submission.DoesNotExist:
+        return Response({'error': 'Submission not found'}, 
+                      status=status.HTTP_404_NOT_FOUND)
+    
+    profile, _ = UserProfile.objects.get_or_create(user=request.user, defaults={'role': 'student'})
+    
+    # Only allow access if user owns submission or is admin
+    if submission.user_id != request.user.id and profile.role != 'admin':
+        return Response({'error': 'Permission denied'}, 
+                      status=status.HTTP_403_FORBIDDEN)
+    
+    return Response(submission_result(submission))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard(request):
+    """Students ranked by score, optionally for a branch/year/semester; pass next_cursor as cursor for the next page"""
+    branch = request.query_params.get('branch') or None
+    if branch and branch not in dict(UserProfile.BRANCH_CHOICES):
+        return Response({'error': f'Unknown branch: {branch}'}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    try:
+        year = int(request.query_params['year']) if request.query_params.get('year') else None
+        semester = int(request.query_params['semester']) if request.query_params.get('semester') else None
+        limit = int(request.query_params['limit']) if request.query_params.get('limit') else None
+    except ValueError:
+        return Response({'error': 'year, semester and limit must be numbers'}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        data = leaderboard_page(branch=branch, year=year, semester=semester,
+                                cursor=request.query_params.get('cursor') or None, limit=limit)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+
+def export_filters(params):
+    """Filters of an export request: branch, year, semester, problem, since and until (dates, both included)"""
+    branch = params.get('branch') or None
+    if branch and branch not in dict(UserProfile.BRANCH_CHOICES):
+        raise ValueError(f'Unknown branch: {branch}')
+    try:
+        numbers = {name: int(params[name]) if params.get(name) else None for name in ('year', 'semester', 'problem')}
+    except ValueError:
+        raise ValueError('year, semester and problem must be numbers')
+    dates = {}
+    for name in ('since', 'until'):
+        try:
+            day = datetime.strptime(params[name], '%Y-%m-%d').date() if params.get(name) else None
+        except ValueError:
+            raise ValueError(f'{name} must be a date, YYYY-MM-DD')
+        if day is not None and name == 'until':
+            day += timedelta(days=1)  # until is the last day exported
+        dates[name] = timezone.make_aware(datetime.combine(day, day_start())) if day else None
+    return {'branch': branch, **numbers, **dates}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_submissions(request, file_format):
+    """Stream submissions as CSV or JSON lines, oldest first (admins only)"""
+    return _export(request, file_format, 'submissions', exports.submissions, exports.submission_rows,
+                   exports.SUBMISSION_COLUMNS)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_grades(request, file_format):
+    """Stream students' scores as CSV or JSON lines (admins only)"""
+    return _export(request, file_format, 'grades', exports.grades, exports.grade_rows, exports.GRADE_COLUMNS)
+
+
+def _export(request, file_format, name, queryset, rows, columns):
+    profile, _ = UserProfile.objects.get_or_create(user=request.user, defaults={'role': 'student'})
+    if profile.role != 'admin':
+        return Response({'error': 'Permission denied'}, 
+                      status=status.HTTP_403_FORBIDDEN)
+    if file_format not in exports.FORMATS:
+        return Response({'error': f'Unknown format: {file_format}'}, 
+                      status=status.HTTP_404_NOT_FOUND)
+    try:
+        filters = export_filters(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, 
+                      status=status.HTTP_400_BAD_REQUEST)
+    return exports.streaming_response(rows(queryset(**filters)), columns, file_format, name)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def judge_status(request):
+    """Report judge queue depth and execution slot usage"""
+    data = get_scheduler().queue_depth()
+    data['queued_jobs'] = JudgeJob.objects.filter(status='queued').count()
+    data['running_jobs'] = JudgeJob.objects.filter(status='running').count()
+    
+    profile, _ = UserProfile.objects.get_or_create(user=request.user, defaults={'role': 'student'})
+    if profile.role != 'admin':
+        # Students only see totals, not who is waiting
+        data.pop('waiting_by_owner', None)
+    else:
+        # Counters of the worker process answering this request
+        data['workspaces'] = get_workspace_pool().stats()
+    
+    return Response(data)
@@ -0,0 +1,175 @@
+"""
+Pool of reusable working directories for compiles and runs.
+
+Creating a fresh directory for every compile and removing it with rmtree
+afterwards is a lot of filesystem churn at hundreds of runs a minute.
+Each process instead keeps its workspaces under
+
+    EXECUTION_WORKSPACE_DIR/<pid>-<random>/<n>/
+
+(EXECUTION_DIR/workspaces by default; a tmpfs such as /dev/shm keeps them
+in memory). A released workspace is emptied and handed out again. Beyond
+EXECUTION_WORKSPACE_POOL_SIZE idle workspaces, or when it can't be fully
+emptied, it is removed instead.
+
+Each process holds an flock on a lock file in its directory for as long
+as it runs. When a pool starts it removes the directories whose lock is
+free, i.e. those left behind by processes that crashed or were killed.
+Where fcntl is unavailable (Windows) nothing is swept.
+"""
+import atexit
+import os
+import shutil
+import threading
+import time
+import uuid
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+LOCK_FILE = '.owner.lock'
+
+
+class WorkspacePool:
+    """Hands out empty directories and takes them back for reuse"""
+
+    def __init__(self, root, max_idle=8):
+        self.root = str(root)
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self.dir = os.path.join(self.root, f'{self.pid}-{uuid.uuid4().hex[:8]}')
+        self._lock = threading.Lock()
+        self._idle = []
+        self._next = 0
+        self._lock_fd = None
+        self._stats = {
+            'acquired': 0,
+            'reused': 0,
+            'created': 0,
+            'discarded': 0,
+            'swept': 0,
+            'acquire_seconds': 0.0,
+            'cleanup_seconds': 0.0,
+        }
+        # Take the lock under a hidden name first, so a concurrent sweep never sees the directory unlocked
+        staging = os.path.join(self.root, '.' + os.path.basename(self.dir))
+        os.makedirs(staging)
+        if fcntl is not None:
+            self._lock_fd = os.open(os.path.join(staging, LOCK_FILE), os.O_CREAT | os.O_RDWR)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        os.rename(staging, self.dir)
+        self._stats['swept'] = self.sweep()
+
+    def acquire(self):
+        """Return the path of an empty workspace"""
+        start = time.perf_counter()
+        with self._lock:
+            path = self._idle.pop() if self._idle else None
+            if path is None:
+                self._next += 1
+                path = os.path.join(self.dir, str(self._next))
+        reused = os.path.isdir(path)
+        if not reused:
+            os.mkdir(path)
+        with self._lock:
+            self._stats['acquired'] += 1
+            self._stats['reused' if reused else 'created'] += 1
+            self._stats['acquire_seconds'] += time.perf_counter() - start
+        return path
+
+    def release(self, path):
+        """Empty a workspace and keep it for reuse (or remove it)"""
+        start = time.perf_counter()
+        keep = False
+        with self._lock:
+            room = len(self._idle) < self.max_idle
+        # The workspace may already be gone, e.g. moved away by compile_checker
+        if os.path.isdir(path):
+            if room:
+                keep = _empty_directory(path)
+            if not keep:
+                shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            if keep:
+                self._idle.append(path)
+            else:
+                self._stats['discarded'] += 1
+            self._stats['cleanup_seconds'] += time.perf_counter() - start
+
+    def sweep(self):
+        """Remove the directories of pools whose process is gone; returns how many"""
+        if fcntl is None:
+            return 0
+        swept = 0
+        for entry in os.scandir(self.root):
+            if (not entry.is_dir(follow_symlinks=False) or entry.path == self.dir or
+                    entry.name.startswith('.')):
+                continue
+            try:
+                fd = os.open(os.path.join(entry.path, LOCK_FILE), os.O_RDWR)
+            except FileNotFoundError:
+                fd = None  # Not a pool directory
+            except OSError:
+                continue
+            try:
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Its process is still running
+            finally:
+                if fd is not None:
+                    os.close(fd)
+            shutil.rmtree(entry.path, ignore_errors=True)
+            swept += 1
+        return swept
+
+    def stats(self):
+        """Reuse counters and time spent handing out and cleaning workspaces"""
+        with self._lock:
+            data = dict(self._stats)
+            data['idle'] = len(self._idle)
+        data['reuse_ratio'] = round(data['reused'] / data['acquired'], 3) if data['acquired'] else None
+        return data
+
+    def close(self):
+        """Remove this process's workspaces"""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def _empty_directory(path):
+    """Remove everything inside path. Returns False if something is left"""
+    try:
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+        return not os.listdir(path)
+    except OSError:
+        return False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_workspace_pool():
+    """Process-wide WorkspacePool configured from settings"""
+    global _pool
+    with _pool_lock:
+        # A forked child (e.g. a preloading web server's worker) needs a pool of its own
+        if _pool is None or _pool.pid != os.getpid():
+            root = getattr(settings, 'EXECUTION_WORKSPACE_DIR', None)
+            if root is None:
+                root = os.path.join(str(settings.EXECUTION_DIR), 'workspaces')
+            os.makedirs(root, exist_ok=True)
+            _pool = WorkspacePool(root, getattr(settings, 'EXECUTION_WORKSPACE_POOL_SIZE', 8))
+            atexit.register(_pool.close)
+        return _pool
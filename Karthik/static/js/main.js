@@ -19,9 +19,12 @@ window.onclick = function (event) {
     }
 }
 
-async function loadSubmissions() {
+let submissionsCursor = null;
+
+async function loadSubmissions(cursor = null) {
     try {
-        const response = await fetch('/api/submissions/', {
+        const url = cursor ? `/api/submissions/?cursor=${encodeURIComponent(cursor)}` : '/api/submissions/';
+        const response = await fetch(url, {
             credentials: 'include'
         });
 
@@ -29,8 +32,9 @@ async function loadSubmissions() {
             throw new Error('Failed to load submissions');
         }
 
-        const submissions = await response.json();
-        displaySubmissions(submissions);
+        const page = await response.json();
+        submissionsCursor = page.next_cursor;
+        displaySubmissions(page.results, cursor !== null);
     } catch (error) {
         console.error('Error loading submissions:', error);
         const listContainer = document.getElementById('submissions-list');
@@ -40,16 +44,16 @@ async function loadSubmissions() {
     }
 }
 
-function displaySubmissions(submissions) {
+function displaySubmissions(submissions, append = false) {
     const listContainer = document.getElementById('submissions-list');
     if (!listContainer) return;
 
-    if (submissions.length === 0) {
+    if (!append && submissions.length === 0) {
         listContainer.innerHTML = '<p>No submissions yet.</p>';
         return;
     }
 
-    listContainer.innerHTML = submissions.map(sub => `
+    const items = submissions.map(sub => `
         <div class="submission-item" onclick="viewSubmission(${sub.id})">
             <div class="submission-header">
                 <span class="submission-language">${sub.language.toUpperCase()}</span>
@@ -64,6 +68,18 @@ function displaySubmissions(submissions) {
             </div>
         </div>
     `).join('');
+
+    const loadMore = document.getElementById('submissions-load-more');
+    if (loadMore) loadMore.remove();
+    if (append) {
+        listContainer.insertAdjacentHTML('beforeend', items);
+    } else {
+        listContainer.innerHTML = items;
+    }
+    if (submissionsCursor) {
+        listContainer.insertAdjacentHTML('beforeend',
+            '<button id="submissions-load-more" class="btn btn-secondary" onclick="loadSubmissions(submissionsCursor)">Load more</button>');
+    }
 }
 
 async function viewSubmission(submissionId) {
@@ -151,6 +151,75 @@ REST_FRAMEWORK = {
 CODE_EXECUTION_TIMEOUT = 10  # seconds
 MAX_CODE_LENGTH = 100000  # characters
 EXECUTION_DIR = BASE_DIR / 'executions'
+CODE_COMPILE_TIMEOUT = 5  # seconds
+
+# Judge queue: submissions are judged by `python manage.py judge_worker`
+JUDGE_ASYNC = True  # False judges inside the request (no worker needed)
+JUDGE_POLL_INTERVAL = 0.5  # seconds a worker sleeps when the queue is empty
+JUDGE_STALE_JOB_TIMEOUT = 600  # seconds before a 'running' job is requeued
+JUDGE_STALE_CHECK_INTERVAL = 60  # seconds between a worker's checks for stale jobs
+JUDGE_TEST_WORKERS = None  # test cases run in parallel per submission (None = CPU count)
+REJUDGE_WORKERS = 2  # submissions rejudged at once; they yield free slots to users running fewer
+REJUDGE_DELAY = 0  # seconds each rejudge thread pauses after a submission
+
+# User CSV imports, run by judge workers: passwords are hashed on a process pool and
+# users are written in chunks, one transaction each
+USER_IMPORT_HASH_PROCESSES = None  # None = CPU count
+USER_IMPORT_CHUNK_SIZE = 500
+
+# Admission control shared by all web and judge worker processes
+# Slots are shared between users only while they contend; one user can use all of them on an idle host
+EXECUTION_MAX_CONCURRENT = None  # compiles/runs at once on this host (None = CPU count)
+
+# Compile cache: content-addressed builds keyed by language, source and toolchain
+COMPILE_CACHE_ENABLED = True
+COMPILE_CACHE_DIR = EXECUTION_DIR / 'compile_cache'
+COMPILE_CACHE_MAX_BYTES = 256 * 1024 * 1024  # LRU-evicted above this size
+
+# Verdict cache: identical code on unchanged test cases reuses the stored verdict
+VERDICT_CACHE_ENABLED = True
+
+# Submission history API: page size (the limit parameter can ask for up to 200)
+SUBMISSION_PAGE_SIZE = 50
+
+# Leaderboard API: pages are cached and invalidated on every score change. The default
+# cache is per process, so other processes see changes once their pages expire.
+LEADERBOARD_PAGE_SIZE = 50
+LEADERBOARD_CACHE_SECONDS = 60
+
+# Java: class-data-sharing archives for javac/java, built once per JDK under EXECUTION_DIR
+JAVA_CDS_ENABLED = True
+
+# Native launcher that reports each run's own CPU time and peak memory (built with gcc on first use)
+EXECUTION_LAUNCHER_ENABLED = True
+
+# Per-run resource limits; each language overrides 'default' key by key.
+# Breaching them yields a Time/Memory/Output Limit Exceeded verdict.
+EXECUTION_LIMITS = {
+    'default': {
+        'memory_mb': 256,  # resident memory, watched while the program runs (Java: heap size)
+        'address_space_mb': 2048,  # address space a program may reserve (RLIMIT_AS, not Java)
+        'cpu_seconds': 10,
+        'processes': 256,  # counts every process of the account running the judge
+        'open_files': 64,
+        'output_bytes': 1024 * 1024,  # stdout and stderr together
+    },
+    'java': {
+        'open_files': 256,
+    },
+}
+
+# Working directories for compiles and runs are reused from a per-process pool
+EXECUTION_WORKSPACE_DIR = None  # None = EXECUTION_DIR / 'workspaces'; e.g. '/dev/shm/codenextlab' for tmpfs
+EXECUTION_WORKSPACE_POOL_SIZE = 8  # idle workspaces kept per process
+
+# Python: run submissions as forks of a warm interpreter server (Unix only)
+PYTHON_FORKSERVER_ENABLED = True
+
+# Test inputs/outputs larger than this many bytes are stored as content-addressed
+# files under TEST_DATA_DIR instead of in the database (None keeps them all in the database)
+TEST_DATA_DIR = BASE_DIR / 'test_data'
+TEST_DATA_FILE_THRESHOLD = 64 * 1024
 
 # Create execution directory if it doesn't exist
 os.makedirs(EXECUTION_DIR, exist_ok=True)